@@ -1,23 +1,104 @@
-from flask import Flask, render_template, request, session,jsonify
+from flask import Flask, Response, g, render_template, request, session,jsonify
 from werkzeug.security import generate_password_hash
 from src.blueprints.auth.api import auth_api
 from src.blueprints.auth.ui import auth_ui
+from src.blueprints.auth.utils import ADMIN_ROLE_ID
 from src.blueprints.vacations.api import vacations_api
 from src.blueprints.vacations.ui import vacations_ui
+from src.blueprints.admin.api import admin_api
+from src.blueprints.media.ui import media_ui
+from src.dal import database, instrumentation, invalidation, reference_cache
+from src.dal.country_dao import countries_cache
+from src.dal.roles_dao import roles_cache
+from src.dal.user_dao import profile_cache
+from src.config import admission_control, media_x_sendfile, metrics_token, query_debug_headers
+from src import metrics
+from src.compression import CompressionMiddleware
+from src.admission import AdmissionMiddleware
+import hmac
+import logging
+import time
 
 import os
 
+query_log = logging.getLogger('src.dal.instrumentation')
+
 app = Flask(__name__, static_folder="src/static",
             template_folder="src/templates")
 app.secret_key = "really_secret_key"
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+if admission_control:
+    # Outermost, so a shed request costs no more than its 503.
+    app.wsgi_app = AdmissionMiddleware(app.wsgi_app)
+    metrics.track_limiters(*app.wsgi_app.limiters.values())
 basedir = os.path.abspath(os.path.dirname(__file__))
 upload_path = os.path.join(basedir, 'src', 'static', 'media')
 os.makedirs(upload_path, exist_ok=True)           
 app.config['UPLOAD_FOLDER'] = upload_path    
+app.config['USE_X_SENDFILE'] = media_x_sendfile
 app.register_blueprint(auth_ui, url_prefix='/auth')
 app.register_blueprint(auth_api, url_prefix='/api/auth')
 app.register_blueprint(vacations_ui, url_prefix='/vacations')
 app.register_blueprint(vacations_api, url_prefix='/api/vacations')
+app.register_blueprint(admin_api, url_prefix='/api/admin')
+app.register_blueprint(media_ui, url_prefix='/media')
+invalidation.start_listener()
+reference_cache.warm(countries_cache, roles_cache)
+metrics.track_cache(countries_cache, roles_cache, profile_cache)
+metrics.registry.start_flusher()
+
+
+@app.before_request
+def open_db_scope():
+    g.request_started = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or "unmatched"
+    metrics.IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+    database.begin_request(primary_until=session.get('db_primary_until', 0.0))
+    instrumentation.start_request_stats()
+
+@app.after_request
+def remember_db_writes(response):
+    primary_until = database.request_primary_until()
+    if primary_until is not None:
+        session['db_primary_until'] = primary_until
+    stats = instrumentation.request_stats()
+    if stats is not None and (query_debug_headers or app.debug):
+        summary = stats.summary()
+        response.headers['X-DB-Query-Count'] = str(summary['count'])
+        response.headers['X-DB-Query-Time-Ms'] = str(summary['total_ms'])
+        response.headers['X-DB-Slow-Queries'] = str(len(summary['slow']))
+        response.headers['X-DB-N-Plus-One'] = str(len(summary['n_plus_one']))
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def close_db_scope(error=None):
+    database.end_request(error)
+    stats = instrumentation.end_request_stats()
+    summary = stats.summary() if stats is not None else None
+    record_request_metrics(error, summary)
+    if summary is not None:
+        query_log.debug("%s %s: %d queries in %.1f ms", request.method, request.path,
+                        summary['count'], summary['total_ms'])
+        for statement, count in summary['n_plus_one'].items():
+            query_log.warning("Possible N+1 in %s %s: ran %d times: %s",
+                              request.method, request.path, count, statement)
+
+def record_request_metrics(error, summary):
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is None:
+        return
+    status = 500 if error is not None else g.pop('response_status', 500)
+    metrics.IN_FLIGHT.dec(endpoint=endpoint)
+    metrics.REQUEST_LATENCY.observe(time.perf_counter() - g.pop('request_started'),
+                                    endpoint=endpoint, method=request.method)
+    metrics.REQUESTS.inc(endpoint=endpoint, method=request.method, status=status)
+    if status >= 500:
+        metrics.REQUEST_ERRORS.inc(endpoint=endpoint, method=request.method)
+    if summary is not None:
+        metrics.DB_QUERIES.inc(summary['count'], endpoint=endpoint)
+        metrics.DB_QUERY_TIME.inc(summary['total_ms'] / 1000, endpoint=endpoint)
+        metrics.DB_QUERIES_PER_REQUEST.observe(summary['count'], endpoint=endpoint)
 
 
 @app.errorhandler(400)
@@ -48,6 +129,18 @@ def handle_server_error(e):
 def home():
     return render_template('index.html')
 
+def metrics_allowed():
+    if session.get('user_role_id') == ADMIN_ROLE_ID:
+        return True
+    authorization = request.headers.get('Authorization', '').encode()
+    return bool(metrics_token) and hmac.compare_digest(authorization, f"Bearer {metrics_token}".encode())
+
+@app.route("/metrics")
+def prometheus_metrics():
+    if not metrics_allowed():
+        return Response("Unauthorized\n", 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.context_processor
 def inject_user_role():
     return {
@@ -0,0 +1,233 @@
+"""
+WSGI middleware for admission control: each class of routes (login, the
+vacation listing, writes, static files) gets its own concurrency limit and
+bounded queue, so an overload of one class cannot exhaust the database and
+threads for the others, and requests that could not be served in time are
+refused at once with a 503 and Retry-After instead of piling up.
+
+The limits adapt to latency (additive increase, multiplicative decrease): a
+class whose requests take longer than its target latency has its limit cut by
+10% (at most once per target interval), and a class that is saturated while
+meeting its target earns about one more slot per `limit` requests. Throughput
+thus settles near the concurrency the database sustains at the target
+latency rather than collapsing under queueing.
+
+A slot is held until the server closes the response, so streamed bodies (the
+admin exports, lazily compressed responses) keep it while they are sent and
+their time counts towards the latency the limit adapts to. A body handed back
+as a wsgi.file_wrapper is wrapped again around its file, so the server can still
+send it with sendfile. Routes outside the classes are not limited. The limits
+are per process and only matter with a threaded server.
+"""
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from src.config import admission_classes, admission_queue_timeout, admission_retry_after
+
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+LOGIN_PATHS = frozenset(("/auth/login", "/auth/signup", "/api/auth/login", "/api/auth/signup"))
+LISTING_PATHS = frozenset(("/vacations/vacations_list", "/api/vacations/vacations_list"))
+STATIC_PREFIXES = ("/static/", "/media/")
+# GET links that change data, like the like toggle of the listing page.
+WRITE_PREFIXES = ("/vacations/like/",)
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """
+    Returns the admission class of a request: "login", "listing", "writes",
+    "static", or None for requests that are not limited.
+    """
+    if path.startswith(STATIC_PREFIXES):
+        return "static"
+    if path in LOGIN_PATHS:
+        return "login" if method == "POST" else None
+    if method not in SAFE_METHODS or path.startswith(WRITE_PREFIXES):
+        return "writes"
+    if path in LISTING_PATHS:
+        return "listing"
+    return None
+
+
+class AdaptiveLimiter:
+    def __init__(self, name: str, limit: int, max_limit: int, queue: int, target_ms: float,
+                 queue_timeout: float = admission_queue_timeout, min_limit: int = 1, backoff: float = 0.9) -> None:
+        self.name = name
+        self.max_limit = max(max_limit, limit)
+        self.min_limit = min_limit
+        self.queue_size = queue
+        self.target = target_ms / 1000
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self._limit = float(limit)
+        self._in_flight = 0
+        self._waiting = 0
+        self._shed = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(int(self._limit), self.min_limit)
+
+    def acquire(self) -> bool:
+        """
+        Takes a slot, waiting in the queue for up to queue_timeout seconds when
+        all are taken. Returns False, without a slot, when the queue is full or
+        the wait timed out.
+        """
+        with self._cond:
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                return True
+            if self._waiting >= self.queue_size:
+                self._shed += 1
+                return False
+            self._waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self._in_flight < self.limit, self.queue_timeout)
+            finally:
+                self._waiting -= 1
+            if not admitted:
+                self._shed += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency: float) -> None:
+        """
+        Frees a slot and adapts the limit to how long the request took.
+
+        :param latency: Seconds the request held its slot
+        """
+        with self._cond:
+            saturated = self._in_flight >= self.limit
+            self._in_flight -= 1
+            now = time.monotonic()
+            if latency > self.target:
+                if now - self._last_decrease >= self.target:
+                    self._limit = max(self.min_limit, self._limit * self.backoff)
+                    self._last_decrease = now
+            elif saturated or self._waiting:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"limit": self.limit, "in_flight": self._in_flight, "waiting": self._waiting, "shed": self._shed}
+
+
+def create_limiters(classes: Dict[str, Dict[str, Any]] = admission_classes) -> Dict[str, AdaptiveLimiter]:
+    """
+    Builds one limiter per route class from settings shaped like admission_classes.
+    """
+    return {name: AdaptiveLimiter(name, **settings) for name, settings in classes.items()}
+
+
+class _Slot:
+    """
+    A slot taken from a limiter, released once, with the time it was held.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter) -> None:
+        self.limiter = limiter
+        self.started = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.limiter.release(time.perf_counter() - self.started)
+
+
+class _ReleasingBody:
+    """
+    A response body that releases its slot when the server closes it, or once
+    it has been sent in full if the server never does.
+    """
+
+    def __init__(self, body: Iterable[bytes], slot: _Slot) -> None:
+        self.body = body
+        self.slot = slot
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.body
+        self.slot.release()
+
+    def close(self) -> None:
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.slot.release()
+
+
+class _ReleasingFile:
+    """
+    A file that releases its slot when closed; the rest is the wrapped file's.
+    """
+
+    def __init__(self, file: Any, slot: _Slot) -> None:
+        self._file = file
+        self._slot = slot
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._file, name)
+
+    def close(self) -> None:
+        try:
+            self._file.close()
+        finally:
+            self._slot.release()
+
+
+def _releasing(environ: dict, body: Iterable[bytes], slot: _Slot) -> Iterable[bytes]:
+    file_wrapper = environ.get("wsgi.file_wrapper")
+    if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+        # gunicorn's and wsgiref's wrappers keep the file in `filelike`, werkzeug's in `file`.
+        file = getattr(body, "filelike", None) or getattr(body, "file", None)
+        if file is not None:
+            block_size = getattr(body, "blksize", getattr(body, "buffer_size", 8192))
+            return file_wrapper(_ReleasingFile(file, slot), block_size)
+    return _ReleasingBody(body, slot)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: Callable, limiters: Optional[Dict[str, AdaptiveLimiter]] = None,
+                 classify: Callable[[str, str], Optional[str]] = route_class,
+                 retry_after: int = admission_retry_after) -> None:
+        self.app = app
+        self.limiters = create_limiters() if limiters is None else limiters
+        self.classify = classify
+        self.retry_after = retry_after
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        limiter = self.limiters.get(self.classify(environ.get("REQUEST_METHOD", "GET"), environ.get("PATH_INFO", "")))
+        if limiter is None:
+            return self.app(environ, start_response)
+        if not limiter.acquire():
+            return self._shed(environ, start_response)
+        slot = _Slot(limiter)
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            slot.release()
+            raise
+        return _releasing(environ, body, slot)
+
+    def _shed(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        message = "The server is busy, please try again shortly."
+        if environ.get("PATH_INFO", "").startswith("/api/"):
+            body = json.dumps({"success": False, "message": message}).encode()
+            content_type = "application/json"
+        else:
+            body = message.encode()
+            content_type = "text/plain; charset=utf-8"
+        start_response("503 Service Unavailable", [
+            ("Content-Type", content_type),
+            ("Content-Length", str(len(body))),
+            ("Retry-After", str(self.retry_after)),
+            ("Cache-Control", "no-store"),
+        ])
+        return [body]
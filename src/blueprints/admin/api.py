@@ -0,0 +1,33 @@
+from flask import Blueprint, Response, abort
+from src.blueprints.auth.utils import login_required, admin_required
+from src.dal.vacation_dao import VacationDao
+from src.dal.likes_dao import LikesDao
+from src.dal.user_dao import UserDao
+from src.services.export_service import csv_chunks, ndjson_chunks
+
+admin_api = Blueprint('admin_api', __name__, url_prefix='/api/admin')
+
+EXPORTS = {
+    'vacations': lambda: VacationDao().iter_all_vacations(),
+    'likes': lambda: LikesDao().iter_all_likes(),
+    'users': lambda: UserDao().iter_all_users(),
+}
+FORMATS = {
+    'csv': (csv_chunks, 'text/csv'),
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+}
+
+
+@admin_api.route('/export/<table>.<fmt>', methods=['GET'])
+@login_required
+@admin_required
+def export_table(table, fmt):
+    """
+    Streams a whole table as CSV or NDJSON. Rows are read from a server-side
+    cursor and sent chunk by chunk, so memory use does not grow with the table.
+    """
+    if table not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    formatter, mimetype = FORMATS[fmt]
+    return Response(formatter(EXPORTS[table]()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'})
@@ -1,14 +1,15 @@
 # API.py
 from flask import Blueprint, request, jsonify, abort, session
-from werkzeug.security import check_password_hash, generate_password_hash
-from src.services.user_service import UserServices, UserDto, UserDao
-from src.blueprints.auth.utils import login_required
+from src.services.user_service import AsyncUserServices, UserDto
+from src.services.passwords import PasswordHasherBusy, hash_password_async, verify_password_async
+from src.dal.user_dao import AsyncUserDao
+from src.blueprints.auth.utils import log_in, login_required
 
 auth_api = Blueprint('auth_api', __name__, url_prefix='/api/auth')
 
 
 @auth_api.route('/login', methods=['POST'])
-def login():
+async def login():
     """
     Logs in a user with the given email and password.
     Args:
@@ -18,6 +19,7 @@ def login():
         A JSON response containing the user's information.
     Raises:
         400: User not found or incorrect password.
+        503: Too many password checks in progress.
     """
     data = request.get_json() or {}
     email = data.get('email')
@@ -26,17 +28,18 @@ def login():
     if not all([email, password]):
         abort(400, description="Missing email or password")
 
-    dao = UserDao()
-    user = dao.get_password_by_email(email=email)
+    dao = AsyncUserDao()
+    user = await dao.get_password_by_email(email=email)
     if not user:
         abort(400, description="User not found")
-    if not check_password_hash(user['password'], password):
-        abort(400, description="Incorrect password")
-    
-    session['user_name'] = f"{user['first_name']} {user['last_name']}"
-    session['user_id'] = user['id']
-    session['user_role_id'] = user['role_id']
+    try:
+        if not await verify_password_async(user['password'], password):
+            abort(400, description="Incorrect password")
+        await AsyncUserServices().upgrade_password_hash(user, password)
+    except PasswordHasherBusy as e:
+        return jsonify({"success": False, "message": str(e)}), 503, {'Retry-After': '1'}
 
+    log_in(user)
 
     return jsonify({
         "success": True,
@@ -49,7 +52,7 @@ def login():
         }
     }), 200
 @auth_api.route('/signup', methods=['POST'])
-def signup():
+async def signup():
     """
     Registers a new user with the given details.
     Args:
@@ -62,6 +65,7 @@ def signup():
         and the user's details on successful registration.
     Raises:
         400: If any required field is missing.
+        503: Too many password hashes in progress.
     """
 
     data = request.get_json() or {}
@@ -74,7 +78,10 @@ def signup():
     if not all([first_name, last_name, email, password]):
         abort(400, description="All fields are required.")
 
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = await hash_password_async(password)
+    except PasswordHasherBusy as e:
+        return jsonify({"success": False, "message": str(e)}), 503, {'Retry-After': '1'}
     user_dto = UserDto(
         first_name=first_name,
         last_name=last_name,
@@ -82,8 +89,8 @@ def signup():
         password=hashed_password,
         role_id=role_id
     )
-    service = UserServices()
-    service.register_new_user(user_dto)
+    service = AsyncUserServices()
+    await service.register_new_user(user_dto)
     return jsonify({
         "success": True,
         "first_name": user_dto.first_name,
@@ -94,7 +101,7 @@ def signup():
     }), 201
 @auth_api.route('/logout', methods=['GET','DELETE'])
 @login_required
-def logout():
+async def logout():
     
     
     session.clear()
@@ -2,9 +2,9 @@ from flask import Blueprint, render_template,request, redirect, url_for, flash,
 
 # UI.py
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import check_password_hash, generate_password_hash
 from src.services.user_service import UserServices, UserDto, UserDao
-from src.blueprints.auth.utils import login_required
+from src.services.passwords import PasswordHasherBusy, hash_password, verify_password
+from src.blueprints.auth.utils import log_in, login_required
 
 auth_ui = Blueprint('auth_ui', __name__, url_prefix='/auth', template_folder='templates', static_folder='static')
 
@@ -22,13 +22,16 @@ def login():
         flash("User not found")
         return redirect(url_for('auth_ui.login')), 400
 
-    if not check_password_hash(user['password'], password):
-        flash("Incorrect password")
-        return redirect(url_for('auth_ui.login')), 400
+    try:
+        if not verify_password(user['password'], password):
+            flash("Incorrect password")
+            return redirect(url_for('auth_ui.login')), 400
+        UserServices().upgrade_password_hash(user, password)
+    except PasswordHasherBusy as e:
+        flash(str(e))
+        return redirect(url_for('auth_ui.login')), 503
 
-    session['user_name']   = f"{user['first_name']} {user['last_name']}"
-    session['user_id']     = user['id']
-    session['user_role_id']= user['role_id']
+    log_in(user)
 
     return redirect(url_for('home')), 200
 
@@ -49,7 +52,7 @@ def signup():
         return redirect(url_for('auth_ui.signup')), 400
 
     try:
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
         user_dto = UserDto(
             first_name=first_name,
             last_name=last_name,
@@ -68,6 +71,10 @@ def signup():
         flash(f"Signup Failed: {str(e)}")
         return redirect(url_for('auth_ui.signup')), 400
 
+    except PasswordHasherBusy as e:
+        flash(str(e))
+        return redirect(url_for('auth_ui.signup')), 503
+
     except Exception:
         flash("Something went wrong. Please try again.")
         return redirect(url_for('auth_ui.signup')), 500
@@ -1,22 +1,92 @@
+import time
 from functools import wraps
+from inspect import iscoroutinefunction
 from flask import session, redirect, url_for, flash
 from flask import jsonify,request, abort
+from src.config import user_profile_cache_ttl
+
+# The user fields pages show, kept in the session so they need no query.
+PROFILE_FIELDS = ('id', 'first_name', 'last_name', 'email', 'role_id')
 
 
 def login_required(f):
+    if iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            if 'user_name' not in session:
+                return _unauthorized()
+            return await f(*args, **kwargs)
+        return decorated_coroutine
+
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_name' not in session:
-            if _wants_json():
-                return jsonify({"error": "Unauthorized access"}), 401
-            flash("Please log in or sign up to access this page.")
-            return redirect(url_for('auth.ui.login'))
+            return _unauthorized()
         return f(*args, **kwargs)
     return decorated_function
 
+ADMIN_ROLE_ID = 2
+
+
+def admin_required(f):
+    if iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            if session.get('user_role_id') != ADMIN_ROLE_ID:
+                return _forbidden()
+            return await f(*args, **kwargs)
+        return decorated_coroutine
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get('user_role_id') != ADMIN_ROLE_ID:
+            return _forbidden()
+        return f(*args, **kwargs)
+    return decorated_function
+
+def log_in(user):
+    """
+    Stores a user who just logged in in the session, with their profile.
+    """
+    session['user_name']    = f"{user['first_name']} {user['last_name']}"
+    session['user_id']      = user['id']
+    session['user_role_id'] = user['role_id']
+    remember_profile(user)
+
+def remember_profile(user):
+    """
+    Keeps the user's profile fields in the session, for current_profile.
+    """
+    session['user_profile'] = {field: user[field] for field in PROFILE_FIELDS}
+    session['user_profile_at'] = time.time()
+
+def current_profile():
+    """
+    Returns the logged in user's profile from the session, or None when it is
+    missing or older than user_profile_cache_ttl. In that case the caller loads
+    the user and hands it to remember_profile, so a change to the user shows
+    up within the same delay as through the profile cache.
+    """
+    profile = session.get('user_profile')
+    if profile is None or time.time() - session.get('user_profile_at', 0) > user_profile_cache_ttl:
+        return None
+    return profile
+
+def _unauthorized():
+    if _wants_json():
+        return jsonify({"error": "Unauthorized access"}), 401
+    flash("Please log in or sign up to access this page.")
+    return redirect(url_for('auth.ui.login'))
+
+def _forbidden():
+    if _wants_json():
+        return jsonify({"error": "Admin access required"}), 403
+    flash("Only admins can access this page.")
+    return redirect(url_for('vacations_ui.list_vacations'))
+
 def _wants_json():
     return (
         request.is_json or
         request.accept_mimetypes['application/json'] >=
         request.accept_mimetypes['text/html']
-    )
\ No newline at end of file
+    )
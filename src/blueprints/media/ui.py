@@ -0,0 +1,25 @@
+from flask import Blueprint, current_app, send_from_directory
+from src.config import media_cache_max_age
+from src.services import media_store
+
+media_ui = Blueprint('media_ui', __name__, url_prefix='/media')
+
+
+@media_ui.route('/<path:name>', methods=['GET'])
+def media_file(name):
+    """
+    Serves an uploaded image or one of its variants. Files are sent through the
+    server's wsgi.file_wrapper (sendfile under gunicorn) or X-Sendfile, and
+    honour Range and conditional requests.
+
+    Content-addressed originals never change, so they are cached for
+    media_cache_max_age and marked immutable. Other files (legacy names and
+    variants, which are rebuilt when the variant settings change) are
+    revalidated by ETag.
+    """
+    if media_store.is_content_name(name):
+        response = send_from_directory(current_app.config['UPLOAD_FOLDER'], name,
+                                       conditional=True, max_age=media_cache_max_age)
+        response.cache_control.immutable = True
+        return response
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], name, conditional=True, max_age=0)
@@ -1,73 +1,104 @@
 from flask import Blueprint,  jsonify,request, abort,   session
-from src.dal.database import db_conn
-from src.blueprints.auth.utils import login_required
-from src.services.vacation_service import VacationDao, VacationDto, VacationService
-from src.dal.likes_dao import LikesDao
-from src.dal.user_dao import UserDao
-from src.dal.country_dao import CountryDao
-from werkzeug.utils import secure_filename
-from flask import current_app
-import os
+from src.blueprints.auth.utils import admin_required, current_profile, login_required, remember_profile
+from src.blueprints.vacations.utils import conditional_on_catalog
+from src.services.vacation_service import AsyncVacationDao, VacationDto, AsyncVacationService, VacationService
+from src.dal.likes_dao import AsyncLikesDao
+from src.dal.user_dao import AsyncUserDao
+from dataclasses import asdict
+import asyncio
+import json
 
 vacations_api = Blueprint(
     'vacations_api', __name__, template_folder='src/templates', static_folder='src/static', url_prefix='/api/vacations')
 
+EDITABLE_FIELDS = ('country_id', 'vacation_description', 'arrival', 'departure', 'price')
+
+
+def _date(value):
+    """
+    Formats a vacation date as YYYY-MM-DD. arrival and departure are nullable,
+    and legacy rows may lack them, so a missing date gives None.
+    """
+    return value.isoformat() if value is not None else None
+
 
 @vacations_api.route('/vacations_list', methods=['GET'])
 @login_required
-def list_vacations():
-    user_dao = UserDao()
-    user = user_dao.get_user_info_by_id(session['user_id'])
-    vacation_dao = VacationDao()
-    vacations = vacation_dao.get_all_vacations()
-    likes_dao = LikesDao()
-    for vacation in vacations:
-        vacation['likes_count'] = likes_dao.get_likes_count(vacation['id'])
-        user_like = likes_dao.get_likes_info_by_id(session['user_id'], vacation['id'])
-        vacation['user_liked'] = len(user_like) > 0
+@conditional_on_catalog
+async def list_vacations():
+    user_id = session['user_id']
+    user = current_profile()
+    try:
+        page_lookup = AsyncVacationService().get_vacations_page(request.args.get('order_by', 'price'),
+                                                                request.args.get('limit'),
+                                                                request.args.get('cursor'),
+                                                                user_id=user_id)
+        if user is None:
+            user, page = await asyncio.gather(AsyncUserDao().get_user_info_by_id(user_id), page_lookup)
+            if user is not None:
+                remember_profile(user)
+        else:
+            page = await page_lookup
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     return jsonify({"user": {
         "id": user['id'],
         "name": f"{user['first_name']} {user['last_name']}",
     },
-    "vacations": vacations})
+    "vacations": page.vacations,
+    "order_by": page.order_by,
+    "limit": page.limit,
+    "next_cursor": page.next_cursor})
+
+
+@vacations_api.route('/<int:id>', methods=['GET'])
+@login_required
+@conditional_on_catalog
+async def get_vacation(id):
+    vacation = await AsyncVacationDao().get_vacation_info_by_id(id)
+    if vacation is None:
+        abort(404)
+    return jsonify({
+        "success": True,
+        "vacation": {
+            "id": vacation['id'],
+            "country_id": vacation['country_id'],
+            "vacation_description": vacation['vacation_description'],
+            "arrival": _date(vacation['arrival']),
+            "departure": _date(vacation['departure']),
+            "price": vacation['price'],
+            "file_name": vacation['file_name'],
+            "likes_count": vacation['likes_count']
+        }
+    }), 200
    
     
 @vacations_api.route('/update/<int:id>', methods=['PUT'])
 @login_required  
-def update_vacation(id):
-    existing = VacationDao().get_vacation_info_by_id(id)
-    filename = existing.get('file_name')
-    
+async def update_vacation(id):
     data = request.json
-    country_id = data['country_id']
-    description = data['vacation_description']
-    arrival = data['arrival']
-    departure = data['departure']
-    price = int(data['price'])
-
-    dao = VacationDao()
-    dao.update_vacation_info_by_id(id, 'country_id', country_id)
-    dao.update_vacation_info_by_id(id, 'vacation_description', description)
-    dao.update_vacation_info_by_id(id, 'arrival', arrival)
-    dao.update_vacation_info_by_id(id, 'departure', departure)
-    dao.update_vacation_info_by_id(id, 'price', price)
+    changes = {column: data[column] for column in EDITABLE_FIELDS if column in data}
+    try:
+        vacation = await AsyncVacationService().update_vacation_after_validation(id, changes)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
     return jsonify({
         "success": True,
         "vacation": {
             "id": id,
-            "country_id": country_id,
-            "vacation_description": description,
-            "arrival": arrival,
-            "departure": departure,
-            "price": price,
-            "file_name": filename
+            "country_id": vacation['country_id'],
+            "vacation_description": vacation['vacation_description'],
+            "arrival": _date(vacation['arrival']),
+            "departure": _date(vacation['departure']),
+            "price": vacation['price'],
+            "file_name": vacation['file_name']
         }
     }), 200
     
 @vacations_api.route('/create', methods=['POST'])
 @login_required  
-def create_vacation():
+async def create_vacation():
     try:
         data = request.json
         country_id = data['country_id']
@@ -84,7 +115,7 @@ def create_vacation():
             price=price,
             file_name=None  
         )
-        VacationService().register_new_vacation(vacation_dto)
+        await AsyncVacationService().register_new_vacation(vacation_dto)
 
         return jsonify({
             "success": True,
@@ -97,35 +128,55 @@ def create_vacation():
 
 @vacations_api.route('/delete/<int:id>', methods=[ 'DELETE'])
 @login_required
-def delete_vacation(id):
-    vacation_dao = VacationDao()    
-    vacation_dao.delete_vacation_info_by_id(id)
+async def delete_vacation(id):
+    vacation_dao = AsyncVacationDao()
+    await vacation_dao.delete_vacation_info_by_id(id)
     return jsonify({"success": True, "message": "Vacation deleted successfully"}), 200
            
 
 @vacations_api.route('/like/<int:id>', methods=[ 'POST'])
 @login_required
-def like_vacation(id):
+async def like_vacation(id):
     if 'user_id' not in session:
         abort(401, description="Unauthorized: User not logged in")
     
-    likes_dao = LikesDao()
-    user_id = session['user_id']
-    
-    existing_like = likes_dao.get_likes_info_by_id(user_id, id)
-    
-    if existing_like:
-        likes_dao.delete_likes_info_by_id(user_id, id)
-        user_liked = False
-    else:
-        likes_dao.insert_into_likes(user_id, id)
-        user_liked = True
+    result = await AsyncLikesDao().toggle_like(session['user_id'], id)
+    if result is None:
+        abort(404)
     
     response = {
         "success": True,
         "vacation": {
             "id": id,
-            "user_liked": user_liked  
+            "user_liked": result['liked'],
+            "likes_count": result['likes_count']
         }
     }
-    return jsonify(response), 200
\ No newline at end of file
+    return jsonify(response), 200
+
+
+def _ndjson_rows(stream):
+    """
+    Yields one parsed object per line of an NDJSON stream, reading it line by line.
+    Lines that are not valid JSON are yielded as-is so they get reported as row errors.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line.decode(errors='replace')
+
+
+@vacations_api.route('/import', methods=['POST'])
+@login_required
+@admin_required
+def import_vacations():
+    report = VacationService().bulk_register_vacations(_ndjson_rows(request.stream))
+    return jsonify({
+        "success": True,
+        "inserted": report.inserted,
+        "errors": [asdict(error) for error in report.errors]
+    }), 200
@@ -1,12 +1,11 @@
-from flask import Blueprint, render_template,request, redirect, url_for, flash, session
-from src.dal.database import db_conn
-from src.blueprints.auth.utils import login_required
+from flask import Blueprint, render_template,request, redirect, url_for, flash, session, abort
+from src.blueprints.auth.utils import current_profile, login_required, remember_profile
+from src.blueprints.vacations.utils import conditional_on_catalog, limit_upload_size, store_uploaded_image
 from src.services.vacation_service import VacationDao, VacationDto, VacationService
-from src.dal.likes_dao import LikesDao
+from src.services.user_service import UserServices
+from src.models.likes_dto import LikesDto
 from src.dal.user_dao import UserDao
 from src.dal.country_dao import CountryDao
-from werkzeug.utils import secure_filename
-import os
 from flask import current_app
 
 vacations_ui = Blueprint(
@@ -15,22 +14,23 @@ vacations_ui = Blueprint(
 
 @vacations_ui.route('/vacations_list', methods=['GET'])
 @login_required
+@conditional_on_catalog
 def list_vacations():
-    user_dao = UserDao()
-    user = user_dao.get_user_info_by_id(session['user_id'])
-    
-    vacation_dao = VacationDao()
-    vacations = vacation_dao.get_all_vacations()
-    
-    likes_dao = LikesDao()
-    for vacation in vacations:
-        vacation['likes_count'] = likes_dao.get_likes_count(vacation['id'])
-        
-        user_like = likes_dao.get_likes_info_by_id(session['user_id'], vacation['id'])
-        vacation['user_liked'] = len(user_like) > 0
-   
-    
-    return render_template('vacations/list_vacations.html', vacations=vacations, user=user)
+    user = current_profile()
+    if user is None:
+        user = UserDao().get_user_info_by_id(session['user_id'])
+        if user is not None:
+            remember_profile(user)
+
+    try:
+        page = VacationService().get_vacations_page(request.args.get('order_by', 'price'),
+                                                    request.args.get('limit'),
+                                                    request.args.get('cursor'),
+                                                    user_id=session['user_id'])
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    return render_template('vacations/list_vacations.html', vacations=page.vacations, user=user, page=page)
 
 @vacations_ui.route('/update/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -40,21 +40,22 @@ def update_vacation(id):
     if request.method == 'GET':
         vacation = dao.get_vacation_info_by_id(id)
         return render_template('vacations/update_vacation.html', vacation=vacation)
+    limit_upload_size()
     try:
-        dao.update_vacation_info_by_id(id, 'country_id',          request.form['country_id'])
-        dao.update_vacation_info_by_id(id, 'vacation_description', request.form['vacation_description'])
-        dao.update_vacation_info_by_id(id, 'arrival',              request.form['arrival'])
-        dao.update_vacation_info_by_id(id, 'departure',            request.form['departure'])
-        dao.update_vacation_info_by_id(id, 'price',                request.form['price'])
-
-        uploaded = request.files.get('image')
-        if uploaded and uploaded.filename:
-            filename = secure_filename(uploaded.filename)
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_folder, exist_ok=True)
-            file_path = os.path.join(upload_folder, filename)
-            uploaded.save(file_path)
-            dao.update_vacation_info_by_id(id, 'file_name', filename)
+        changes = {
+            'country_id':           request.form['country_id'],
+            'vacation_description': request.form['vacation_description'],
+            'arrival':              request.form['arrival'],
+            'departure':            request.form['departure'],
+            'price':                request.form['price'],
+        }
+
+        filename = store_uploaded_image()
+        if filename:
+            changes['file_name'] = filename
+
+        VacationService(dao).update_vacation_after_validation(id, changes,
+                                                              upload_folder=current_app.config['UPLOAD_FOLDER'])
 
         flash("Vacation updated successfully")
         return redirect(url_for('vacations_ui.list_vacations'))
@@ -73,6 +74,7 @@ def create_vacation():
     if request.method == 'GET':
         return render_template('vacations/create_vacation.html', countries=countries)
 
+    limit_upload_size()
     try:
         country_id  = request.form['country_id']
         description = request.form['vacation_description']
@@ -80,14 +82,7 @@ def create_vacation():
         departure   = request.form['departure']
         price       = int(request.form['price'])
 
-        uploaded = request.files.get('image')
-        filename = None
-        if uploaded and uploaded.filename:
-            filename = secure_filename(uploaded.filename)
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_folder, exist_ok=True)
-            file_path = os.path.join(upload_folder, filename)
-            uploaded.save(file_path)
+        filename = store_uploaded_image()
 
         vacation_dto = VacationDto(
             country_id=country_id,
@@ -97,7 +92,7 @@ def create_vacation():
             price=price,
             file_name=filename
         )
-        VacationService().register_new_vacation(vacation_dto)
+        VacationService().register_new_vacation(vacation_dto, upload_folder=current_app.config['UPLOAD_FOLDER'])
 
         flash("Vacation created successfully")
         return redirect(url_for('vacations_ui.list_vacations'))
@@ -129,23 +124,17 @@ def delete_vacation(id):
 def like_vacation(id):
     try:
             
-        likes_dao = LikesDao()
-        user_id = session['user_id']
+        result = UserServices().toggle_like(LikesDto(session['user_id'], id))
         
-        existing_like = likes_dao.get_likes_info_by_id(user_id, id)
-        
-        if existing_like:
-            likes_dao.delete_likes_info_by_id(user_id, id)
-            flash("Like removed")
-        else:
-            likes_dao.insert_into_likes(user_id, id)
+        if result['liked']:
             flash("Vacation liked successfully")
+        else:
+            flash("Like removed")
             
             
         return redirect(url_for('vacations_ui.list_vacations')), 302
         
     except Exception as e:
-        db_conn.rollback()
         flash(f"Error with like: {str(e)}")
         return redirect(url_for('vacations_ui.list_vacations'))
     
@@ -0,0 +1,101 @@
+import hashlib
+from functools import wraps
+from inspect import iscoroutinefunction
+from flask import current_app, make_response, request, session
+from src.blueprints.auth.utils import PROFILE_FIELDS, current_profile, remember_profile
+from src.config import media_max_bytes
+from src.dal.user_dao import AsyncUserDao, UserDao
+from src.dal.vacation_dao import AsyncVacationDao, VacationDao
+from src.services import media_store
+
+# Room for the form fields next to the image in a multipart upload.
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+def conditional_on_catalog(f):
+    """
+    Answers conditional GETs of a vacation view from the catalog and likes
+    versions, before the view runs its queries. The ETag covers both versions,
+    the user's session profile and the full URL; Last-Modified is when the
+    catalog or a like last changed. A request whose If-None-Match (or, without
+    one, If-Modified-Since) still matches gets a 304.
+
+    Changes to the user are not versioned, so a session profile older than
+    user_profile_cache_ttl is reloaded (through the profile cache) first, and a
+    changed name or role changes the ETag.
+
+    Pages with pending flash messages are rendered normally and not cached, as
+    the next render of the same URL will not show them.
+    """
+    if iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            if '_flashes' in session:
+                return await f(*args, **kwargs)
+            if current_profile() is None:
+                user = await AsyncUserDao().get_user_info_by_id(session['user_id'])
+                if user is not None:
+                    remember_profile(user)
+            validators = _validators(await AsyncVacationDao().get_catalog_state())
+            if validators is not None and _is_not_modified(*validators):
+                return _not_modified(*validators)
+            return _with_validators(await f(*args, **kwargs), validators)
+        return decorated_coroutine
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if '_flashes' in session:
+            return f(*args, **kwargs)
+        if current_profile() is None:
+            user = UserDao().get_user_info_by_id(session['user_id'])
+            if user is not None:
+                remember_profile(user)
+        validators = _validators(VacationDao().get_catalog_state())
+        if validators is not None and _is_not_modified(*validators):
+            return _not_modified(*validators)
+        return _with_validators(f(*args, **kwargs), validators)
+    return decorated_function
+
+def _validators(state):
+    if state is None:
+        return None
+    profile = session.get('user_profile') or {}
+    key = "|".join(str(part) for part in (
+        state['version'], state['likes_version'], session.get('user_id'), session.get('user_role_id'),
+        *(profile.get(field) for field in PROFILE_FIELDS), request.full_path))
+    return hashlib.sha1(key.encode()).hexdigest(), state['updated_at'].replace(microsecond=0)
+
+def _is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+def _not_modified(etag, last_modified):
+    return _with_validators(('', 304), (etag, last_modified))
+
+def _with_validators(rv, validators):
+    response = make_response(rv)
+    if validators is not None and response.status_code in (200, 304):
+        response.set_etag(validators[0])
+        response.last_modified = validators[1]
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+    return response
+
+def limit_upload_size():
+    """
+    Caps the request body at the image limit, so an oversized upload is refused
+    with a 413 before it is read.
+    """
+    request.max_content_length = media_max_bytes + FORM_OVERHEAD_BYTES
+
+def store_uploaded_image():
+    """
+    Stores the form's image in the media store and returns its content-addressed
+    name, or None when no image was uploaded.
+    """
+    uploaded = request.files.get('image')
+    if not uploaded or not uploaded.filename:
+        return None
+    return media_store.save(uploaded.stream, current_app.config['UPLOAD_FOLDER'])
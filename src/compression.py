@@ -0,0 +1,206 @@
+"""
+WSGI middleware compressing text responses with brotli or gzip, as negotiated
+with the client's Accept-Encoding. Brotli is used only when the optional
+"brotli" package is installed.
+
+Only text-like media types are compressed; images, archives, fonts and other
+already compressed formats pass through untouched, as do partial content,
+HEAD requests and responses that already carry a Content-Encoding. Those
+bodies are returned to the server as the application gave them, so a file
+response keeps its wsgi.file_wrapper and goes out with sendfile.
+
+A response with a Content-Length is compressed whole and keeps an exact
+Content-Length. A streamed response (no Content-Length) is compressed chunk by
+chunk and flushed after every chunk, so the client still receives each chunk as
+soon as the application yields it. Either way, bodies smaller than
+compression_min_size are sent as they are.
+"""
+import zlib
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from src.config import brotli_quality, compression_level, compression_min_size
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset((
+    "application/javascript", "application/json", "application/x-ndjson", "application/xml",
+    "application/manifest+json", "image/svg+xml",
+))
+
+Headers = List[Tuple[str, str]]
+
+
+def _header(headers: Headers, name: str) -> Optional[str]:
+    name = name.lower()
+    return next((value for key, value in headers if key.lower() == name), None)
+
+
+def _without(headers: Headers, *names: str) -> Headers:
+    names = {name.lower() for name in names}
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def _is_compressible_response(status: str, headers: Headers) -> bool:
+    return (_is_compressible(_header(headers, "Content-Type"))
+            and status.startswith("200")
+            and _header(headers, "Content-Encoding") is None
+            and "no-transform" not in (_header(headers, "Cache-Control") or ""))
+
+
+def choose_encoding(accept_encoding: str, brotli_available: bool = brotli is not None) -> Optional[str]:
+    """
+    Picks "br" or "gzip" from an Accept-Encoding header, preferring brotli at
+    equal quality, or returns None when the client accepts neither.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli_available else []) + ["gzip"]
+    scored = [(accepted.get(coding, wildcard), -order, coding) for order, coding in enumerate(candidates)]
+    quality, _, coding = max(scored)
+    return coding if quality > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str) -> None:
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(compression_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self._brotli is not None:
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app: Callable, min_size: int = compression_min_size) -> None:
+        self.app = app
+        self.min_size = min_size
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        encoding = choose_encoding(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if environ.get("REQUEST_METHOD") == "HEAD":
+            encoding = None
+        captured: dict = {}
+        pending: List[bytes] = []
+
+        def capture(status: str, headers: Headers, exc_info: Any = None) -> Callable[[bytes], None]:
+            captured.update(status=status, headers=headers, exc_info=exc_info)
+            return pending.append
+
+        body = self.app(environ, capture)
+        if "status" in captured and not pending and not _is_compressible_response(
+                captured["status"], captured["headers"]):
+            # Hand the body back untouched, so the server still recognises a
+            # wsgi.file_wrapper and can send the file with sendfile.
+            start_response(captured["status"], captured["headers"], captured["exc_info"])
+            return body
+        return self._respond(body, captured, pending, encoding, start_response)
+
+    def _respond(self, body: Iterable[bytes], captured: dict, pending: List[bytes],
+                 encoding: Optional[str], start_response: Callable) -> Iterator[bytes]:
+        try:
+            chunks = iter(body)
+            # The application may call start_response lazily, on its first chunk.
+            first = next(chunks, None)
+            status, headers = captured["status"], list(captured["headers"])
+            buffered = pending + ([first] if first is not None else [])
+
+            def begin(response_headers: Headers) -> None:
+                start_response(status, response_headers, captured["exc_info"])
+
+            compressible = _is_compressible_response(status, headers)
+            if compressible:
+                headers = self._vary_on_encoding(headers)
+            if not compressible or encoding is None:
+                begin(headers)
+                yield from buffered
+                yield from chunks
+                return
+
+            if _header(headers, "Content-Length") is not None:
+                data = b"".join(buffered) + b"".join(chunks)
+                if len(data) < self.min_size:
+                    begin(headers)
+                    yield data
+                    return
+                compressor = _Compressor(encoding)
+                compressed = compressor.compress(data) + compressor.finish()
+                begin(self._encoded_headers(headers, encoding, len(compressed)))
+                yield compressed
+                return
+
+            # Streamed: hold the first chunks back until they reach min_size, so a
+            # short stream goes out uncompressed.
+            size = sum(len(chunk) for chunk in buffered)
+            while size < self.min_size:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    begin(headers)
+                    yield b"".join(buffered)
+                    return
+                buffered.append(chunk)
+                size += len(chunk)
+            compressor = _Compressor(encoding)
+            begin(self._encoded_headers(headers, encoding))
+            yield compressor.compress(b"".join(buffered), flush=True)
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.compress(chunk, flush=True)
+            yield compressor.finish()
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    @staticmethod
+    def _vary_on_encoding(headers: Headers) -> Headers:
+        vary = _header(headers, "Vary")
+        if not vary:
+            return headers + [("Vary", "Accept-Encoding")]
+        if vary.strip() == "*" or "accept-encoding" in vary.lower():
+            return headers
+        return _without(headers, "Vary") + [("Vary", f"{vary}, Accept-Encoding")]
+
+    @staticmethod
+    def _encoded_headers(headers: Headers, encoding: str, length: Optional[int] = None) -> Headers:
+        headers = _without(headers, "Content-Length", "Accept-Ranges")
+        etag = _header(headers, "ETag")
+        if etag is not None and not etag.startswith("W/"):
+            # The compressed bytes differ from the identity ones, so a strong
+            # validator no longer identifies them exactly.
+            headers = _without(headers, "ETag") + [("ETag", f"W/{etag}")]
+        headers.append(("Content-Encoding", encoding))
+        if length is not None:
+            headers.append(("Content-Length", str(length)))
+        return headers
@@ -0,0 +1,157 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import functools
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+import psycopg as pg
+from psycopg_pool import AsyncConnectionPool
+
+from src.config import (conn_info, pool_max_idle, pool_max_lifetime, pool_max_size,
+                        pool_min_size, pool_timeout, prepare_threshold, replica_conn_info)
+from src.dal.instrumentation import AsyncInstrumentedCursor
+from src.dal.database import PRIMARY, REPLICA, current_route, in_unit_of_work
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Flask runs every async view in a short-lived event loop of its own, and an
+# AsyncConnectionPool is bound to the loop it was opened on. The pool therefore
+# lives on one long-running loop in a daemon thread, and async DAO methods are
+# scheduled onto that loop with on_db_loop.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_conninfo: Dict[str, Optional[str]] = {PRIMARY: conn_info, REPLICA: replica_conn_info}
+_pools: Dict[str, AsyncConnectionPool] = {}
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def _on_reconnect_failed(pool: AsyncConnectionPool) -> None:
+    """
+    Called by the pool when it could not reconnect within its reconnect timeout.
+    """
+    logger.error("Connection pool '%s' failed to reconnect to the database", pool.name)
+
+
+def _db_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the event loop that owns the async pool, starting it on first use.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="db-event-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+async def _get_pool(route: str) -> AsyncConnectionPool:
+    """
+    Returns the async pool for a route, opening it on the database loop the first time.
+    """
+    global _pool_lock
+    if route in _pools:
+        return _pools[route]
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if route in _pools:
+            return _pools[route]
+        pool = AsyncConnectionPool(
+            conninfo=_conninfo[route],
+            min_size=pool_min_size,
+            max_size=pool_max_size,
+            timeout=pool_timeout,
+            max_idle=pool_max_idle,
+            max_lifetime=pool_max_lifetime,
+            kwargs={"prepare_threshold": prepare_threshold, "cursor_factory": AsyncInstrumentedCursor},
+            check=AsyncConnectionPool.check_connection,
+            reconnect_failed=_on_reconnect_failed,
+            name=f"{route}-async",
+            open=False,
+        )
+        await pool.open()
+        _pools[route] = pool
+        return pool
+
+
+def _copy_outcome(task: asyncio.Task, result: concurrent.futures.Future) -> None:
+    if task.cancelled():
+        result.cancel()
+    elif task.exception() is not None:
+        result.set_exception(task.exception())
+    else:
+        result.set_result(task.result())
+
+
+def submit(coro: Awaitable[T]) -> concurrent.futures.Future:
+    """
+    Schedules a coroutine on the database loop with the caller's context variables.
+
+    Args:
+        coro (Awaitable[T]): The coroutine to run.
+
+    Returns:
+        concurrent.futures.Future: A future resolved with the coroutine's result.
+    """
+    loop = _db_loop()
+    result: concurrent.futures.Future = concurrent.futures.Future()
+    context = contextvars.copy_context()
+
+    def start() -> None:
+        task = loop.create_task(coro, context=context)
+        task.add_done_callback(lambda done: _copy_outcome(done, result))
+
+    loop.call_soon_threadsafe(start)
+    return result
+
+
+def on_db_loop(method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """
+    Decorates an async DAO method so that it always runs on the database loop,
+    whichever event loop awaits it.
+    """
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        if asyncio.get_running_loop() is _db_loop():
+            return await method(*args, **kwargs)
+        return await asyncio.wrap_future(submit(method(*args, **kwargs)))
+    return wrapper
+
+
+@asynccontextmanager
+async def get_async_connection() -> AsyncIterator[pg.AsyncConnection]:
+    """
+    Yields a pooled async connection for the current route (see
+    src.dal.database.current_route). The work done inside the block is committed
+    when the block exits normally and rolled back when it raises.
+
+    Must be used from a coroutine running on the database loop (see on_db_loop).
+
+    Raises:
+        RuntimeError: Inside a unit_of_work, whose transaction lives on a
+            synchronous connection this block could not be part of.
+    """
+    if in_unit_of_work():
+        raise RuntimeError("Async DAOs cannot take part in a unit of work; use the synchronous DAOs")
+    pool = await _get_pool(current_route())
+    async with pool.connection() as conn:
+        yield conn
+
+
+def close_async_pools() -> None:
+    """
+    Closes the async pools that were opened.
+    """
+    while _pools:
+        _, pool = _pools.popitem()
+        submit(pool.close()).result()
+
+
+atexit.register(close_async_pools)
@@ -0,0 +1,142 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import psycopg.rows as pgrows
+
+from src.config import export_itersize
+from src.dal.async_database import get_async_connection
+from src.dal.database import current_route, dedicated_connection, get_connection
+from src.dal.statements import Statement, statements
+
+
+class BaseDao:
+    """
+    Base class of the synchronous DAOs. Runs registered statements on the
+    connection chosen by get_connection.
+    """
+    table_name: str
+
+    def _fetchall(self, statement: Statement, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        statement.record_call()
+        with get_connection() as conn, conn.cursor(row_factory=pgrows.dict_row) as cur:
+            cur.execute(statement.query, params, prepare=statement.prepare)
+            return cur.fetchall()
+
+    def _fetchone(self, statement: Statement, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        statement.record_call()
+        with get_connection() as conn, conn.cursor(row_factory=pgrows.dict_row) as cur:
+            cur.execute(statement.query, params, prepare=statement.prepare)
+            return cur.fetchone()
+
+    def _fetchvalue(self, statement: Statement, params: Sequence[Any] = ()) -> Any:
+        """
+        Returns the first column of the first row, or None when there are no rows.
+        """
+        statement.record_call()
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(statement.query, params, prepare=statement.prepare)
+            row = cur.fetchone()
+            return row[0] if row else None
+
+    def _execute(self, statement: Statement, params: Sequence[Any] = ()) -> int:
+        """
+        Runs a statement that returns no rows and returns the affected row count.
+        """
+        statement.record_call()
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(statement.query, params, prepare=statement.prepare)
+            return cur.rowcount
+
+    def _update_column(self, id: int, column: str, new_value: Any) -> int:
+        return self._execute(statements.column_update(self.table_name, column), (new_value, id))
+
+    def _update_columns(self, id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Sets several columns of a row in one UPDATE and returns the updated row, or None if there is no such row.
+        """
+        columns = sorted(changes)
+        return self._fetchone(statements.columns_update(self.table_name, columns),
+                              (*(changes[column] for column in columns), id))
+
+    def _copy(self, statement: Statement, rows: Iterable[Sequence[Any]]) -> int:
+        """
+        Streams rows to a "COPY ... FROM STDIN" statement and returns how many were sent.
+        """
+        statement.record_call()
+        count = 0
+        with get_connection() as conn, conn.cursor() as cur:
+            with cur.copy(statement.query) as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+        return count
+
+    def _iterate(self, statement: Statement, params: Sequence[Any] = (),
+                 itersize: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Returns a lazy iterator over the rows of a query. The rows are read from a
+        named server-side cursor, itersize rows per round trip, on a dedicated
+        connection that is released once the iterator is exhausted or closed.
+
+        The route is chosen when this is called, not when iteration starts, so
+        replica_read and primary_write on the calling DAO method still apply.
+        """
+        statement.record_call()
+        return self._stream(statement, params, current_route(), itersize or export_itersize)
+
+    def _stream(self, statement: Statement, params: Sequence[Any], route: str,
+                itersize: int) -> Iterator[Dict[str, Any]]:
+        with dedicated_connection(route) as conn, \
+                conn.cursor(name=statement.name, row_factory=pgrows.dict_row) as cur:
+            cur.itersize = itersize
+            cur.execute(statement.query, params)
+            yield from cur
+
+
+class AsyncBaseDao:
+    """
+    Base class of the async DAOs. Its methods must run on the database loop,
+    so subclasses decorate their public methods with on_db_loop.
+    """
+    table_name: str
+
+    async def _fetchall(self, statement: Statement, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        statement.record_call()
+        async with get_async_connection() as conn, conn.cursor(row_factory=pgrows.dict_row) as cur:
+            await cur.execute(statement.query, params, prepare=statement.prepare)
+            return await cur.fetchall()
+
+    async def _fetchone(self, statement: Statement, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        statement.record_call()
+        async with get_async_connection() as conn, conn.cursor(row_factory=pgrows.dict_row) as cur:
+            await cur.execute(statement.query, params, prepare=statement.prepare)
+            return await cur.fetchone()
+
+    async def _fetchvalue(self, statement: Statement, params: Sequence[Any] = ()) -> Any:
+        """
+        Returns the first column of the first row, or None when there are no rows.
+        """
+        statement.record_call()
+        async with get_async_connection() as conn, conn.cursor() as cur:
+            await cur.execute(statement.query, params, prepare=statement.prepare)
+            row = await cur.fetchone()
+            return row[0] if row else None
+
+    async def _execute(self, statement: Statement, params: Sequence[Any] = ()) -> int:
+        """
+        Runs a statement that returns no rows and returns the affected row count.
+        """
+        statement.record_call()
+        async with get_async_connection() as conn, conn.cursor() as cur:
+            await cur.execute(statement.query, params, prepare=statement.prepare)
+            return cur.rowcount
+
+    async def _update_column(self, id: int, column: str, new_value: Any) -> int:
+        return await self._execute(statements.column_update(self.table_name, column), (new_value, id))
+
+    async def _update_columns(self, id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Sets several columns of a row in one UPDATE and returns the updated row, or None if there is no such row.
+        """
+        columns = sorted(changes)
+        return await self._fetchone(statements.columns_update(self.table_name, columns),
+                                    (*(changes[column] for column in columns), id))
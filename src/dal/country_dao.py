@@ -1,29 +1,42 @@
-from src.dal.database import db_conn
-import psycopg.sql
-import psycopg.rows as pgrows
+from src.dal.database import primary_write, replica_read
+from src.dal.async_database import on_db_loop
+from src.dal.base_dao import BaseDao, AsyncBaseDao
+from src.dal.invalidation import publish_async, publishing, subscribe
+from src.dal.reference_cache import ReferenceCache
+from src.dal.statements import statements
 from typing import List, Dict, Optional
 
+TABLE_NAME = "countries"
 
-class CountryDao:
+GET_ALL_COUNTRIES = statements.register(TABLE_NAME, "get_all_countries", "SELECT * FROM {table};")
+INSERT_COUNTRY = statements.register(
+    TABLE_NAME, "insert_into_countries", "INSERT INTO {table} (country_name) VALUES (%s);")
+GET_COUNTRY_BY_ID = statements.register(
+    TABLE_NAME, "get_country_info_by_id", "SELECT * FROM {table} WHERE id = %s;")
+DELETE_COUNTRY_BY_ID = statements.register(
+    TABLE_NAME, "delete_country_info_by_id", "DELETE FROM {table} WHERE id = %s;")
+
+countries_cache = ReferenceCache(TABLE_NAME, GET_ALL_COUNTRIES, "country_name")
+subscribe(TABLE_NAME, lambda key: countries_cache.invalidate())
+
+
+class CountryDao(BaseDao):
     def __init__(self) -> None:
         """
         Initializes the CountryDao class with the table name 'countries'.
         """
-        self.table_name: str = "countries"
+        self.table_name: str = TABLE_NAME
 
     def get_all_countries(self) -> List[Dict[str, any]]:
         """
-        Retrieves all countries from the database.
+        Retrieves all countries, from the in-process countries cache.
 
         Returns:
             List[Dict[str, any]]: A list of dictionaries representing countries.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT * FROM {};").format(psycopg.sql.Identifier(self.table_name)))
-            result = cur.fetchall()
-        return result
+        return countries_cache.all()
 
+    @primary_write
     def insert_into_countries(self, country_name: str) -> None:
         """
         Inserts a new country into the database.
@@ -31,14 +44,12 @@ class CountryDao:
         Args:
             country_name (str): The name of the country to insert.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(psycopg.sql.SQL("INSERT INTO {} (country_name) VALUES (%s);").format(
-                psycopg.sql.Identifier(self.table_name)), (country_name,))
-            db_conn.commit()
+        with publishing(TABLE_NAME):
+            self._execute(INSERT_COUNTRY, (country_name,))
 
     def get_country_info_by_id(self, id: int) -> Optional[Dict[str, any]]:
         """
-        Retrieves country information by country ID.
+        Retrieves country information by country ID, from the countries cache.
 
         Args:
             id (int): The country ID.
@@ -46,12 +57,21 @@ class CountryDao:
         Returns:
             Optional[Dict[str, any]]: A dictionary representing the country if found, otherwise None.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT * FROM {} WHERE id = %s;").format(psycopg.sql.Identifier(self.table_name)), (id,))
-            result = cur.fetchone()
-        return result
+        return countries_cache.by_id(id)
+
+    def get_country_by_name(self, country_name: str) -> Optional[Dict[str, any]]:
+        """
+        Retrieves a country by its name, from the countries cache.
 
+        Args:
+            country_name (str): The country name.
+
+        Returns:
+            Optional[Dict[str, any]]: A dictionary representing the country if found, otherwise None.
+        """
+        return countries_cache.by_name(country_name)
+
+    @primary_write
     def update_country_info_by_id(self, id: int, column: str, new_value: any) -> None:
         """
         Updates country information by country ID.
@@ -61,16 +81,10 @@ class CountryDao:
             column (str): The column to update.
             new_value (any): The new value to set.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("UPDATE {} SET {} = %s WHERE id = %s;").format(
-                    psycopg.sql.Identifier(
-                        self.table_name), psycopg.sql.Identifier(column)
-                ),
-                (new_value, id)
-            )
-            db_conn.commit()
+        with publishing(TABLE_NAME):
+            self._update_column(id, column, new_value)
 
+    @primary_write
     def delete_country_info_by_id(self, id: int) -> None:
         """
         Deletes a country by country ID.
@@ -78,7 +92,76 @@ class CountryDao:
         Args:
             id (int): The country ID.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(psycopg.sql.SQL("DELETE FROM {} WHERE id = %s;").format(
-                psycopg.sql.Identifier(self.table_name)), (id,))
-            db_conn.commit()
+        with publishing(TABLE_NAME):
+            self._execute(DELETE_COUNTRY_BY_ID, (id,))
+
+
+class AsyncCountryDao(AsyncBaseDao):
+    def __init__(self) -> None:
+        """
+        Initializes the AsyncCountryDao class with the table name 'countries'.
+        """
+        self.table_name: str = TABLE_NAME
+
+    @on_db_loop
+    @replica_read
+    async def get_all_countries(self) -> List[Dict[str, any]]:
+        """
+        Retrieves all countries from the database.
+
+        Returns:
+            List[Dict[str, any]]: A list of dictionaries representing countries.
+        """
+        return await self._fetchall(GET_ALL_COUNTRIES)
+
+    @on_db_loop
+    @primary_write
+    async def insert_into_countries(self, country_name: str) -> None:
+        """
+        Inserts a new country into the database.
+
+        Args:
+            country_name (str): The name of the country to insert.
+        """
+        await self._execute(INSERT_COUNTRY, (country_name,))
+        await publish_async(TABLE_NAME)
+
+    @on_db_loop
+    @replica_read
+    async def get_country_info_by_id(self, id: int) -> Optional[Dict[str, any]]:
+        """
+        Retrieves country information by country ID.
+
+        Args:
+            id (int): The country ID.
+
+        Returns:
+            Optional[Dict[str, any]]: A dictionary representing the country if found, otherwise None.
+        """
+        return await self._fetchone(GET_COUNTRY_BY_ID, (id,))
+
+    @on_db_loop
+    @primary_write
+    async def update_country_info_by_id(self, id: int, column: str, new_value: any) -> None:
+        """
+        Updates country information by country ID.
+
+        Args:
+            id (int): The country ID.
+            column (str): The column to update.
+            new_value (any): The new value to set.
+        """
+        await self._update_column(id, column, new_value)
+        await publish_async(TABLE_NAME)
+
+    @on_db_loop
+    @primary_write
+    async def delete_country_info_by_id(self, id: int) -> None:
+        """
+        Deletes a country by country ID.
+
+        Args:
+            id (int): The country ID.
+        """
+        await self._execute(DELETE_COUNTRY_BY_ID, (id,))
+        await publish_async(TABLE_NAME)
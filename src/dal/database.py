@@ -1,5 +1,378 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
 import psycopg as pg
+from psycopg import pq
+from psycopg_pool import ConnectionPool
+
+from src.dal.instrumentation import InstrumentedCursor
+from src.config import (conn_info, pool_max_idle, pool_max_lifetime, pool_max_size,
+                        pool_min_size, pool_timeout, prepare_threshold, pool_wait_warning_ms,
+                        read_your_writes_window, replica_conn_info)
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "primary"
+REPLICA = "replica"
+
+
+def _on_reconnect_failed(pool: ConnectionPool) -> None:
+    """
+    Called by the pool when it could not reconnect within its reconnect timeout.
+    """
+    logger.error("Connection pool '%s' failed to reconnect to the database", pool.name)
+
+
+def _create_pool(conninfo: str, name: str) -> ConnectionPool:
+    return ConnectionPool(
+        conninfo=conninfo,
+        min_size=pool_min_size,
+        max_size=pool_max_size,
+        timeout=pool_timeout,
+        max_idle=pool_max_idle,
+        max_lifetime=pool_max_lifetime,
+        kwargs={"prepare_threshold": prepare_threshold, "cursor_factory": InstrumentedCursor},
+        check=ConnectionPool.check_connection,
+        reconnect_failed=_on_reconnect_failed,
+        name=name,
+        open=True,
+    )
+
+
+db_pool = _create_pool(conn_info, PRIMARY)
+replica_pool: Optional[ConnectionPool] = _create_pool(replica_conn_info, REPLICA) if replica_conn_info else None
+_pools: Dict[str, ConnectionPool] = {PRIMARY: db_pool}
+if replica_pool is not None:
+    _pools[REPLICA] = replica_pool
+
+
+class _RequestScope:
+    """
+    Holds the connections borrowed for the duration of one request, one per
+    route, and whether the request must read from the primary.
+    """
+
+    def __init__(self, primary_until: float = 0.0) -> None:
+        self.conns: Dict[str, pg.Connection] = {}
+        self.wait_ms: float = 0.0
+        self.primary_until: float = primary_until
+        self.wrote: bool = False
+
+
+class _UnitOfWork:
+    """
+    The connection and savepoint depth of the unit of work the current context
+    is in, and the callbacks to run once it commits.
+    """
+
+    def __init__(self, conn: pg.Connection) -> None:
+        self.conn = conn
+        self.depth = 0
+        self.on_commit: List[Callable[[], None]] = []
+
+
+_request_scope: ContextVar[Optional[_RequestScope]] = ContextVar("request_scope", default=None)
+_route: ContextVar[str] = ContextVar("db_route", default=PRIMARY)
+_unit_of_work: ContextVar[Optional[_UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+
+def _checkout(route: str) -> tuple:
+    """
+    Borrows a connection from the route's pool and measures how long the caller waited for it.
+
+    Returns:
+        tuple: The connection and the wait time in milliseconds.
+    """
+    pool = _pools[route]
+    started = time.perf_counter()
+    conn = pool.getconn()
+    wait_ms = (time.perf_counter() - started) * 1000
+    if wait_ms >= pool_wait_warning_ms:
+        logger.warning("Waited %.1f ms for a database connection (%s)", wait_ms, pool_stats(route))
+    return conn, wait_ms
+
+
+def begin_request(primary_until: float = 0.0) -> None:
+    """
+    Opens a request scope. The first DAO call inside it borrows a connection
+    from the pool, and every later call in the same request reuses it.
+
+    Args:
+        primary_until (float): Epoch time until which this client's reads must go
+            to the primary, because it wrote recently.
+    """
+    _request_scope.set(_RequestScope(primary_until))
+
+
+def end_request(error: Optional[BaseException] = None) -> None:
+    """
+    Closes the current request scope and returns its connections to their pools.
+
+    Args:
+        error (Optional[BaseException]): The exception that ended the request, if any.
+    """
+    scope = _request_scope.get()
+    if scope is None:
+        return
+    _request_scope.set(None)
+    for route, conn in scope.conns.items():
+        if error is not None or conn.info.transaction_status != pq.TransactionStatus.IDLE:
+            conn.rollback()
+        _pools[route].putconn(conn)
+
+
+def request_primary_until() -> Optional[float]:
+    """
+    Returns the new read-your-writes deadline if the current request wrote to
+    the primary, otherwise None.
+    """
+    scope = _request_scope.get()
+    if scope is None or not scope.wrote:
+        return None
+    return time.time() + read_your_writes_window
+
+
+def current_route() -> str:
+    """
+    Returns the route the current DAO call should use. Reads marked with
+    replica_read go to the replica unless no replica is configured or the
+    client wrote within the read-your-writes window.
+    """
+    if _route.get() != REPLICA or not replica_conn_info:
+        return PRIMARY
+    scope = _request_scope.get()
+    if scope is not None and (scope.wrote or time.time() < scope.primary_until):
+        return PRIMARY
+    return REPLICA
+
+
+def _record_write() -> None:
+    scope = _request_scope.get()
+    if scope is not None:
+        scope.wrote = True
+
+
+def _routed(method: Callable, route: str, record_write: bool) -> Callable:
+    if iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            token = _route.set(route)
+            try:
+                result = await method(*args, **kwargs)
+            finally:
+                _route.reset(token)
+            if record_write:
+                _record_write()
+            return result
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = _route.set(route)
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            _route.reset(token)
+        if record_write:
+            _record_write()
+        return result
+    return wrapper
+
+
+def replica_read(method: Callable) -> Callable:
+    """
+    Marks a DAO method as a read that may be served by the replica pool.
+    """
+    return _routed(method, REPLICA, record_write=False)
+
+
+def primary_write(method: Callable) -> Callable:
+    """
+    Marks a DAO method as a write. It runs on the primary and pins the client's
+    later reads to the primary for read_your_writes_window seconds.
+    """
+    return _routed(method, PRIMARY, record_write=True)
+
+
+@contextmanager
+def reading_primary() -> Iterator[None]:
+    """
+    Sends the reads made inside the block to the primary, even those marked
+    replica_read, without pinning the client's later reads to it.
+    """
+    token = _route.set(PRIMARY)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+@contextmanager
+def get_connection() -> Iterator[pg.Connection]:
+    """
+    Yields a pooled connection for the current route. The work done inside the
+    block is committed when the block exits normally and rolled back when it raises.
+
+    Inside a request scope the request's connection is reused; otherwise a
+    connection is borrowed from the pool just for this block. Inside a
+    unit_of_work the unit's connection is used and nothing is committed here.
+    """
+    unit = _unit_of_work.get()
+    if unit is not None:
+        yield unit.conn
+        return
+
+    route = current_route()
+    scope = _request_scope.get()
+    if scope is None:
+        conn, _ = _checkout(route)
+        try:
+            yield from _committing(conn)
+        finally:
+            _pools[route].putconn(conn)
+        return
+
+    if route not in scope.conns:
+        scope.conns[route], wait_ms = _checkout(route)
+        scope.wait_ms += wait_ms
+    yield from _committing(scope.conns[route])
+
+
+@contextmanager
+def dedicated_connection(route: Optional[str] = None) -> Iterator[pg.Connection]:
+    """
+    Yields a connection borrowed just for this block, outside the request scope,
+    committing or rolling back like get_connection. Used for work that outlives
+    the request, such as a streamed response that is still being sent after the
+    request scope has been closed.
+
+    Args:
+        route (Optional[str]): PRIMARY or REPLICA. Defaults to current_route().
+    """
+    route = route or current_route()
+    conn, _ = _checkout(route)
+    try:
+        yield from _committing(conn)
+    finally:
+        _pools[route].putconn(conn)
+
+
+@contextmanager
+def unit_of_work() -> Iterator[pg.Connection]:
+    """
+    Groups the DAO calls made inside the block into one transaction on the
+    primary, committed once when the outermost block exits normally and rolled
+    back when it raises. Reads inside the block see its own writes.
+
+    A nested unit_of_work becomes a savepoint: if it raises, only its own work
+    is rolled back and the exception propagates to the enclosing block, which
+    may catch it and carry on.
+
+    Only the synchronous DAOs join a unit of work; the async DAOs run on their
+    own connections and refuse to run inside one.
+    """
+    unit = _unit_of_work.get()
+    if unit is not None:
+        unit.depth += 1
+        savepoint = pg.sql.Identifier(f"unit_of_work_{unit.depth}")
+        unit.conn.execute(pg.sql.SQL("SAVEPOINT {}").format(savepoint))
+        try:
+            yield unit.conn
+        except BaseException:
+            if not unit.conn.closed:
+                unit.conn.execute(pg.sql.SQL("ROLLBACK TO SAVEPOINT {}").format(savepoint))
+            raise
+        else:
+            unit.conn.execute(pg.sql.SQL("RELEASE SAVEPOINT {}").format(savepoint))
+        finally:
+            unit.depth -= 1
+        return
+
+    token = _route.set(PRIMARY)
+    try:
+        with get_connection() as conn:
+            unit = _UnitOfWork(conn)
+            token_unit = _unit_of_work.set(unit)
+            try:
+                yield conn
+            finally:
+                _unit_of_work.reset(token_unit)
+    finally:
+        _route.reset(token)
+    for callback in unit.on_commit:
+        callback()
+
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """
+    Runs callback once the current unit of work commits, or right away outside
+    of one, where every DAO call has already committed when it returns. Used to
+    drop cached data only when the change that stales it is visible to others.
+    Callbacks registered in a savepoint that is rolled back still run.
+    """
+    unit = _unit_of_work.get()
+    if unit is None:
+        callback()
+    else:
+        unit.on_commit.append(callback)
+
+
+def in_unit_of_work() -> bool:
+    """
+    Returns whether the current context is inside a unit_of_work block.
+    """
+    return _unit_of_work.get() is not None
+
+
+def _committing(conn: pg.Connection) -> Iterator[pg.Connection]:
+    """
+    Yields the connection, then commits on success or rolls back on error.
+    """
+    try:
+        yield conn
+    except BaseException:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    conn.commit()
+
+
+def request_pool_wait_ms() -> float:
+    """
+    Returns how long the current request waited for its connections, in milliseconds.
+    """
+    scope = _request_scope.get()
+    return scope.wait_ms if scope is not None else 0.0
+
+
+def pool_routes() -> List[str]:
+    """
+    Returns the routes that have a pool: PRIMARY, and REPLICA when one is configured.
+    """
+    return list(_pools)
+
+
+def pool_stats(route: str = PRIMARY) -> Dict[str, Any]:
+    """
+    Returns a snapshot of a pool's size, utilisation and wait statistics.
 
-from src.config import conn_info
+    Args:
+        route (str): PRIMARY or REPLICA.
 
-db_conn = pg.connect(conninfo=conn_info)
+    Returns:
+        Dict[str, Any]: The raw psycopg_pool statistics plus the derived
+        'utilisation' (share of max_size in use) and 'avg_wait_ms' values.
+    """
+    pool = _pools[route]
+    stats = pool.get_stats()
+    in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+    requests = stats.get("requests_num", 0)
+    stats["in_use"] = in_use
+    stats["utilisation"] = in_use / pool.max_size if pool.max_size else 0.0
+    stats["avg_wait_ms"] = stats.get("requests_wait_ms", 0) / requests if requests else 0.0
+    return stats
@@ -0,0 +1,131 @@
+"""
+Times every statement the DAOs execute. The pools create their connections with
+InstrumentedCursor / AsyncInstrumentedCursor as cursor factory, so all cursors
+opened through get_connection and get_async_connection are measured.
+
+Statements slower than slow_query_ms are logged as they finish. Inside a request
+(see start_request_stats) every statement is also recorded, and the summary
+flags statements run more than n_plus_one_threshold times, the usual sign of a
+query issued once per row of a previous result.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import psycopg as pg
+from psycopg import sql
+
+from src.config import n_plus_one_threshold, slow_query_ms
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryRecord:
+    statement: str
+    param_count: int
+    duration_ms: float
+    rows: int
+
+
+@dataclass
+class RequestQueryStats:
+    """
+    The statements run while handling one request. Async DAO calls record into
+    it from the database loop thread, hence the lock.
+    """
+    queries: List[QueryRecord] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, record: QueryRecord) -> None:
+        with self._lock:
+            self.queries.append(record)
+
+    def n_plus_one(self) -> Dict[str, int]:
+        """
+        Returns the statements run more than n_plus_one_threshold times, with their counts.
+        """
+        with self._lock:
+            counts = Counter(record.statement for record in self.queries)
+        return {statement: count for statement, count in counts.items() if count > n_plus_one_threshold}
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            queries = list(self.queries)
+        return {
+            "count": len(queries),
+            "total_ms": round(sum(record.duration_ms for record in queries), 3),
+            "rows": sum(max(record.rows, 0) for record in queries),
+            "slow": [record.statement for record in queries if record.duration_ms >= slow_query_ms],
+            "n_plus_one": self.n_plus_one(),
+        }
+
+
+_request_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def start_request_stats() -> RequestQueryStats:
+    """
+    Starts recording the statements run in the current context, normally a request.
+    """
+    stats = RequestQueryStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def request_stats() -> Optional[RequestQueryStats]:
+    return _request_stats.get()
+
+
+def end_request_stats() -> Optional[RequestQueryStats]:
+    """
+    Stops recording and returns what the current context recorded.
+    """
+    stats = _request_stats.get()
+    _request_stats.set(None)
+    return stats
+
+
+def _statement_text(query: Any, context: Any) -> str:
+    if isinstance(query, sql.Composable):
+        return query.as_string(context)
+    if isinstance(query, bytes):
+        return query.decode(errors="replace")
+    return str(query)
+
+
+def _record(cursor: Any, query: Any, params: Any, started: float) -> None:
+    if not query:
+        # The pools' connection health check runs an empty statement.
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    stats = _request_stats.get()
+    if stats is None and duration_ms < slow_query_ms:
+        return
+    statement = _statement_text(query, cursor)
+    if duration_ms >= slow_query_ms:
+        logger.warning("Slow query (%.1f ms): %s", duration_ms, statement)
+    if stats is not None:
+        stats.add(QueryRecord(statement, len(params) if params else 0, duration_ms, cursor.rowcount))
+
+
+class InstrumentedCursor(pg.Cursor):
+    def execute(self, query: Any, params: Any = None, **kwargs: Any) -> "InstrumentedCursor":
+        started = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            _record(self, query, params, started)
+
+
+class AsyncInstrumentedCursor(pg.AsyncCursor):
+    async def execute(self, query: Any, params: Any = None, **kwargs: Any) -> "AsyncInstrumentedCursor":
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            _record(self, query, params, started)
@@ -0,0 +1,205 @@
+"""
+Cache invalidation across worker processes and nodes with PostgreSQL LISTEN/NOTIFY.
+
+DAO writes to tables that are cached in process (users, countries, roles) run
+inside `with publishing(topic, key):`, which sends a NOTIFY on
+invalidation_channel in the same transaction as the write and, once that
+transaction commits, calls the local handlers registered with
+subscribe(topic, handler). Every worker runs a listener thread (see
+start_listener) with a connection of its own LISTENing on the channel, and
+hands the notifications published by other processes to the same handlers.
+Tables nobody caches do not publish, so their writes cost no extra round trip.
+
+Postgres only delivers a notification once its transaction commits, so a
+handler never runs for a write that was rolled back. Notifications sent while a
+listener is disconnected are lost; when it reconnects every handler is called
+with key None, meaning "drop everything for this topic".
+
+The async DAOs cannot share a transaction between statements: publish_async
+sends its NOTIFY in a transaction of its own, right after the write commits.
+
+Topics are table names; keys are row ids, or None when a write may touch any row.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import psycopg as pg
+from psycopg import sql
+
+from src.config import conn_info, invalidation_channel, invalidation_listener
+from src.dal.async_database import get_async_connection
+from src.dal.database import after_commit, get_connection, in_unit_of_work, unit_of_work
+from src.dal.statements import statements
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Optional[Any]], None]
+
+NOTIFY = statements.register("invalidation", "notify", "SELECT pg_notify(%s, %s);")
+
+_handlers: Dict[str, List[Handler]] = {}
+_handlers_lock = threading.Lock()
+_origin: Tuple[int, str] = (0, "")
+_listener: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _process_origin() -> str:
+    """
+    Returns an id unique to this process, renewed after a fork, so a worker can
+    recognise and skip its own notifications.
+    """
+    global _origin
+    if _origin[0] != os.getpid():
+        _origin = (os.getpid(), uuid.uuid4().hex)
+    return _origin[1]
+
+
+def subscribe(topic: str, handler: Handler) -> None:
+    """
+    Registers a handler called with the key of every change published on topic,
+    by this process or any other.
+
+    Args:
+        topic (str): The topic, by convention a table name.
+        handler (Handler): Called with the changed key, or None for "any key".
+    """
+    with _handlers_lock:
+        _handlers.setdefault(topic, []).append(handler)
+
+
+def _dispatch(topic: str, key: Optional[Any]) -> None:
+    with _handlers_lock:
+        handlers = list(_handlers.get(topic, ()))
+    for handler in handlers:
+        try:
+            handler(key)
+        except Exception:
+            logger.exception("Invalidation handler for %s failed", topic)
+
+
+def _dispatch_all() -> None:
+    with _handlers_lock:
+        topics = list(_handlers)
+    for topic in topics:
+        _dispatch(topic, None)
+
+
+def _payload(topic: str, key: Optional[Any]) -> str:
+    return json.dumps({"topic": topic, "key": key, "origin": _process_origin()})
+
+
+def publish(topic: str, key: Optional[Any] = None) -> None:
+    """
+    Sends the NOTIFY announcing a change on the current connection. Inside a
+    unit_of_work it is part of the unit's transaction and local handlers run
+    once the unit commits; outside of one it commits on its own, after the
+    write it announces, so DAO methods use publishing instead.
+
+    Must be called from a primary_write method: a replica cannot send NOTIFY.
+
+    Args:
+        topic (str): The topic, by convention a table name.
+        key (Optional[Any]): The changed row id, None when any row may have changed.
+    """
+    NOTIFY.record_call()
+    with get_connection() as conn:
+        conn.execute(NOTIFY.query, (invalidation_channel, _payload(topic, key)))
+    after_commit(lambda: _dispatch(topic, key))
+
+
+@contextmanager
+def publishing(topic: str, key: Optional[Any] = None) -> Iterator[None]:
+    """
+    Runs the writes of the block and the NOTIFY announcing them in one
+    transaction: that of the enclosing unit_of_work, or one opened for the
+    block. Nothing is published if the block raises.
+
+    Args:
+        topic (str): The topic, by convention a table name.
+        key (Optional[Any]): The changed row id, None when any row may have changed.
+    """
+    with nullcontext() if in_unit_of_work() else unit_of_work():
+        yield
+        publish(topic, key)
+
+
+async def publish_async(topic: str, key: Optional[Any] = None) -> None:
+    """
+    Like publish, for async DAO write methods. Their writes have already been
+    committed, so the NOTIFY goes in a transaction of its own.
+    """
+    NOTIFY.record_call()
+    async with get_async_connection() as conn:
+        await conn.execute(NOTIFY.query, (invalidation_channel, _payload(topic, key)))
+    _dispatch(topic, key)
+
+
+def _handle(payload: str) -> None:
+    try:
+        message = json.loads(payload)
+        topic, key, origin = message["topic"], message.get("key"), message.get("origin")
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Ignoring malformed invalidation message: %r", payload)
+        return
+    if origin != _process_origin():
+        _dispatch(topic, key)
+
+
+def _listen(conninfo: str, channel: str) -> None:
+    connected_before = False
+    delay = 1.0
+    while not _stop.is_set():
+        try:
+            with pg.connect(conninfo, autocommit=True) as conn:
+                conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                delay = 1.0
+                if connected_before:
+                    # Whatever was published while we were away is lost.
+                    _dispatch_all()
+                connected_before = True
+                while not _stop.is_set():
+                    for notify in conn.notifies(timeout=1.0):
+                        _handle(notify.payload)
+        except pg.Error as e:
+            logger.warning("Invalidation listener lost its connection (%s), retrying in %.0f s", e, delay)
+            _stop.wait(delay)
+            delay = min(delay * 2, 30.0)
+
+
+def start_listener(conninfo: str = conn_info, channel: str = invalidation_channel,
+                   enabled: bool = invalidation_listener) -> Optional[threading.Thread]:
+    """
+    Starts this process's listener thread, unless it is disabled or already running.
+    A forked worker must call it again: threads do not survive a fork.
+
+    Returns:
+        Optional[threading.Thread]: The listener thread, or None when disabled.
+    """
+    global _listener
+    if not enabled:
+        return None
+    if _listener is not None and _listener.is_alive():
+        return _listener
+    _stop.clear()
+    _listener = threading.Thread(target=_listen, args=(conninfo, channel), name="invalidation-listener",
+                                 daemon=True)
+    _listener.start()
+    return _listener
+
+
+def stop_listener() -> None:
+    """
+    Stops the listener thread within about a second.
+    """
+    global _listener
+    _stop.set()
+    if _listener is not None:
+        _listener.join(timeout=5)
+        _listener = None
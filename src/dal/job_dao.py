@@ -0,0 +1,196 @@
+from src.dal.database import primary_write, replica_read
+from src.dal.base_dao import BaseDao
+from src.dal.statements import statements
+from src.models.job_dto import JobDto
+from psycopg.types.json import Jsonb
+from typing import Any, Dict, Optional
+
+TABLE_NAME = "jobs"
+
+# Jobs with a unique_key are skipped while another job with the same key is
+# queued and not yet tried (see jobs_unique_key_idx); RETURNING then yields no row.
+ENQUEUE_JOB = statements.register(
+    TABLE_NAME, "enqueue_job",
+    "INSERT INTO {table} (kind, payload, priority, run_at, max_attempts, unique_key) "
+    "VALUES (%s, %s, %s, COALESCE(%s, now()), %s, %s) "
+    "ON CONFLICT (unique_key) WHERE status = 'queued' AND attempts = 0 DO NOTHING RETURNING id;")
+# Claims the most urgent due job in one round trip. SKIP LOCKED lets concurrent
+# workers each take a different row instead of queueing on the same one; the
+# row lock only lasts until this statement commits, after which status and
+# locked_by keep other workers off the job.
+CLAIM_JOB = statements.register(
+    TABLE_NAME, "claim_job",
+    "UPDATE {table} SET status = 'running', attempts = attempts + 1, locked_by = %s, locked_at = now(), "
+    "heartbeat_at = now() "
+    "WHERE id = (SELECT id FROM {table} WHERE status = 'queued' AND run_at <= now() "
+    "ORDER BY priority DESC, run_at, id LIMIT 1 FOR UPDATE SKIP LOCKED) "
+    "RETURNING id, kind, payload, priority, run_at, attempts, max_attempts, unique_key;", prepare=True)
+COMPLETE_JOB = statements.register(
+    TABLE_NAME, "complete_job",
+    "UPDATE {table} SET status = 'done', finished_at = now(), locked_by = NULL WHERE id = %s AND locked_by = %s;",
+    prepare=True)
+RETRY_JOB = statements.register(
+    TABLE_NAME, "retry_job",
+    "UPDATE {table} SET status = 'queued', run_at = now() + make_interval(secs => %s), last_error = %s, "
+    "locked_by = NULL, locked_at = NULL, heartbeat_at = NULL WHERE id = %s AND locked_by = %s;")
+FAIL_JOB = statements.register(
+    TABLE_NAME, "fail_job",
+    "UPDATE {table} SET status = 'failed', finished_at = now(), last_error = %s, locked_by = NULL "
+    "WHERE id = %s AND locked_by = %s;")
+HEARTBEAT_JOB = statements.register(
+    TABLE_NAME, "heartbeat_job",
+    "UPDATE {table} SET heartbeat_at = now() WHERE id = %s AND locked_by = %s AND status = 'running';",
+    prepare=True)
+# Jobs whose worker died mid-run are still marked running, but their heartbeat
+# stops; after the lock timeout they go back to the queue, or fail once out of attempts.
+REQUEUE_STALE_JOBS = statements.register(
+    TABLE_NAME, "requeue_stale_jobs",
+    "UPDATE {table} SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+    "last_error = 'worker lost', locked_by = NULL, locked_at = NULL, heartbeat_at = NULL, "
+    "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE now() END "
+    "WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => %s);")
+DELETE_FINISHED_JOBS = statements.register(
+    TABLE_NAME, "delete_finished_jobs",
+    "DELETE FROM {table} WHERE status IN ('done', 'failed') AND finished_at < now() - make_interval(secs => %s);")
+COUNT_JOBS_BY_STATUS = statements.register(
+    TABLE_NAME, "count_jobs_by_status", "SELECT status, COUNT(*) AS count FROM {table} GROUP BY status;")
+GET_JOB_BY_ID = statements.register(TABLE_NAME, "get_job_by_id", "SELECT * FROM {table} WHERE id = %s;")
+
+
+class JobDao(BaseDao):
+    def __init__(self) -> None:
+        """
+        Initializes the JobDao class with the table name 'jobs'.
+        """
+        self.table_name: str = TABLE_NAME
+
+    @primary_write
+    def enqueue(self, job_dto: JobDto) -> Optional[int]:
+        """
+        Adds a job to the queue. Inside a unit_of_work the job only becomes
+        visible to workers once the unit commits.
+
+        Args:
+            job_dto (JobDto): The job; run_at None means now.
+
+        Returns:
+            Optional[int]: The job's id, or None when a job with the same unique_key is already queued.
+        """
+        return self._fetchvalue(ENQUEUE_JOB, (job_dto.kind, Jsonb(job_dto.payload), job_dto.priority,
+                                              job_dto.run_at, job_dto.max_attempts, job_dto.unique_key))
+
+    @primary_write
+    def claim(self, worker_id: str) -> Optional[JobDto]:
+        """
+        Marks the most urgent due job as running by this worker.
+
+        Args:
+            worker_id (str): Identifies the claiming worker.
+
+        Returns:
+            Optional[JobDto]: The claimed job, or None when no job is due.
+        """
+        row = self._fetchone(CLAIM_JOB, (worker_id,))
+        return JobDto(**row) if row else None
+
+    @primary_write
+    def complete(self, job_id: int, worker_id: str) -> int:
+        """
+        Marks a running job as done.
+
+        Args:
+            job_id (int): The job's id.
+            worker_id (str): The worker that claimed it.
+
+        Returns:
+            int: 1, or 0 if the job was taken away from the worker meanwhile.
+        """
+        return self._execute(COMPLETE_JOB, (job_id, worker_id))
+
+    @primary_write
+    def retry(self, job_id: int, worker_id: str, delay: float, error: str) -> int:
+        """
+        Puts a failed job back in the queue to run again after a delay.
+
+        Args:
+            job_id (int): The job's id.
+            worker_id (str): The worker that claimed it.
+            delay (float): Seconds from now until the job is due again.
+            error (str): Why this attempt failed.
+
+        Returns:
+            int: 1, or 0 if the job was taken away from the worker meanwhile.
+        """
+        return self._execute(RETRY_JOB, (delay, error, job_id, worker_id))
+
+    @primary_write
+    def fail(self, job_id: int, worker_id: str, error: str) -> int:
+        """
+        Marks a job as failed for good.
+
+        Args:
+            job_id (int): The job's id.
+            worker_id (str): The worker that claimed it.
+            error (str): Why the last attempt failed.
+
+        Returns:
+            int: 1, or 0 if the job was taken away from the worker meanwhile.
+        """
+        return self._execute(FAIL_JOB, (error, job_id, worker_id))
+
+    @primary_write
+    def heartbeat(self, job_id: int, worker_id: str) -> int:
+        """
+        Records that the worker is still running the job.
+
+        Args:
+            job_id (int): The job's id.
+            worker_id (str): The worker that claimed it.
+
+        Returns:
+            int: 1, or 0 if the job was taken away from the worker meanwhile.
+        """
+        return self._execute(HEARTBEAT_JOB, (job_id, worker_id))
+
+    @primary_write
+    def requeue_stale(self, lock_timeout: float) -> int:
+        """
+        Releases the running jobs whose worker has sent no heartbeat for lock_timeout seconds.
+
+        Args:
+            lock_timeout (float): Seconds without a heartbeat after which a running job is presumed abandoned.
+
+        Returns:
+            int: The number of jobs released.
+        """
+        return self._execute(REQUEUE_STALE_JOBS, (lock_timeout,))
+
+    @primary_write
+    def delete_finished(self, older_than: float) -> int:
+        """
+        Deletes the done and failed jobs that finished more than older_than seconds ago.
+
+        Args:
+            older_than (float): Age in seconds.
+
+        Returns:
+            int: The number of jobs deleted.
+        """
+        return self._execute(DELETE_FINISHED_JOBS, (older_than,))
+
+    @replica_read
+    def count_by_status(self) -> Dict[str, int]:
+        """
+        Returns how many jobs are in each status.
+        """
+        return {row['status']: row['count'] for row in self._fetchall(COUNT_JOBS_BY_STATUS)}
+
+    @primary_write
+    def get_job_by_id(self, id: int) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a job by its id.
+
+        Args:
+            id (int): The job's id.
+        """
+        return self._fetchone(GET_JOB_BY_ID, (id,))
@@ -1,18 +1,79 @@
-from src.dal.database import db_conn
-import psycopg.sql
-import psycopg.rows as pgrows
+from src.dal.database import get_connection, primary_write, replica_read
+from src.dal.async_database import on_db_loop
+from src.dal.base_dao import BaseDao, AsyncBaseDao
+from src.dal.statements import statements
 
-from typing import List, Dict, Optional
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Tuple
 
+TABLE_NAME = "likes"
 
-class LikesDao:
+GET_ALL_LIKES = statements.register(TABLE_NAME, "get_all_likes", "SELECT * FROM {table};")
+INSERT_LIKE = statements.register(
+    TABLE_NAME, "insert_into_likes", "INSERT INTO {table} (user_id, vacation_id) VALUES (%s, %s);")
+GET_LIKE = statements.register(
+    TABLE_NAME, "get_likes_info_by_id",
+    "SELECT * FROM {table} WHERE user_id = %s AND vacation_id = %s;", prepare=True)
+DELETE_LIKE = statements.register(
+    TABLE_NAME, "delete_likes_info_by_id", "DELETE FROM {table} WHERE user_id = %s AND vacation_id = %s;")
+DELETE_VACATION_LIKES = statements.register(
+    TABLE_NAME, "delete_likes_by_vacation_id", "DELETE FROM {table} WHERE vacation_id = %s;")
+COUNT_LIKES = statements.register(
+    TABLE_NAME, "get_likes_count", "SELECT likes_count FROM vacations WHERE id = %s;", prepare=True)
+# Deletes the like if it exists and inserts it otherwise, in one statement. The
+# trigger updates vacations.likes_count after the statement's snapshot was taken,
+# so the new count is computed from the old one.
+TOGGLE_LIKE = statements.register(
+    TABLE_NAME, "toggle_like",
+    "WITH deleted AS ("
+    "DELETE FROM {table} WHERE user_id = %(user_id)s AND vacation_id = %(vacation_id)s RETURNING 1), "
+    "inserted AS ("
+    "INSERT INTO {table} (user_id, vacation_id) SELECT %(user_id)s, %(vacation_id)s "
+    "WHERE NOT EXISTS (SELECT 1 FROM deleted) AND EXISTS (SELECT 1 FROM vacations WHERE id = %(vacation_id)s) "
+    "ON CONFLICT ON CONSTRAINT unique_like DO NOTHING RETURNING 1) "
+    "SELECT NOT EXISTS (SELECT 1 FROM deleted) AS liked, "
+    "vacations.likes_count + (SELECT COUNT(*) FROM inserted) - (SELECT COUNT(*) FROM deleted) AS likes_count "
+    "FROM vacations WHERE vacations.id = %(vacation_id)s;", prepare=True)
+# Like and unlike in one statement each. A like that already exists and an
+# unlike of a missing like change no row, so they fire no trigger.
+SET_LIKE = statements.register(
+    TABLE_NAME, "like_vacation",
+    "WITH inserted AS ("
+    "INSERT INTO {table} (user_id, vacation_id) SELECT %(user_id)s, %(vacation_id)s "
+    "WHERE EXISTS (SELECT 1 FROM vacations WHERE id = %(vacation_id)s) "
+    "ON CONFLICT ON CONSTRAINT unique_like DO NOTHING RETURNING 1) "
+    "SELECT TRUE AS liked, vacations.likes_count + (SELECT COUNT(*) FROM inserted) AS likes_count "
+    "FROM vacations WHERE vacations.id = %(vacation_id)s;", prepare=True)
+REMOVE_LIKE = statements.register(
+    TABLE_NAME, "unlike_vacation",
+    "WITH deleted AS ("
+    "DELETE FROM {table} WHERE user_id = %(user_id)s AND vacation_id = %(vacation_id)s RETURNING 1) "
+    "SELECT FALSE AS liked, vacations.likes_count - (SELECT COUNT(*) FROM deleted) AS likes_count "
+    "FROM vacations WHERE vacations.id = %(vacation_id)s;", prepare=True)
+CREATE_LIKES_STAGING = statements.register(
+    TABLE_NAME, "create_likes_staging",
+    "CREATE TEMP TABLE IF NOT EXISTS likes_staging (user_id INT, vacation_id INT) ON COMMIT DROP;")
+CLEAR_LIKES_STAGING = statements.register(TABLE_NAME, "clear_likes_staging", "TRUNCATE likes_staging;")
+COPY_LIKES_STAGING = statements.register(
+    TABLE_NAME, "copy_likes_staging", "COPY likes_staging (user_id, vacation_id) FROM STDIN")
+INSERT_LIKES_FROM_STAGING = statements.register(
+    TABLE_NAME, "insert_likes_from_staging",
+    "INSERT INTO {table} (user_id, vacation_id) "
+    "SELECT DISTINCT staged.user_id, staged.vacation_id FROM likes_staging staged "
+    "JOIN users ON users.id = staged.user_id "
+    "JOIN vacations ON vacations.id = staged.vacation_id "
+    "ON CONFLICT ON CONSTRAINT unique_like DO NOTHING "
+    "RETURNING user_id, vacation_id;")
+
+
+class LikesDao(BaseDao):
     def __init__(self) -> None:
         """
         Initializes the LikesDao class.
         Sets the table name to "likes".
         """
-        self.table_name = "likes"
+        self.table_name = TABLE_NAME
 
+    @replica_read
     def get_all_likes(self) -> List[Dict[str, Optional[str]]]:
         """
         Retrieves all records from the 'likes' table.
@@ -22,12 +83,20 @@ class LikesDao:
         Returns:
             List[Dict[str, Optional[str]]]: A list of dictionaries containing data for all rows in the 'likes' table.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT * FROM {};").format(psycopg.sql.Identifier(self.table_name)))
-            result = cur.fetchall()
-        return result
+        return self._fetchall(GET_ALL_LIKES)
+
+    @replica_read
+    def iter_all_likes(self, itersize: Optional[int] = None) -> Iterator[Dict[str, Optional[str]]]:
+        """
+        Lazily iterates over all records of the 'likes' table, using a server-side
+        cursor so the table is never loaded into memory.
 
+        Args:
+            itersize (Optional[int]): Rows fetched per round trip, defaults to export_itersize.
+        """
+        return self._iterate(GET_ALL_LIKES, itersize=itersize)
+
+    @primary_write
     def insert_into_likes(self, user_id: int, vacation_id: int) -> None:
         """
         Inserts a new record into the 'likes' table.
@@ -38,14 +107,9 @@ class LikesDao:
             user_id (int): The user ID.
             vacation_id (int): The vacation ID.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("INSERT INTO {} (user_id, vacation_id) VALUES (%s, %s);").format(
-                    psycopg.sql.Identifier(self.table_name)),
-                (user_id, vacation_id)
-            )
-            db_conn.commit()
+        self._execute(INSERT_LIKE, (user_id, vacation_id))
 
+    @replica_read
     def get_likes_info_by_id(self, user_id: int, vacation_id: int) -> List[Dict[str, Optional[str]]]:
         """
         Retrieves the record from the 'likes' table for a specific user and vacation.
@@ -59,15 +123,9 @@ class LikesDao:
         Returns:
             List[Dict[str, Optional[str]]]: A list of dictionaries representing the record matching the criteria.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(
-                psycopg.sql.SQL("SELECT * FROM {} WHERE user_id = %s AND vacation_id = %s;").format(
-                    psycopg.sql.Identifier(self.table_name)),
-                (user_id, vacation_id)
-            )
-            result = cur.fetchall()
-        return result
+        return self._fetchall(GET_LIKE, (user_id, vacation_id))
 
+    @primary_write
     def delete_likes_info_by_id(self, user_id: int, vacation_id: int) -> None:
         """
         Deletes a record from the 'likes' table for a specific user and vacation.
@@ -78,23 +136,210 @@ class LikesDao:
             user_id (int): The user ID.
             vacation_id (int): The vacation ID.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("DELETE FROM {} WHERE user_id = %s AND vacation_id = %s;").format(
-                    psycopg.sql.Identifier(self.table_name)),
-                (user_id, vacation_id)
-            )
-            db_conn.commit()
+        self._execute(DELETE_LIKE, (user_id, vacation_id))
+
+    @primary_write
+    def delete_likes_by_vacation_id(self, vacation_id: int) -> int:
+        """
+        Deletes all likes of a vacation.
+
+        Args:
+            vacation_id (int): The vacation ID.
+
+        Returns:
+            int: The number of likes deleted.
+        """
+        return self._execute(DELETE_VACATION_LIKES, (vacation_id,))
 
+    @replica_read
     def get_likes_count(self, vacation_id: int) -> int:
         """
-        Returns the number of likes for a vacation
+        Returns the number of likes for a vacation, read from its likes_count column.
+        """
+        return self._fetchvalue(COUNT_LIKES, (vacation_id,)) or 0
+
+    @primary_write
+    def toggle_like(self, user_id: int, vacation_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Likes the vacation if the user has not liked it yet and removes the like otherwise,
+        in a single statement. Concurrent toggles never fail on the unique_like constraint.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: The new 'liked' state and the vacation's new 'likes_count',
+            or None if the vacation does not exist.
+        """
+        return self._fetchone(TOGGLE_LIKE, {"user_id": user_id, "vacation_id": vacation_id})
+
+    @primary_write
+    def like_vacation(self, user_id: int, vacation_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Likes the vacation, unless the user already likes it, in a single statement.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: 'liked' (True) and the vacation's 'likes_count',
+            or None if the vacation does not exist.
+        """
+        return self._fetchone(SET_LIKE, {"user_id": user_id, "vacation_id": vacation_id})
+
+    @primary_write
+    def unlike_vacation(self, user_id: int, vacation_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Removes the user's like of the vacation, if any, in a single statement.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: 'liked' (False) and the vacation's 'likes_count',
+            or None if the vacation does not exist.
+        """
+        return self._fetchone(REMOVE_LIKE, {"user_id": user_id, "vacation_id": vacation_id})
+
+    @primary_write
+    def bulk_insert_likes(self, pairs: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Inserts many likes at once. The pairs are sent with COPY into a temporary
+        staging table and then inserted, skipping pairs whose user or vacation
+        does not exist and pairs that are already liked.
+
+        Args:
+            pairs (Iterable[Tuple[int, int]]): The (user_id, vacation_id) pairs to insert.
+
+        Returns:
+            List[Tuple[int, int]]: The pairs that were actually inserted.
+        """
+        for statement in (CREATE_LIKES_STAGING, CLEAR_LIKES_STAGING, COPY_LIKES_STAGING, INSERT_LIKES_FROM_STAGING):
+            statement.record_call()
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(CREATE_LIKES_STAGING.query)
+            cur.execute(CLEAR_LIKES_STAGING.query)
+            with cur.copy(COPY_LIKES_STAGING.query) as copy:
+                for pair in pairs:
+                    copy.write_row(pair)
+            cur.execute(INSERT_LIKES_FROM_STAGING.query)
+            return [tuple(row) for row in cur.fetchall()]
+
+
+class AsyncLikesDao(AsyncBaseDao):
+    def __init__(self) -> None:
+        """
+        Initializes the AsyncLikesDao class.
+        Sets the table name to "likes".
+        """
+        self.table_name = TABLE_NAME
+
+    @on_db_loop
+    @replica_read
+    async def get_all_likes(self) -> List[Dict[str, Optional[str]]]:
+        """
+        Retrieves all records from the 'likes' table.
+
+        Returns:
+            List[Dict[str, Optional[str]]]: A list of dictionaries containing data for all rows in the 'likes' table.
+        """
+        return await self._fetchall(GET_ALL_LIKES)
+
+    @on_db_loop
+    @primary_write
+    async def insert_into_likes(self, user_id: int, vacation_id: int) -> None:
+        """
+        Inserts a new record into the 'likes' table.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+        """
+        await self._execute(INSERT_LIKE, (user_id, vacation_id))
+
+    @on_db_loop
+    @replica_read
+    async def get_likes_info_by_id(self, user_id: int, vacation_id: int) -> List[Dict[str, Optional[str]]]:
+        """
+        Retrieves the record from the 'likes' table for a specific user and vacation.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+
+        Returns:
+            List[Dict[str, Optional[str]]]: A list of dictionaries representing the record matching the criteria.
+        """
+        return await self._fetchall(GET_LIKE, (user_id, vacation_id))
+
+    @on_db_loop
+    @primary_write
+    async def delete_likes_info_by_id(self, user_id: int, vacation_id: int) -> None:
+        """
+        Deletes a record from the 'likes' table for a specific user and vacation.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+        """
+        await self._execute(DELETE_LIKE, (user_id, vacation_id))
+
+    @on_db_loop
+    @replica_read
+    async def get_likes_count(self, vacation_id: int) -> int:
+        """
+        Returns the number of likes for a vacation, read from its likes_count column.
+        """
+        return await self._fetchvalue(COUNT_LIKES, (vacation_id,)) or 0
+
+    @on_db_loop
+    @primary_write
+    async def toggle_like(self, user_id: int, vacation_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Likes the vacation if the user has not liked it yet and removes the like otherwise,
+        in a single statement.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: The new 'liked' state and the vacation's new 'likes_count',
+            or None if the vacation does not exist.
+        """
+        return await self._fetchone(TOGGLE_LIKE, {"user_id": user_id, "vacation_id": vacation_id})
+
+    @on_db_loop
+    @primary_write
+    async def like_vacation(self, user_id: int, vacation_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Likes the vacation, unless the user already likes it, in a single statement.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: 'liked' (True) and the vacation's 'likes_count',
+            or None if the vacation does not exist.
+        """
+        return await self._fetchone(SET_LIKE, {"user_id": user_id, "vacation_id": vacation_id})
+
+    @on_db_loop
+    @primary_write
+    async def unlike_vacation(self, user_id: int, vacation_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Removes the user's like of the vacation, if any, in a single statement.
+
+        Args:
+            user_id (int): The user ID.
+            vacation_id (int): The vacation ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: 'liked' (False) and the vacation's 'likes_count',
+            or None if the vacation does not exist.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("SELECT COUNT(*) FROM {} WHERE vacation_id = %s;").format(
-                    psycopg.sql.Identifier(self.table_name)),
-                (vacation_id,)
-            )
-            result = cur.fetchone()
-            return result[0] if result else 0
+        return await self._fetchone(REMOVE_LIKE, {"user_id": user_id, "vacation_id": vacation_id})
@@ -0,0 +1,153 @@
+"""
+Applies the numbered SQL files in src/migrations to the database, in order,
+recording each applied version in the schema_migrations table.
+
+src/init_db.sql is the baseline schema; migrations start at version 1. A file
+is named NNNN_description.sql and runs in one transaction, unless its first
+line is "-- migrate: no-transaction". Such a file runs statement by statement
+in autocommit mode, which CREATE INDEX CONCURRENTLY requires; its statements
+should be idempotent (IF NOT EXISTS) so a failed run can be retried.
+
+Usage:
+    python -m src.dal.migrations            apply pending migrations
+    python -m src.dal.migrations --status   list applied and pending migrations
+"""
+import argparse
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+import psycopg as pg
+
+from src.config import conn_info
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+NO_TRANSACTION = "-- migrate: no-transaction"
+# Arbitrary key of the advisory lock that keeps two runners from migrating at once.
+LOCK_KEY = 7316001
+
+_FILE_NAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: str
+
+    @property
+    def sql(self) -> str:
+        with open(self.path, encoding="utf-8") as file:
+            return file.read()
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql.lstrip().startswith(NO_TRANSACTION)
+
+    def statements(self) -> List[str]:
+        """
+        Splits the file into statements on semicolons that end a line, dropping comment lines.
+        """
+        lines = [line for line in self.sql.splitlines() if not line.lstrip().startswith("--")]
+        return [statement.strip() for statement in re.split(r";\s*$", "\n".join(lines), flags=re.MULTILINE)
+                if statement.strip()]
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    Returns the migrations found in a directory, ordered by version.
+
+    Raises:
+        ValueError: If two files share a version number.
+    """
+    migrations = {}
+    for file_name in sorted(os.listdir(directory)):
+        match = _FILE_NAME.match(file_name)
+        if match is None:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {file_name}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, file_name))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def applied_versions(conn: pg.Connection) -> Set[int]:
+    conn.execute(CREATE_VERSION_TABLE)
+    return {row[0] for row in conn.execute("SELECT version FROM schema_migrations;")}
+
+
+def _apply(conn: pg.Connection, migration: Migration) -> None:
+    record = ("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (migration.version, migration.name))
+    if migration.transactional:
+        with conn.transaction():
+            conn.execute(migration.sql)
+            conn.execute(*record)
+        return
+    for statement in migration.statements():
+        conn.execute(statement)
+    conn.execute(*record)
+
+
+def migrate(conninfo: str = conn_info, directory: str = MIGRATIONS_DIR,
+            target: Optional[int] = None) -> List[Migration]:
+    """
+    Applies the pending migrations up to target (all of them by default).
+
+    Args:
+        conninfo (str): The database to migrate.
+        directory (str): Where the migration files are.
+        target (Optional[int]): The last version to apply.
+
+    Returns:
+        List[Migration]: The migrations applied by this call.
+    """
+    applied = []
+    with pg.connect(conninfo, autocommit=True) as conn:
+        conn.execute("SELECT pg_advisory_lock(%s);", (LOCK_KEY,))
+        try:
+            done = applied_versions(conn)
+            for migration in load_migrations(directory):
+                if migration.version in done or (target is not None and migration.version > target):
+                    continue
+                logger.info("Applying migration %04d_%s", migration.version, migration.name)
+                _apply(conn, migration)
+                applied.append(migration)
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s);", (LOCK_KEY,))
+    return applied
+
+
+def status(conninfo: str = conn_info, directory: str = MIGRATIONS_DIR) -> List[str]:
+    """
+    Returns one line per migration saying whether it has been applied.
+    """
+    with pg.connect(conninfo, autocommit=True) as conn:
+        done = applied_versions(conn)
+    return [f"{'applied' if migration.version in done else 'pending'}  {migration.version:04d}_{migration.name}"
+            for migration in load_migrations(directory)]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Apply the database migrations in src/migrations.")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--target", type=int, help="the last version to apply")
+    args = parser.parse_args()
+    if args.status:
+        print("\n".join(status()))
+    else:
+        applied_migrations = migrate(target=args.target)
+        print(f"Applied {len(applied_migrations)} migration(s)")
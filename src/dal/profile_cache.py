@@ -0,0 +1,108 @@
+"""
+In-process cache of user profiles by id, in front of UserDao.get_user_info_by_id.
+It holds only the profile columns, never the password hash.
+
+Unlike the reference caches, the users table is large, so this one holds only
+recently used rows: at most max_size of them, evicting the least recently used,
+and each for at most ttl seconds. The TTL bounds how stale a row can get when a
+change is missed, e.g. one made outside the DAOs. UserDao's writes drop the
+changed user in every worker through the invalidation bus. The replica may not
+have the change yet, so for lag_window seconds after dropping a user the cache
+reports it as settling and UserDao reloads it from the primary.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.config import read_your_writes_window, user_profile_cache_size, user_profile_cache_ttl
+
+
+class ProfileCache:
+    """
+    A bounded LRU mapping of user id to row, with a TTL per entry.
+
+    A row loaded while an invalidation happened may predate it, so put() only
+    stores rows loaded since the last invalidation: callers read `generation`
+    before loading and hand it back. Lookups return copies of the cached rows.
+    """
+
+    def __init__(self, name: str, max_size: int = user_profile_cache_size,
+                 ttl: float = user_profile_cache_ttl, lag_window: float = read_your_writes_window) -> None:
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lag_window = lag_window
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._rows: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._settling: Dict[int, float] = {}
+        self._all_settling_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, id: int) -> Optional[Dict[str, Any]]:
+        """
+        Returns a copy of the cached row, or None when it is missing or expired.
+        """
+        with self._lock:
+            entry = self._rows.get(id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._rows.move_to_end(id)
+                self.hits += 1
+                return dict(entry[1])
+            if entry is not None:
+                del self._rows[id]
+            self.misses += 1
+            return None
+
+    def put(self, id: int, row: Dict[str, Any], generation: int) -> None:
+        """
+        Caches a row loaded after reading `generation`, unless the cache was
+        invalidated since.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._rows[id] = (time.monotonic() + self.ttl, dict(row))
+            self._rows.move_to_end(id)
+            while len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+                self.evictions += 1
+
+    def settling(self, id: int) -> bool:
+        """
+        Tells whether the user was dropped less than lag_window seconds ago, so
+        the replica may still return the row from before the change.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return now < self._all_settling_until or now < self._settling.get(id, 0.0)
+
+    def invalidate(self, id: Optional[int] = None) -> None:
+        """
+        Drops one user, or every user when id is None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.generation += 1
+            self._settling = {settling_id: until for settling_id, until in self._settling.items() if until > now}
+            if id is None:
+                self._rows.clear()
+                self._all_settling_until = now + self.lag_window
+            else:
+                self._rows.pop(id, None)
+                self._settling[id] = now + self.lag_window
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "size": len(self._rows), "hit_ratio": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,106 @@
+"""
+In-process caches of small tables that rarely change: countries and roles.
+
+Each cache loads its whole table once, at startup or on the first lookup after
+being invalidated, and answers lookups by id and by name from dictionaries.
+CountryDao and RolesDao read through it, and their writes invalidate it in every
+worker once committed, through the invalidation bus (see src/dal/invalidation.py).
+"""
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg as pg
+import psycopg.rows as pgrows
+
+from src.dal.database import PRIMARY, dedicated_connection
+from src.dal.statements import Statement
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]], Dict[str, Dict[str, Any]]]
+
+
+class ReferenceCache:
+    """
+    A whole table held in memory, keyed by id and by a unique name column.
+
+    Loads are done under the cache's lock, so concurrent misses run a single
+    query and an invalidation waits for a load in progress before dropping it.
+    The rows and their indexes are swapped as one snapshot, and each lookup
+    reads the snapshot it loaded, so an invalidation racing it cannot make a
+    row that exists look missing. Lookups return copies of the cached rows.
+    """
+
+    def __init__(self, name: str, statement: Statement, name_column: str) -> None:
+        self.name = name
+        self.statement = statement
+        self.name_column = name_column
+        self.hits = 0
+        self.misses = 0
+        self._snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+
+    def _query(self) -> List[Dict[str, Any]]:
+        # Read from the primary on a connection of its own: a lagging replica or
+        # the uncommitted work of the current request must not end up cached.
+        self.statement.record_call()
+        with dedicated_connection(PRIMARY) as conn, conn.cursor(row_factory=pgrows.dict_row) as cur:
+            cur.execute(self.statement.query)
+            return cur.fetchall()
+
+    def _loaded(self) -> Snapshot:
+        with self._lock:
+            if self._snapshot is not None:
+                self.hits += 1
+                return self._snapshot
+            self.misses += 1
+            rows = self._query()
+            self._snapshot = (rows, {row["id"]: row for row in rows},
+                              {row[self.name_column]: row for row in rows})
+            return self._snapshot
+
+    def load(self) -> None:
+        """
+        Loads the table unless it is already cached.
+        """
+        self._loaded()
+
+    def all(self) -> List[Dict[str, Any]]:
+        rows, _, _ = self._loaded()
+        return [dict(row) for row in rows]
+
+    def by_id(self, id: int) -> Optional[Dict[str, Any]]:
+        _, by_id, _ = self._loaded()
+        row = by_id.get(id)
+        return dict(row) if row is not None else None
+
+    def by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        _, _, by_name = self._loaded()
+        row = by_name.get(name)
+        return dict(row) if row is not None else None
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached table; the next lookup loads it again.
+        """
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+def warm(*caches: ReferenceCache) -> None:
+    """
+    Loads the caches at startup. A database that is not reachable yet is only
+    logged; the caches then load on their first lookup.
+    """
+    for cache in caches:
+        try:
+            cache.load()
+        except pg.Error as e:
+            logger.warning("Could not load the %s cache at startup: %s", cache.name, e)
@@ -1,30 +1,39 @@
-from src.dal.database import db_conn
-import psycopg.sql
-import psycopg.rows as pgrows
-import psycopg.sql
-from typing import List, Dict, Any
+from src.dal.database import primary_write, replica_read
+from src.dal.async_database import on_db_loop
+from src.dal.base_dao import BaseDao, AsyncBaseDao
+from src.dal.invalidation import publish_async, publishing, subscribe
+from src.dal.reference_cache import ReferenceCache
+from src.dal.statements import statements
+from typing import List, Dict, Any, Optional
 
+TABLE_NAME = "roles"
 
-class RolesDao:
+GET_ALL_ROLES = statements.register(TABLE_NAME, "get_all_roles", "SELECT * FROM {table};")
+INSERT_ROLE = statements.register(TABLE_NAME, "insert_into_roles", "INSERT INTO {table} (name) VALUES (%s);")
+GET_ROLE_BY_ID = statements.register(TABLE_NAME, "get_roles_info_by_id", "SELECT * FROM {table} WHERE id = %s;")
+DELETE_ROLE_BY_ID = statements.register(TABLE_NAME, "delete_roles_info_by_id", "DELETE FROM {table} WHERE id = %s;")
+
+roles_cache = ReferenceCache(TABLE_NAME, GET_ALL_ROLES, "name")
+subscribe(TABLE_NAME, lambda key: roles_cache.invalidate())
+
+
+class RolesDao(BaseDao):
     def __init__(self) -> None:
         """
         Initializes the RolesDao class with the table name 'roles'.
         """
-        self.table_name = "roles"
+        self.table_name = TABLE_NAME
 
     def get_all_roles(self) -> List[Dict[str, Any]]:
         """
-        Retrieves all roles from the database.
+        Retrieves all roles, from the in-process roles cache.
 
         Returns:
             List[Dict[str, Any]]: A list of dictionaries containing role information.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT * FROM {};").format(psycopg.sql.Identifier(self.table_name)))
-            result = cur.fetchall()
-        return result
+        return roles_cache.all()
 
+    @primary_write
     def insert_into_roles(self, name: str) -> None:
         """
         Inserts a new role into the database.
@@ -32,16 +41,12 @@ class RolesDao:
         Args:
             name (str): The name of the role.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("INSERT INTO {} (name) VALUES (%s);")
-                .format(psycopg.sql.Identifier(self.table_name)), (name,)
-            )
-            db_conn.commit()
+        with publishing(TABLE_NAME):
+            self._execute(INSERT_ROLE, (name,))
 
     def get_roles_info_by_id(self, id: int) -> List[Dict[str, Any]]:
         """
-        Retrieves role information by role ID.
+        Retrieves role information by role ID, from the roles cache.
 
         Args:
             id (int): The role ID.
@@ -49,14 +54,22 @@ class RolesDao:
         Returns:
             List[Dict[str, Any]]: A list containing role details.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(
-                psycopg.sql.SQL("SELECT * FROM {} WHERE id = %s;")
-                .format(psycopg.sql.Identifier(self.table_name)), (id,)
-            )
-            result = cur.fetchall()
-        return result
+        role = roles_cache.by_id(id)
+        return [role] if role is not None else []
+
+    def get_role_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a role by its name, from the roles cache.
 
+        Args:
+            name (str): The role name.
+
+        Returns:
+            Optional[Dict[str, Any]]: The role if found, otherwise None.
+        """
+        return roles_cache.by_name(name)
+
+    @primary_write
     def update_roles_info_by_id(self, id: int, column: str, new_value: Any) -> None:
         """
         Updates role information by role ID.
@@ -66,14 +79,10 @@ class RolesDao:
             column (str): The column to update.
             new_value (Any): The new value to set.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("UPDATE {} SET {} = %s WHERE id = %s;")
-                .format(psycopg.sql.Identifier(self.table_name), psycopg.sql.Identifier(column)),
-                (new_value, id),
-            )
-            db_conn.commit()
+        with publishing(TABLE_NAME):
+            self._update_column(id, column, new_value)
 
+    @primary_write
     def delete_roles_info_by_id(self, id: int) -> None:
         """
         Deletes a role by role ID.
@@ -81,9 +90,76 @@ class RolesDao:
         Args:
             id (int): The role ID.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("DELETE FROM {} WHERE id = %s;")
-                .format(psycopg.sql.Identifier(self.table_name)), (id,)
-            )
-            db_conn.commit()
+        with publishing(TABLE_NAME):
+            self._execute(DELETE_ROLE_BY_ID, (id,))
+
+
+class AsyncRolesDao(AsyncBaseDao):
+    def __init__(self) -> None:
+        """
+        Initializes the AsyncRolesDao class with the table name 'roles'.
+        """
+        self.table_name = TABLE_NAME
+
+    @on_db_loop
+    @replica_read
+    async def get_all_roles(self) -> List[Dict[str, Any]]:
+        """
+        Retrieves all roles from the database.
+
+        Returns:
+            List[Dict[str, Any]]: A list of dictionaries containing role information.
+        """
+        return await self._fetchall(GET_ALL_ROLES)
+
+    @on_db_loop
+    @primary_write
+    async def insert_into_roles(self, name: str) -> None:
+        """
+        Inserts a new role into the database.
+
+        Args:
+            name (str): The name of the role.
+        """
+        await self._execute(INSERT_ROLE, (name,))
+        await publish_async(TABLE_NAME)
+
+    @on_db_loop
+    @replica_read
+    async def get_roles_info_by_id(self, id: int) -> List[Dict[str, Any]]:
+        """
+        Retrieves role information by role ID.
+
+        Args:
+            id (int): The role ID.
+
+        Returns:
+            List[Dict[str, Any]]: A list containing role details.
+        """
+        return await self._fetchall(GET_ROLE_BY_ID, (id,))
+
+    @on_db_loop
+    @primary_write
+    async def update_roles_info_by_id(self, id: int, column: str, new_value: Any) -> None:
+        """
+        Updates role information by role ID.
+
+        Args:
+            id (int): The role ID.
+            column (str): The column to update.
+            new_value (Any): The new value to set.
+        """
+        await self._update_column(id, column, new_value)
+        await publish_async(TABLE_NAME)
+
+    @on_db_loop
+    @primary_write
+    async def delete_roles_info_by_id(self, id: int) -> None:
+        """
+        Deletes a role by role ID.
+
+        Args:
+            id (int): The role ID.
+        """
+        await self._execute(DELETE_ROLE_BY_ID, (id,))
+        await publish_async(TABLE_NAME)
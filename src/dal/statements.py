@@ -0,0 +1,115 @@
+import threading
+from typing import Dict, Optional, Sequence
+
+import psycopg.sql
+
+
+class Statement:
+    """
+    A query composed once, together with how it should be prepared and how
+    many times it has run.
+    """
+
+    def __init__(self, name: str, query: psycopg.sql.Composable, prepare: Optional[bool] = None) -> None:
+        """
+        Args:
+            name (str): Unique name, conventionally "<table>.<method>".
+            query (psycopg.sql.Composable): The composed query.
+            prepare (Optional[bool]): True to prepare on the server on first use,
+                False to never prepare, None to let the connection's prepare
+                threshold decide.
+        """
+        self.name = name
+        self.query = query
+        self.prepare = prepare
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def record_call(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def __repr__(self) -> str:
+        return f"Statement({self.name!r}, calls={self.calls})"
+
+
+class StatementRegistry:
+    """
+    Holds every statement the DAOs run, keyed by name.
+    """
+
+    def __init__(self) -> None:
+        self._statements: Dict[str, Statement] = {}
+        self._lock = threading.Lock()
+
+    def register(self, table: str, name: str, template: str, prepare: Optional[bool] = None) -> Statement:
+        """
+        Composes a statement for a table and registers it.
+
+        Args:
+            table (str): The table the statement runs against, substituted for {table}.
+            name (str): The statement name within the table.
+            template (str): The SQL text, with {table} where the table name goes.
+            prepare (Optional[bool]): See Statement.
+
+        Returns:
+            Statement: The registered statement.
+        """
+        query = psycopg.sql.SQL(template).format(table=psycopg.sql.Identifier(table))
+        statement = Statement(f"{table}.{name}", query, prepare)
+        with self._lock:
+            if statement.name in self._statements:
+                raise ValueError(f"Statement {statement.name} is already registered")
+            self._statements[statement.name] = statement
+        return statement
+
+    def column_update(self, table: str, column: str) -> Statement:
+        """
+        Returns the "UPDATE <table> SET <column> = %s WHERE id = %s" statement,
+        composing and registering it the first time the column is updated.
+
+        Args:
+            table (str): The table to update.
+            column (str): The column to set.
+        """
+        name = f"{table}.update_{column}"
+        with self._lock:
+            statement = self._statements.get(name)
+            if statement is None:
+                query = psycopg.sql.SQL("UPDATE {} SET {} = %s WHERE id = %s;").format(
+                    psycopg.sql.Identifier(table), psycopg.sql.Identifier(column))
+                statement = self._statements[name] = Statement(name, query)
+        return statement
+
+    def columns_update(self, table: str, columns: Sequence[str]) -> Statement:
+        """
+        Returns the "UPDATE <table> SET <column> = %s, ... WHERE id = %s RETURNING *"
+        statement for a set of columns, composing and registering it the first
+        time that set is updated. The values are passed in the given column order.
+
+        Args:
+            table (str): The table to update.
+            columns (Sequence[str]): The columns to set, at least one.
+        """
+        name = f"{table}.update_{'_'.join(columns)}_returning"
+        with self._lock:
+            statement = self._statements.get(name)
+            if statement is None:
+                assignments = psycopg.sql.SQL(", ").join(
+                    psycopg.sql.SQL("{} = %s").format(psycopg.sql.Identifier(column)) for column in columns)
+                query = psycopg.sql.SQL("UPDATE {} SET {} WHERE id = %s RETURNING *;").format(
+                    psycopg.sql.Identifier(table), assignments)
+                statement = self._statements[name] = Statement(name, query)
+        return statement
+
+    def get(self, name: str) -> Statement:
+        return self._statements[name]
+
+    def call_counts(self) -> Dict[str, int]:
+        """
+        Returns how many times each registered statement has run.
+        """
+        return {name: statement.calls for name, statement in self._statements.items()}
+
+
+statements = StatementRegistry()
@@ -1,34 +1,71 @@
-from src.dal.database import db_conn
-import psycopg.sql
-import psycopg.rows as pgrows
+from contextlib import nullcontext
+from src.dal.database import in_unit_of_work, primary_write, reading_primary, replica_read
+from src.dal.async_database import on_db_loop
+from src.dal.base_dao import BaseDao, AsyncBaseDao
+from src.dal.invalidation import publish_async, publishing, subscribe
+from src.dal.profile_cache import ProfileCache
+from src.dal.statements import statements
 from src.models.user_dto import UserDto
-from typing import List, Dict, Optional, Any
+from typing import Iterable, Iterator, List, Dict, Optional, Any, Set
 
+TABLE_NAME = "users"
 
-class UserDao:
+GET_ALL_USERS = statements.register(TABLE_NAME, "get_all_users", "SELECT * FROM {table};")
+GET_ALL_USERS_PUBLIC = statements.register(
+    TABLE_NAME, "iter_all_users", "SELECT id, first_name, last_name, email, role_id FROM {table};")
+GET_PASSWORD_BY_EMAIL = statements.register(
+    TABLE_NAME, "get_password_by_email",
+    "SELECT id, first_name,last_name,email,password,role_id FROM {table} WHERE email = %s;", prepare=True)
+INSERT_USER = statements.register(
+    TABLE_NAME, "insert_into_users",
+    "INSERT INTO {table} (first_name, last_name, email, password, role_id) VALUES (%s, %s, %s, %s, %s);")
+GET_USER_BY_ID = statements.register(
+    TABLE_NAME, "get_user_info_by_id",
+    "SELECT id, first_name, last_name, email, role_id FROM {table} WHERE id = %s;", prepare=True)
+DELETE_USER_BY_ID = statements.register(TABLE_NAME, "delete_user_info_by_id", "DELETE FROM {table} WHERE id = %s;")
+GET_USER_BY_EMAIL_AND_PASSWORD = statements.register(
+    TABLE_NAME, "get_user_info_by_email_and_password", "SELECT * FROM {table} WHERE email = %s AND password = %s;")
+CHECK_EMAIL_EXISTS = statements.register(
+    TABLE_NAME, "check_if_email_exist", "SELECT email FROM {table} WHERE email = %s;")
+GET_EXISTING_EMAILS = statements.register(
+    TABLE_NAME, "get_existing_emails", "SELECT email FROM {table} WHERE email = ANY(%s);")
+COPY_USERS = statements.register(
+    TABLE_NAME, "bulk_insert_users", "COPY {table} (first_name, last_name, email, password, role_id) FROM STDIN")
+
+profile_cache = ProfileCache("user_profiles")
+subscribe(TABLE_NAME, profile_cache.invalidate)
+
+
+class UserDao(BaseDao):
     def __init__(self) -> None:
         """
         Initializes the UserDao class with the table name 'users'.
         """
-        self.table_name: str = "users"
+        self.table_name: str = TABLE_NAME
 
+    @replica_read
     def get_all_users(self) -> List[Dict[str, Any]]:
         """
         Retrieves all users from the database.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT * FROM {};").format(psycopg.sql.Identifier(self.table_name)))
-            result = cur.fetchall()
-        return result
+        return self._fetchall(GET_ALL_USERS)
+
+    @replica_read
+    def iter_all_users(self, itersize: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily iterates over all users without their password hashes, using a
+        server-side cursor so the table is never loaded into memory.
 
+        Args:
+            itersize (Optional[int]): Rows fetched per round trip, defaults to export_itersize.
+        """
+        return self._iterate(GET_ALL_USERS_PUBLIC, itersize=itersize)
+
+    @replica_read
     def get_password_by_email(self, email):
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL("SELECT id, first_name,last_name,email,password,role_id FROM {} WHERE email = %s; ").format(
-                psycopg.sql.Identifier(self.table_name)), (email,))
-            result = cur.fetchone()
-            return result
+        return self._fetchone(GET_PASSWORD_BY_EMAIL, (email,))
 
+    @primary_write
     def insert_into_users(self, user_dto: UserDto) -> None:
         """
         Inserts a new user into the database.
@@ -36,24 +73,32 @@ class UserDao:
         Args:
             user_dto (UserDto): The user data transfer object containing user details.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(psycopg.sql.SQL("INSERT INTO {} (first_name, last_name, email, password, role_id) VALUES (%s, %s, %s, %s, %s);").format(
-                psycopg.sql.Identifier(self.table_name)), (user_dto.first_name, user_dto.last_name, user_dto.email, user_dto.password, user_dto.role_id))
-            db_conn.commit()
+        self._execute(INSERT_USER, (user_dto.first_name, user_dto.last_name,
+                      user_dto.email, user_dto.password, user_dto.role_id))
 
-    def get_user_info_by_id(self, id: int) -> List[Dict[str, Any]]:
+    @replica_read
+    def get_user_info_by_id(self, id: int) -> Optional[Dict[str, Any]]:
         """
-        Retrieves user information by user ID.
+        Retrieves a user's profile (id, names, email and role_id, not the
+        password) by user ID, from the profile cache when it holds the user.
+        Inside a unit_of_work the database is always read, as the unit may have
+        changed the user.
 
         Args:
             id (int): The user ID.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT * FROM {} WHERE id = %s;").format(psycopg.sql.Identifier(self.table_name)), (id,))
-            result = cur.fetchone()
-        return result
+        if in_unit_of_work():
+            return self._fetchone(GET_USER_BY_ID, (id,))
+        user = profile_cache.get(id)
+        if user is None:
+            generation = profile_cache.generation
+            with reading_primary() if profile_cache.settling(id) else nullcontext():
+                user = self._fetchone(GET_USER_BY_ID, (id,))
+            if user is not None:
+                profile_cache.put(id, user, generation)
+        return user
 
+    @primary_write
     def update_user_info_by_id(self, id: int, column: str, new_value: Any) -> None:
         """
         Updates user information by user ID.
@@ -63,11 +108,10 @@ class UserDao:
             column (str): The column to update.
             new_value (str): The new value to set.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(psycopg.sql.SQL("UPDATE {} SET {} = %s WHERE id = %s;").format(
-                psycopg.sql.Identifier(self.table_name), psycopg.sql.Identifier(column)), (new_value, id))
-            db_conn.commit()
+        with publishing(TABLE_NAME, id):
+            self._update_column(id, column, new_value)
 
+    @primary_write
     def delete_user_info_by_id(self, id: int) -> None:
         """
         Deletes a user by user ID.
@@ -75,11 +119,10 @@ class UserDao:
         Args:
             id (int): The user ID.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(psycopg.sql.SQL("DELETE FROM {} WHERE id = %s;").format(
-                psycopg.sql.Identifier(self.table_name)), (id,))
-            db_conn.commit()
+        with publishing(TABLE_NAME, id):
+            self._execute(DELETE_USER_BY_ID, (id,))
 
+    @replica_read
     def get_user_info_by_email_and_password(self, email: str, password: str) -> List[Dict[str, Any]]:
         """
         Retrieves user information by email and password.
@@ -88,11 +131,7 @@ class UserDao:
             email (str): The user's email.
             password (str): The user's password.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT * FROM users WHERE email = %s AND password = %s;"), (email, password))
-            result = cur.fetchall()
-        return result
+        return self._fetchall(GET_USER_BY_EMAIL_AND_PASSWORD, (email, password))
 
     def check_if_email_exist(self, email: str) -> Optional[Dict[str, Any]]:
         """
@@ -101,10 +140,124 @@ class UserDao:
         Args:
             email (str): The email to check.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT email FROM USERS WHERE email = %s"), (email,))
-            result = cur.fetchone()
-        if result is not None:
-            return result
-        return None
+        return self._fetchone(CHECK_EMAIL_EXISTS, (email,))
+
+    def get_existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        """
+        Returns which of the given emails already exist in the database.
+
+        Args:
+            emails (Iterable[str]): The emails to check.
+        """
+        emails = list(emails)
+        if not emails:
+            return set()
+        return {row['email'] for row in self._fetchall(GET_EXISTING_EMAILS, (emails,))}
+
+    @primary_write
+    def bulk_insert_users(self, user_dtos: Iterable[UserDto]) -> int:
+        """
+        Inserts many users in one COPY. The rows are not validated here.
+
+        Args:
+            user_dtos (Iterable[UserDto]): The users to insert, with already hashed passwords.
+
+        Returns:
+            int: The number of users inserted.
+        """
+        return self._copy(COPY_USERS, ((user_dto.first_name, user_dto.last_name, user_dto.email,
+                                        user_dto.password, user_dto.role_id) for user_dto in user_dtos))
+
+
+class AsyncUserDao(AsyncBaseDao):
+    def __init__(self) -> None:
+        """
+        Initializes the AsyncUserDao class with the table name 'users'.
+        """
+        self.table_name: str = TABLE_NAME
+
+    @on_db_loop
+    @replica_read
+    async def get_all_users(self) -> List[Dict[str, Any]]:
+        """
+        Retrieves all users from the database.
+        """
+        return await self._fetchall(GET_ALL_USERS)
+
+    @on_db_loop
+    @replica_read
+    async def get_password_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves the login fields of a user, including the password hash, by email.
+
+        Args:
+            email (str): The user's email.
+        """
+        return await self._fetchone(GET_PASSWORD_BY_EMAIL, (email,))
+
+    @on_db_loop
+    @primary_write
+    async def insert_into_users(self, user_dto: UserDto) -> None:
+        """
+        Inserts a new user into the database.
+
+        Args:
+            user_dto (UserDto): The user data transfer object containing user details.
+        """
+        await self._execute(INSERT_USER, (user_dto.first_name, user_dto.last_name,
+                            user_dto.email, user_dto.password, user_dto.role_id))
+
+    @on_db_loop
+    @replica_read
+    async def get_user_info_by_id(self, id: int) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a user's profile (id, names, email and role_id, not the
+        password) by user ID, from the profile cache when it holds the user.
+
+        Args:
+            id (int): The user ID.
+        """
+        user = profile_cache.get(id)
+        if user is None:
+            generation = profile_cache.generation
+            with reading_primary() if profile_cache.settling(id) else nullcontext():
+                user = await self._fetchone(GET_USER_BY_ID, (id,))
+            if user is not None:
+                profile_cache.put(id, user, generation)
+        return user
+
+    @on_db_loop
+    @primary_write
+    async def update_user_info_by_id(self, id: int, column: str, new_value: Any) -> None:
+        """
+        Updates user information by user ID.
+
+        Args:
+            id (int): The user ID.
+            column (str): The column to update.
+            new_value (Any): The new value to set.
+        """
+        await self._update_column(id, column, new_value)
+        await publish_async(TABLE_NAME, id)
+
+    @on_db_loop
+    @primary_write
+    async def delete_user_info_by_id(self, id: int) -> None:
+        """
+        Deletes a user by user ID.
+
+        Args:
+            id (int): The user ID.
+        """
+        await self._execute(DELETE_USER_BY_ID, (id,))
+        await publish_async(TABLE_NAME, id)
+
+    @on_db_loop
+    async def check_if_email_exist(self, email: str) -> Optional[Dict[str, Any]]:
+        """
+        Checks if an email exists in the database.
+
+        Args:
+            email (str): The email to check.
+        """
+        return await self._fetchone(CHECK_EMAIL_EXISTS, (email,))
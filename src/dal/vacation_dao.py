@@ -1,29 +1,148 @@
-from src.dal.database import db_conn
-import psycopg.sql
-import psycopg.rows as pgrows
+from src.dal.database import get_connection, primary_write, replica_read
+from src.dal.async_database import on_db_loop
+from src.dal.base_dao import BaseDao, AsyncBaseDao
+from src.dal.statements import statements
+from psycopg.types.json import Jsonb
 from src.models.vacation_dto import VacationDto
-from typing import List, Dict, Optional, Any
+from typing import Iterable, Iterator, List, Dict, Optional, Any, Set, Tuple
 
+TABLE_NAME = "vacations"
 
-class VacationDao:
+# Columns that update_vacation_fields may set.
+UPDATABLE_COLUMNS = frozenset(("country_id", "vacation_description", "arrival", "departure", "price", "file_name"))
+
+
+def _check_updatable(changes: Dict[str, Any]) -> None:
+    if not changes:
+        raise ValueError("No vacation fields to update")
+    unknown = set(changes) - UPDATABLE_COLUMNS
+    if unknown:
+        raise ValueError(f"Vacation fields cannot be updated: {', '.join(sorted(unknown))}")
+
+GET_ALL_VACATIONS = statements.register(
+    TABLE_NAME, "get_all_vacations",
+    "SELECT {table}.*, countries.country_name AS country_name "
+    "FROM {table} "
+    "JOIN countries ON {table}.country_id = countries.id;", prepare=True)
+INSERT_VACATION = statements.register(
+    TABLE_NAME, "insert_into_vacations",
+    "INSERT INTO {table} (country_id, vacation_description, arrival, departure, price, file_name) "
+    "VALUES (%s, %s, %s, %s, %s, %s);")
+GET_VACATION_BY_ID = statements.register(
+    TABLE_NAME, "get_vacation_info_by_id", "SELECT * FROM {table} WHERE id = %s;", prepare=True)
+DELETE_VACATION_BY_ID = statements.register(
+    TABLE_NAME, "delete_vacation_info_by_id", "DELETE FROM {table} WHERE id = %s;")
+SET_IMAGE_VARIANTS = statements.register(
+    TABLE_NAME, "set_image_variants", "UPDATE {table} SET image_variants = %s WHERE file_name = %s;")
+GET_FILE_NAMES = statements.register(
+    TABLE_NAME, "get_file_names", "SELECT DISTINCT file_name FROM {table} WHERE file_name IS NOT NULL;")
+RENAME_FILE = statements.register(
+    TABLE_NAME, "rename_file", "UPDATE {table} SET file_name = %s WHERE file_name = %s;")
+# The catalog version plus the sum of the vacations' like versions: with the
+# catalog version fixed so is the set of vacations, so the sum only grows and
+# the pair changes whenever anything the listing shows does.
+GET_CATALOG_STATE = statements.register(
+    "catalog_state", "get_catalog_state",
+    "SELECT {table}.version, likes.version AS likes_version, "
+    "GREATEST({table}.updated_at, likes.changed_at) AS updated_at "
+    "FROM {table}, (SELECT COALESCE(SUM(likes_version), 0) AS version, MAX(likes_changed_at) AS changed_at "
+    "FROM vacations) AS likes WHERE {table}.id = 1;", prepare=True)
+GET_ARRIVAL_DEPARTURE = statements.register(
+    TABLE_NAME, "get_vacation_arrival_departure_time",
+    "SELECT arrival, departure FROM {table} WHERE arrival = %s AND departure = %s;")
+# Keyset pages of the listing, one pair of statements per sort key. The id breaks
+# ties so the order is stable and a page can resume right after the last row.
+# Each row carries its country name, likes_count and whether the user given as
+# the first parameter liked it, so a page is a single round trip.
+PAGE_ORDERS = ("price", "arrival", "id")
+_PAGE_SELECT = ("SELECT {table}.*, countries.country_name AS country_name, "
+                "EXISTS (SELECT 1 FROM likes WHERE likes.vacation_id = {table}.id AND likes.user_id = %s) AS user_liked "
+                "FROM {table} "
+                "JOIN countries ON {table}.country_id = countries.id ")
+FIRST_PAGE = {
+    order: statements.register(
+        TABLE_NAME, f"get_vacations_page_by_{order}",
+        _PAGE_SELECT + f"ORDER BY {{table}}.{order}, {{table}}.id LIMIT %s;", prepare=True)
+    for order in PAGE_ORDERS
+}
+NEXT_PAGE = {
+    order: statements.register(
+        TABLE_NAME, f"get_vacations_page_after_{order}",
+        _PAGE_SELECT + f"WHERE ({{table}}.{order}, {{table}}.id) > (%s, %s) "
+                       f"ORDER BY {{table}}.{order}, {{table}}.id LIMIT %s;", prepare=True)
+    for order in PAGE_ORDERS
+}
+LOCK_RECONCILE_BATCH = statements.register(
+    TABLE_NAME, "lock_likes_count_batch", "SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s FOR UPDATE;")
+FIX_LIKES_COUNTS = statements.register(
+    TABLE_NAME, "fix_likes_counts",
+    "UPDATE {table} SET likes_count = counted.actual, likes_version = likes_version + 1, likes_changed_at = now() "
+    "FROM (SELECT ids.id, (SELECT COUNT(*) FROM likes WHERE likes.vacation_id = ids.id) AS actual "
+    "FROM unnest(%s::int[]) AS ids(id)) AS counted "
+    "WHERE {table}.id = counted.id AND {table}.likes_count <> counted.actual "
+    "RETURNING {table}.id;")
+COPY_VACATIONS = statements.register(
+    TABLE_NAME, "bulk_insert_vacations",
+    "COPY {table} (country_id, vacation_description, arrival, departure, price, file_name) FROM STDIN")
+GET_EXISTING_ARRIVAL_DEPARTURE = statements.register(
+    TABLE_NAME, "get_existing_arrival_departure_pairs",
+    "SELECT arrival, departure FROM {table} "
+    "WHERE (arrival, departure) IN (SELECT * FROM unnest(%s::date[], %s::date[]));")
+
+
+class VacationDao(BaseDao):
     def __init__(self) -> None:
         """
         Initializes the VacationDao class with the table name 'vacations'.
         """
-        self.table_name: str = "vacations"
+        self.table_name: str = TABLE_NAME
 
+    @replica_read
     def get_all_vacations(self) -> List[Dict[str, Any]]:
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            query = psycopg.sql.SQL(
-                "SELECT {table}.*, countries.country_name AS country_name "
-                "FROM {table} "
-                "JOIN countries ON {table}.country_id = countries.id;"
-            ).format(table=psycopg.sql.Identifier(self.table_name))
+        return self._fetchall(GET_ALL_VACATIONS)
+
+    @replica_read
+    def get_vacations_page(self, order_by: str, limit: int, after: Optional[Tuple[Any, int]] = None,
+                           user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieves one page of vacations ordered by a sort key and then by id. Each
+        vacation comes with its country_name, likes_count and user_liked flag.
+
+        Args:
+            order_by (str): One of PAGE_ORDERS.
+            limit (int): The maximum number of vacations to return.
+            after (Optional[Tuple[Any, int]]): The (sort key, id) of the last vacation of the
+                previous page, or None for the first page.
+            user_id (Optional[int]): The user whose likes set user_liked; None leaves it False.
+        """
+        if after is None:
+            return self._fetchall(FIRST_PAGE[order_by], (user_id, limit))
+        return self._fetchall(NEXT_PAGE[order_by], (user_id, *after, limit))
+
+    @replica_read
+    def get_catalog_state(self) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves the catalog version, bumped by every write to vacations or
+        countries, the version of the vacations' likes, and when either last
+        changed (see migration 0003).
+
+        Returns:
+            Optional[Dict[str, Any]]: The 'version', 'likes_version' and 'updated_at', or None if its row is missing.
+        """
+        return self._fetchone(GET_CATALOG_STATE)
 
-            cur.execute(query)
-            result = cur.fetchall()
-        return result
+    @replica_read
+    def iter_all_vacations(self, itersize: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily iterates over all vacations together with their country name,
+        using a server-side cursor so the table is never loaded into memory.
 
+        Args:
+            itersize (Optional[int]): Rows fetched per round trip, defaults to export_itersize.
+        """
+        return self._iterate(GET_ALL_VACATIONS, itersize=itersize)
+
+    @primary_write
     def insert_into_vacations(self, vacation_dto: VacationDto) -> None:
         """
         Inserts a new vacation into the database.
@@ -31,16 +150,10 @@ class VacationDao:
         Args:
             vacation_dto (VacationDto): The vacation data transfer object containing vacation details.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("INSERT INTO {} (country_id, vacation_description, arrival, departure, price, file_name) VALUES (%s, %s, %s, %s, %s, %s);").format(
-                    psycopg.sql.Identifier(self.table_name)),
-                (vacation_dto.country_id, vacation_dto.vacation_description, vacation_dto.arrival,
-                 vacation_dto.departure, vacation_dto.price, vacation_dto.file_name)
-            )
-            db_conn.commit()
-  
+        self._execute(INSERT_VACATION, (vacation_dto.country_id, vacation_dto.vacation_description, vacation_dto.arrival,
+                                        vacation_dto.departure, vacation_dto.price, vacation_dto.file_name))
 
+    @replica_read
     def get_vacation_info_by_id(self, id: int) -> Optional[Dict[str, Any]]:
         """
         Retrieves vacation information by vacation ID.
@@ -51,12 +164,9 @@ class VacationDao:
         Returns:
             Optional[Dict[str, Any]]: A dictionary representing the vacation if found, otherwise None.
         """
-        with db_conn.cursor(row_factory=pgrows.dict_row) as cur:
-            cur.execute(psycopg.sql.SQL(
-                "SELECT * FROM {} WHERE id = %s;").format(psycopg.sql.Identifier(self.table_name)), (id,))
-            result = cur.fetchone()
-        return result
+        return self._fetchone(GET_VACATION_BY_ID, (id,))
 
+    @primary_write
     def update_vacation_info_by_id(self, id: int, column: str, new_value: Any) -> None:
         """
         Updates vacation information by vacation ID.
@@ -66,16 +176,27 @@ class VacationDao:
             column (str): The column to update.
             new_value (Any): The new value to set.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                psycopg.sql.SQL("UPDATE {} SET {} = %s WHERE id = %s;").format(
-                    psycopg.sql.Identifier(
-                        self.table_name), psycopg.sql.Identifier(column)
-                ),
-                (new_value, id)
-            )
-            db_conn.commit()
+        self._update_column(id, column, new_value)
+
+    @primary_write
+    def update_vacation_fields(self, id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Updates several columns of a vacation in a single UPDATE, so readers never see it half updated.
+
+        Args:
+            id (int): The vacation ID.
+            changes (Dict[str, Any]): New values by column name, from UPDATABLE_COLUMNS.
 
+        Returns:
+            Optional[Dict[str, Any]]: The updated vacation, or None if there is no vacation with that ID.
+
+        Raises:
+            ValueError: If changes is empty or names a column outside UPDATABLE_COLUMNS.
+        """
+        _check_updatable(changes)
+        return self._update_columns(id, changes)
+
+    @primary_write
     def delete_vacation_info_by_id(self, id: int) -> None:
         """
         Deletes a vacation by vacation ID.
@@ -83,10 +204,43 @@ class VacationDao:
         Args:
             id (int): The vacation ID.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(psycopg.sql.SQL("DELETE FROM {} WHERE id = %s;").format(
-                psycopg.sql.Identifier(self.table_name)), (id,))
-            db_conn.commit()
+        self._execute(DELETE_VACATION_BY_ID, (id,))
+
+    @primary_write
+    def set_image_variants(self, file_name: str, variants: Dict[str, Any]) -> int:
+        """
+        Stores the resized variants of an image on every vacation showing it.
+
+        Args:
+            file_name (str): The original image's file name.
+            variants (Dict[str, Any]): The variants, as built by src.services.image_variants.build_variants.
+
+        Returns:
+            int: The number of vacations updated.
+        """
+        return self._execute(SET_IMAGE_VARIANTS, (Jsonb(variants), file_name))
+
+    def get_file_names(self) -> List[str]:
+        """
+        Returns the distinct image file names the vacations show.
+
+        Returns:
+            List[str]: The file names, relative to the upload folder.
+        """
+        return [row['file_name'] for row in self._fetchall(GET_FILE_NAMES)]
+
+    def rename_file(self, old_name: str, new_name: str) -> int:
+        """
+        Points every vacation showing an image at the same image under a new name.
+
+        Args:
+            old_name (str): The image's current file name.
+            new_name (str): The file name to store instead.
+
+        Returns:
+            int: The number of vacations updated.
+        """
+        return self._execute(RENAME_FILE, (new_name, old_name))
 
     def get_vacation_arrival_departure_time(self, arrival: str, departure: str) -> None:
         """
@@ -96,8 +250,188 @@ class VacationDao:
             arrival (str): The arrival date.
             departure (str): The departure date.
         """
-        with db_conn.cursor() as cur:
-            cur.execute(
-                "SELECT arrival, departure FROM vacations WHERE arrival = %s AND departure = %s;", (arrival, departure))
-            result = cur.fetchone()
-        return result
+        row = self._fetchone(GET_ARRIVAL_DEPARTURE, (arrival, departure))
+        return (row['arrival'], row['departure']) if row else None
+
+    def get_existing_arrival_departure_pairs(self, pairs: Iterable[Tuple[Any, Any]]) -> Set[Tuple[Any, Any]]:
+        """
+        Returns which of the given (arrival, departure) pairs already belong to a vacation.
+
+        Args:
+            pairs (Iterable[Tuple[Any, Any]]): The (arrival, departure) date pairs to look up.
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return set()
+        rows = self._fetchall(GET_EXISTING_ARRIVAL_DEPARTURE,
+                              ([arrival for arrival, _ in pairs], [departure for _, departure in pairs]))
+        return {(row['arrival'], row['departure']) for row in rows}
+
+    @primary_write
+    def reconcile_likes_counts(self, after_id: int, batch_size: int) -> Tuple[Optional[int], List[int]]:
+        """
+        Recounts the likes of the next batch of vacations by id and fixes the
+        likes_count of those that drifted. The batch is locked first, so likes
+        added or removed meanwhile wait and then apply on top of the fixed count.
+
+        Args:
+            after_id (int): The last vacation id of the previous batch, 0 for the first batch.
+            batch_size (int): How many vacations to recount.
+
+        Returns:
+            Tuple[Optional[int], List[int]]: The last id of this batch, or None when there
+            are no vacations left, and the ids whose count was fixed.
+        """
+        LOCK_RECONCILE_BATCH.record_call()
+        FIX_LIKES_COUNTS.record_call()
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(LOCK_RECONCILE_BATCH.query, (after_id, batch_size))
+            ids = [row[0] for row in cur.fetchall()]
+            if not ids:
+                return None, []
+            cur.execute(FIX_LIKES_COUNTS.query, (ids,))
+            fixed_ids = [row[0] for row in cur.fetchall()]
+        return ids[-1], fixed_ids
+
+    @primary_write
+    def bulk_insert_vacations(self, vacation_dtos: Iterable[VacationDto]) -> int:
+        """
+        Inserts many vacations in one COPY. The rows are not validated here.
+
+        Args:
+            vacation_dtos (Iterable[VacationDto]): The vacations to insert.
+
+        Returns:
+            int: The number of vacations inserted.
+        """
+        count = self._copy(COPY_VACATIONS, ((vacation_dto.country_id, vacation_dto.vacation_description,
+                                             vacation_dto.arrival, vacation_dto.departure, vacation_dto.price,
+                                             vacation_dto.file_name) for vacation_dto in vacation_dtos))
+        return count
+
+
+class AsyncVacationDao(AsyncBaseDao):
+    def __init__(self) -> None:
+        """
+        Initializes the AsyncVacationDao class with the table name 'vacations'.
+        """
+        self.table_name: str = TABLE_NAME
+
+    @on_db_loop
+    @replica_read
+    async def get_all_vacations(self) -> List[Dict[str, Any]]:
+        """
+        Retrieves all vacations together with their country name.
+        """
+        return await self._fetchall(GET_ALL_VACATIONS)
+
+    @on_db_loop
+    @replica_read
+    async def get_vacations_page(self, order_by: str, limit: int, after: Optional[Tuple[Any, int]] = None,
+                                 user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieves one page of vacations ordered by a sort key and then by id. Each
+        vacation comes with its country_name, likes_count and user_liked flag.
+
+        Args:
+            order_by (str): One of PAGE_ORDERS.
+            limit (int): The maximum number of vacations to return.
+            after (Optional[Tuple[Any, int]]): The (sort key, id) of the last vacation of the
+                previous page, or None for the first page.
+            user_id (Optional[int]): The user whose likes set user_liked; None leaves it False.
+        """
+        if after is None:
+            return await self._fetchall(FIRST_PAGE[order_by], (user_id, limit))
+        return await self._fetchall(NEXT_PAGE[order_by], (user_id, *after, limit))
+
+    @on_db_loop
+    @replica_read
+    async def get_catalog_state(self) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves the catalog version, the version of the vacations' likes, and when either last changed.
+
+        Returns:
+            Optional[Dict[str, Any]]: The 'version', 'likes_version' and 'updated_at', or None if its row is missing.
+        """
+        return await self._fetchone(GET_CATALOG_STATE)
+
+    @on_db_loop
+    @primary_write
+    async def insert_into_vacations(self, vacation_dto: VacationDto) -> None:
+        """
+        Inserts a new vacation into the database.
+
+        Args:
+            vacation_dto (VacationDto): The vacation data transfer object containing vacation details.
+        """
+        await self._execute(INSERT_VACATION, (vacation_dto.country_id, vacation_dto.vacation_description, vacation_dto.arrival,
+                                              vacation_dto.departure, vacation_dto.price, vacation_dto.file_name))
+
+    @on_db_loop
+    @replica_read
+    async def get_vacation_info_by_id(self, id: int) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves vacation information by vacation ID.
+
+        Args:
+            id (int): The vacation ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: A dictionary representing the vacation if found, otherwise None.
+        """
+        return await self._fetchone(GET_VACATION_BY_ID, (id,))
+
+    @on_db_loop
+    @primary_write
+    async def update_vacation_info_by_id(self, id: int, column: str, new_value: Any) -> None:
+        """
+        Updates vacation information by vacation ID.
+
+        Args:
+            id (int): The vacation ID.
+            column (str): The column to update.
+            new_value (Any): The new value to set.
+        """
+        await self._update_column(id, column, new_value)
+
+    @on_db_loop
+    @primary_write
+    async def update_vacation_fields(self, id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Updates several columns of a vacation in a single UPDATE, so readers never see it half updated.
+
+        Args:
+            id (int): The vacation ID.
+            changes (Dict[str, Any]): New values by column name, from UPDATABLE_COLUMNS.
+
+        Returns:
+            Optional[Dict[str, Any]]: The updated vacation, or None if there is no vacation with that ID.
+
+        Raises:
+            ValueError: If changes is empty or names a column outside UPDATABLE_COLUMNS.
+        """
+        _check_updatable(changes)
+        return await self._update_columns(id, changes)
+
+    @on_db_loop
+    @primary_write
+    async def delete_vacation_info_by_id(self, id: int) -> None:
+        """
+        Deletes a vacation by vacation ID.
+
+        Args:
+            id (int): The vacation ID.
+        """
+        await self._execute(DELETE_VACATION_BY_ID, (id,))
+
+    @on_db_loop
+    async def get_vacation_arrival_departure_time(self, arrival: str, departure: str) -> Optional[tuple]:
+        """
+        Retrieves vacation arrival and departure times based on provided dates.
+
+        Args:
+            arrival (str): The arrival date.
+            departure (str): The departure date.
+        """
+        row = await self._fetchone(GET_ARRIVAL_DEPARTURE, (arrival, departure))
+        return (row['arrival'], row['departure']) if row else None
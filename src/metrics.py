@@ -0,0 +1,479 @@
+"""
+A small metrics registry rendered in the Prometheus text format by /metrics.
+
+Counters, gauges and histograms are safe to update from several threads. When
+METRICS_MULTIPROC_DIR is set, every worker process writes a snapshot of its
+metrics to its own file in that directory (every metrics_flush_interval seconds
+from a background thread, on every scrape and at exit), and /metrics merges the files of all workers:
+counters and histograms are summed over every process that ever wrote, gauges
+over the processes still alive. Files are named after the process id and a
+token drawn when the process first writes, so a worker that is given the id of
+a dead one does not overwrite its totals. On a scrape, the files of dead
+workers are folded into a single file of retired totals and removed.
+
+Values that live elsewhere, such as pool statistics or cache counters, are read
+at snapshot time by collectors added with registry.add_collector. Caches are
+reported by passing them to track_cache.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.config import metrics_flush_interval, metrics_multiproc_dir
+from src.dal import database
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+# Counters and histograms of the workers that have exited, see MetricsRegistry.collect.
+RETIRED_FILE = "retired.json"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+# A metric family as it is snapshotted, written to disk and merged:
+# {"name", "type", "help", "labels": [...], "buckets": [...], "samples": [[label values, value], ...]}
+Family = Dict[str, Any]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def family(self) -> Family:
+        with self._lock:
+            samples = [[list(key), self._copy(value)] for key, value in self._values.items()]
+        return {"name": self.name, "type": self.type, "help": self.help, "labels": list(self.labels),
+                "samples": samples}
+
+    def _copy(self, value: Any) -> Any:
+        return value
+
+
+class Counter(_Metric):
+    type = COUNTER
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type = GAUGE
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = HISTOGRAM
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        Records one observation. Bucket counts are kept per bucket and made cumulative when rendered.
+        """
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            state["counts"][index] += 1
+            state["sum"] += value
+
+    def family(self) -> Family:
+        family = super().family()
+        family["buckets"] = list(self.buckets)
+        return family
+
+    def _copy(self, value: Any) -> Any:
+        return {"counts": list(value["counts"]), "sum": value["sum"]}
+
+
+class MetricsRegistry:
+    def __init__(self, multiproc_dir: Optional[str] = metrics_multiproc_dir) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+        self._multiproc_dir = multiproc_dir
+        self._last_flush = 0.0
+        self._pid = 0
+        self._token = ""
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_flusher = threading.Event()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """
+        Adds a function called on every snapshot that returns extra metric
+        families, typically built with gauge_family or counter_family.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def snapshot(self) -> List[Family]:
+        """
+        Returns this process's metrics, including the collectors' families.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        families = [metric.family() for metric in metrics]
+        for collector in collectors:
+            families.extend(collector())
+        return families
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Writes this process's snapshot to its file in the multiprocess directory,
+        unless it was written less than metrics_flush_interval seconds ago.
+        """
+        if not self._multiproc_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < metrics_flush_interval:
+            return
+        self._last_flush = now
+        os.makedirs(self._multiproc_dir, exist_ok=True)
+        _write(self._path(), self.snapshot())
+
+    def _path(self) -> str:
+        """
+        Returns this process's file. A forked child draws a token of its own
+        rather than writing over its parent's file.
+        """
+        if self._pid != os.getpid():
+            self._pid, self._token = os.getpid(), uuid.uuid4().hex
+        return os.path.join(self._multiproc_dir, f"metrics_{self._pid}_{self._token}.json")
+
+    def start_flusher(self, interval: float = metrics_flush_interval) -> Optional[threading.Thread]:
+        """
+        Flushes this process's metrics every interval seconds from a daemon
+        thread, and once more at exit, so the last counts of a worker that has
+        gone idle still reach its file. Does nothing without a multiprocess
+        directory. A forked worker must call it again: threads do not survive a fork.
+
+        Returns:
+            Optional[threading.Thread]: The flusher thread, or None without a multiprocess directory.
+        """
+        if not self._multiproc_dir:
+            return None
+        if self._flusher is not None and self._flusher.is_alive():
+            return self._flusher
+        if self._flusher is None:
+            atexit.register(self.stop_flusher)
+        self._stop_flusher.clear()
+        self._flusher = threading.Thread(target=self._flush_every, args=(interval,), name="metrics-flusher",
+                                         daemon=True)
+        self._flusher.start()
+        return self._flusher
+
+    def _flush_every(self, interval: float) -> None:
+        while not self._stop_flusher.wait(interval):
+            self.flush(force=True)
+
+    def stop_flusher(self) -> None:
+        """
+        Stops the flusher thread and writes the metrics one last time.
+        """
+        self._stop_flusher.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush(force=True)
+
+    def collect(self) -> List[Family]:
+        """
+        Returns the metrics of every worker process when a multiprocess directory
+        is configured, otherwise those of this process.
+        """
+        if not self._multiproc_dir:
+            return self.snapshot()
+        self.flush(force=True)
+        # Under a lock on the directory, so concurrent scrapes retire each file
+        # once and never count one both in its file and in the retired totals.
+        with open(os.path.join(self._multiproc_dir, "retired.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._retire_dead()
+            processes = [(True, families) for families in
+                         map(_read, glob.glob(os.path.join(self._multiproc_dir, "metrics_*.json")))
+                         if families is not None]
+            retired = _read(os.path.join(self._multiproc_dir, RETIRED_FILE))
+        if retired is not None:
+            processes.append((False, retired))
+        return merge(processes)
+
+    def _retire_dead(self) -> None:
+        """
+        Adds the counters and histograms of the workers that have exited to the
+        retired totals and removes their files.
+        """
+        dead = [path for path in glob.glob(os.path.join(self._multiproc_dir, "metrics_*.json"))
+                if not _is_alive(_pid_of(path))]
+        if not dead:
+            return
+        retired_path = os.path.join(self._multiproc_dir, RETIRED_FILE)
+        processes = [(False, families) for families in map(_read, [retired_path, *dead]) if families is not None]
+        _write(retired_path, merge(processes))
+        for path in dead:
+            os.remove(path)
+
+    def render(self) -> str:
+        return render(self.collect())
+
+
+def _write(path: str, families: List[Family]) -> None:
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(families, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def _read(path: str) -> Optional[List[Family]]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_of(path: str) -> int:
+    return int(os.path.basename(path)[len("metrics_"):].split("_", 1)[0])
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(processes: Iterable[Tuple[bool, List[Family]]]) -> List[Family]:
+    """
+    Merges the snapshots of several processes. Counters and histograms are
+    summed over all of them, gauges only over the live ones.
+
+    Args:
+        processes: (alive, snapshot) pairs.
+    """
+    merged: Dict[str, Family] = {}
+    for alive, families in processes:
+        for family in families:
+            if family["type"] == GAUGE and not alive:
+                continue
+            target = merged.setdefault(family["name"], {**family, "samples": {}})
+            samples = target["samples"]
+            for labels, value in family["samples"]:
+                key = tuple(labels)
+                if family["type"] == HISTOGRAM:
+                    current = samples.get(key) or {"counts": [0] * len(value["counts"]), "sum": 0.0}
+                    samples[key] = {"counts": [a + b for a, b in zip(current["counts"], value["counts"])],
+                                    "sum": current["sum"] + value["sum"]}
+                else:
+                    samples[key] = samples.get(key, 0.0) + value
+    for family in merged.values():
+        family["samples"] = [[list(key), value] for key, value in family["samples"].items()]
+    return list(merged.values())
+
+
+def gauge_family(name: str, help: str, labels: Sequence[str],
+                 samples: Iterable[Tuple[Sequence[Any], float]]) -> Family:
+    return {"name": name, "type": GAUGE, "help": help, "labels": list(labels),
+            "samples": [[[str(value) for value in key], value] for key, value in samples]}
+
+
+def counter_family(name: str, help: str, labels: Sequence[str],
+                   samples: Iterable[Tuple[Sequence[Any], float]]) -> Family:
+    return {**gauge_family(name, help, labels, samples), "type": COUNTER}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render(families: Iterable[Family]) -> str:
+    """
+    Formats metric families in the Prometheus text exposition format.
+    """
+    lines = []
+    for family in sorted(families, key=lambda family: family["name"]):
+        name, labels = family["name"], family["labels"]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for values, value in sorted(family["samples"], key=lambda sample: sample[0]):
+            if family["type"] != HISTOGRAM:
+                lines.append(f"{name}{_label_text(labels, values)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(family["buckets"]) + [math.inf], value["counts"]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_label_text(labels, values, le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels, values)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_label_text(labels, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Time spent handling a request", ("endpoint", "method"))
+REQUESTS = registry.counter("http_requests_total", "Requests handled", ("endpoint", "method", "status"))
+REQUEST_ERRORS = registry.counter(
+    "http_request_errors_total", "Requests that raised or answered with a 5xx status", ("endpoint", "method"))
+IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests being handled right now", ("endpoint",))
+DB_QUERIES = registry.counter("db_queries_total", "Database statements run by requests", ("endpoint",))
+DB_QUERY_TIME = registry.counter(
+    "db_query_seconds_total", "Time requests spent running database statements", ("endpoint",))
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "db_queries_per_request", "Database statements run per request", ("endpoint",),
+    buckets=(1, 2, 5, 10, 20, 50, 100))
+PASSWORD_HASHES_PENDING = registry.gauge(
+    "password_hashes_pending", "Password hashes and checks queued or running in the hash workers")
+PASSWORD_HASH_DURATION = registry.histogram(
+    "password_hash_duration_seconds", "Time from queueing a password hash or check to its result", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+JOBS = registry.counter("jobs_total", "Background jobs run, by outcome", ("kind", "outcome"))
+JOB_DURATION = registry.histogram(
+    "job_duration_seconds", "Time spent running a background job", ("kind",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+
+def pool_families() -> List[Family]:
+    """
+    Reports the connection pools' size, usage and wait statistics.
+    """
+    stats = {route: database.pool_stats(route) for route in database.pool_routes()}
+    return [
+        gauge_family("db_pool_connections", "Connections open in the pool", ("pool",),
+                     [((route,), pool["pool_size"]) for route, pool in stats.items()]),
+        gauge_family("db_pool_connections_in_use", "Connections checked out of the pool", ("pool",),
+                     [((route,), pool["in_use"]) for route, pool in stats.items()]),
+        gauge_family("db_pool_requests_waiting", "Clients waiting for a connection", ("pool",),
+                     [((route,), pool.get("requests_waiting", 0)) for route, pool in stats.items()]),
+        counter_family("db_pool_requests_total", "Connections requested from the pool", ("pool",),
+                       [((route,), pool.get("requests_num", 0)) for route, pool in stats.items()]),
+        counter_family("db_pool_wait_seconds_total", "Time spent waiting for a connection", ("pool",),
+                       [((route,), pool.get("requests_wait_ms", 0) / 1000) for route, pool in stats.items()]),
+    ]
+
+
+registry.add_collector(pool_families)
+
+
+_caches: List[Any] = []
+
+
+def track_cache(*caches: Any) -> None:
+    """
+    Reports the hits and misses of caches that have a name and a stats() method
+    returning 'hits' and 'misses'. The hit ratio is
+    rate(cache_hits_total) / (rate(cache_hits_total) + rate(cache_misses_total)).
+    """
+    _caches.extend(caches)
+
+
+def cache_families() -> List[Family]:
+    stats = [(cache.name, cache.stats()) for cache in _caches]
+    return [
+        counter_family("cache_hits_total", "Lookups answered from an in-process cache", ("cache",),
+                       [((name,), cache["hits"]) for name, cache in stats]),
+        counter_family("cache_misses_total", "Lookups that had to load from the database", ("cache",),
+                       [((name,), cache["misses"]) for name, cache in stats]),
+    ]
+
+
+registry.add_collector(cache_families)
+
+
+_limiters: List[Any] = []
+
+
+def track_limiters(*limiters: Any) -> None:
+    """
+    Reports the state of admission limiters that have a name and a stats()
+    method returning 'limit', 'in_flight', 'waiting' and 'shed'.
+    """
+    _limiters.extend(limiters)
+
+
+def admission_families() -> List[Family]:
+    stats = [(limiter.name, limiter.stats()) for limiter in _limiters]
+    return [
+        gauge_family("admission_limit", "Current adaptive concurrency limit", ("route_class",),
+                     [((name,), limiter["limit"]) for name, limiter in stats]),
+        gauge_family("admission_in_flight", "Requests holding an admission slot", ("route_class",),
+                     [((name,), limiter["in_flight"]) for name, limiter in stats]),
+        gauge_family("admission_queued", "Requests waiting for an admission slot", ("route_class",),
+                     [((name,), limiter["waiting"]) for name, limiter in stats]),
+        counter_family("admission_shed_total", "Requests refused with a 503 by admission control", ("route_class",),
+                       [((name,), limiter["shed"]) for name, limiter in stats]),
+    ]
+
+
+registry.add_collector(admission_families)
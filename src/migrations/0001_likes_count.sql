@@ -0,0 +1,40 @@
+-- Like counter kept on the vacation row so listings do not count likes.
+-- The trigger runs for cascaded deletes too; reconcile_likes_counts fixes drift.
+ALTER TABLE vacations ADD COLUMN IF NOT EXISTS likes_count INT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION update_vacation_likes_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE vacations SET likes_count = likes_count - 1 WHERE id = OLD.vacation_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE vacations SET likes_count = likes_count + 1 WHERE id = NEW.vacation_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reset_vacation_likes_count() RETURNS trigger AS $$
+BEGIN
+    UPDATE vacations SET likes_count = 0 WHERE likes_count <> 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS likes_count_on_change ON likes;
+CREATE TRIGGER likes_count_on_change
+AFTER INSERT OR DELETE OR UPDATE OF vacation_id ON likes
+FOR EACH ROW EXECUTE FUNCTION update_vacation_likes_count();
+
+DROP TRIGGER IF EXISTS likes_count_on_truncate ON likes;
+CREATE TRIGGER likes_count_on_truncate
+AFTER TRUNCATE ON likes
+FOR EACH STATEMENT EXECUTE FUNCTION reset_vacation_likes_count();
+
+-- Count the existing likes. CREATE TRIGGER has locked likes against writes
+-- until this migration commits, so no like is missed or counted twice.
+UPDATE vacations SET likes_count = counted.actual
+FROM (SELECT vacations.id, COUNT(likes.vacation_id) AS actual
+      FROM vacations LEFT JOIN likes ON likes.vacation_id = vacations.id
+      GROUP BY vacations.id) AS counted
+WHERE vacations.id = counted.id AND vacations.likes_count <> counted.actual;
@@ -0,0 +1,18 @@
+-- migrate: no-transaction
+-- Indexes for the filters and orderings the DAOs run on every request. Built
+-- CONCURRENTLY so writes to the tables are not blocked while they build. If a
+-- build fails, drop the INVALID index it leaves behind and run the migration again.
+
+-- Like counts, the liked flag of the listing and deleting a vacation's likes.
+-- unique_like (user_id, vacation_id) already serves lookups by user.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS likes_vacation_id_idx ON likes (vacation_id);
+
+-- The join to countries and the duplicate arrival/departure check.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vacations_country_id_idx ON vacations (country_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vacations_arrival_departure_idx ON vacations (arrival, departure);
+
+-- Keyset pages of the listing ordered by price and by arrival.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vacations_price_id_idx ON vacations (price, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vacations_arrival_id_idx ON vacations (arrival, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_role_id_idx ON users (role_id);
@@ -0,0 +1,73 @@
+-- A version of the vacations and countries the listing shows, bumped by every
+-- statement that changes them. The listing and detail endpoints read it to
+-- answer conditional GETs with 304 before their queries. The version is updated
+-- in the writing transaction, so a reader never sees a new version before the
+-- data it stands for has committed.
+CREATE TABLE IF NOT EXISTS catalog_state (
+    id INT PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL
+);
+INSERT INTO catalog_state (id, version, updated_at) VALUES (1, 1, now()) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE catalog_state SET version = version + 1, updated_at = now() WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Likes do not bump the shared row: that would serialize every like on its
+-- lock. Each vacation versions its own likes instead, next to likes_count, in
+-- the row the likes trigger updates anyway; the endpoints add them up.
+ALTER TABLE vacations ADD COLUMN IF NOT EXISTS likes_version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE vacations ADD COLUMN IF NOT EXISTS likes_changed_at TIMESTAMPTZ;
+
+CREATE OR REPLACE FUNCTION update_vacation_likes_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE vacations SET likes_count = likes_count - 1, likes_version = likes_version + 1,
+                             likes_changed_at = now()
+        WHERE id = OLD.vacation_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE vacations SET likes_count = likes_count + 1, likes_version = likes_version + 1,
+                             likes_changed_at = now()
+        WHERE id = NEW.vacation_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reset_vacation_likes_count() RETURNS trigger AS $$
+BEGIN
+    UPDATE vacations SET likes_count = 0, likes_version = likes_version + 1, likes_changed_at = now()
+    WHERE likes_count <> 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Updates that only move the like counters are versioned per vacation, so the
+-- catalog is bumped only when some other column changed.
+CREATE OR REPLACE FUNCTION bump_catalog_version_on_vacation_update() RETURNS TRIGGER AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id
+               WHERE to_jsonb(old_rows) - ARRAY['likes_count', 'likes_version', 'likes_changed_at']
+                     IS DISTINCT FROM
+                     to_jsonb(new_rows) - ARRAY['likes_count', 'likes_version', 'likes_changed_at']) THEN
+        UPDATE catalog_state SET version = version + 1, updated_at = now() WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER catalog_version_on_vacations
+    AFTER INSERT OR DELETE OR TRUNCATE ON vacations
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+CREATE TRIGGER catalog_version_on_vacations_update
+    AFTER UPDATE ON vacations
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version_on_vacation_update();
+CREATE TRIGGER catalog_version_on_countries
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON countries
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
@@ -0,0 +1,3 @@
+-- The resized variants of a vacation's image, written by the job workers once
+-- they are built (see src/services/image_service.py). NULL until then.
+ALTER TABLE vacations ADD COLUMN IF NOT EXISTS image_variants JSONB;
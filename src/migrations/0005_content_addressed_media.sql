@@ -0,0 +1,4 @@
+-- Uploaded images are stored under their SHA-256 content hash (see
+-- src/services/media_store.py): 64 hex digits plus the extension no longer fit
+-- in the original VARCHAR(50).
+ALTER TABLE vacations ALTER COLUMN file_name TYPE VARCHAR(100);
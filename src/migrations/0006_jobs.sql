@@ -0,0 +1,32 @@
+-- Durable background jobs (see src/services/jobs.py). Workers claim the queued
+-- job with the highest priority whose run_at has come, skipping rows other
+-- workers have locked, and mark it running for the length of the job. While it
+-- runs, the worker touches heartbeat_at; a running job whose heartbeat stopped
+-- is presumed lost with its worker.
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    priority INT NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    run_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    unique_key TEXT,
+    last_error TEXT,
+    locked_by TEXT,
+    locked_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ
+);
+
+-- The claim query walks this index in order and stops at the first unlocked row.
+CREATE INDEX IF NOT EXISTS jobs_queued_idx ON jobs (priority DESC, run_at, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_running_idx ON jobs (heartbeat_at) WHERE status = 'running';
+-- At most one job per unique_key waiting for its first run, e.g. one variants
+-- build per image. A running job does not count: what it reads may already be
+-- out of date, so a job enqueued meanwhile must still run. Retried jobs
+-- (attempts > 0) do not count either, so putting one back never conflicts.
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_unique_key_idx ON jobs (unique_key)
+    WHERE status = 'queued' AND attempts = 0;
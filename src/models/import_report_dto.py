@@ -0,0 +1,12 @@
+from dataclasses import dataclass, field
+from typing import List
+
+@dataclass
+class RowErrorDto:
+    row: int
+    message: str
+
+@dataclass
+class ImportReportDto:
+    inserted: int = 0
+    errors: List[RowErrorDto] = field(default_factory=list)
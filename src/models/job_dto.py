@@ -0,0 +1,14 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+@dataclass
+class JobDto:
+    kind: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    priority: int = 0
+    run_at: Optional[datetime] = None
+    max_attempts: Optional[int] = None
+    unique_key: Optional[str] = None
+    id: Optional[int] = None
+    attempts: int = 0
@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+@dataclass
+class VacationPageDto:
+    vacations: List[Dict[str, Any]]
+    order_by: str
+    limit: int
+    next_cursor: Optional[str] = None
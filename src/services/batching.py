@@ -0,0 +1,19 @@
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """
+    Splits an iterable into lists of at most `size` items without reading ahead
+    more than one batch.
+
+    :param items: The items to split
+    :param size: The maximum batch size
+    """
+    if size < 1:
+        raise ValueError("Batch size must be at least 1")
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,42 @@
+import csv
+import io
+import json
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator
+
+from src.config import export_itersize
+from src.services.batching import batched
+
+
+def csv_chunks(rows: Iterable[Dict[str, Any]], chunk_rows: int = export_itersize) -> Iterator[str]:
+    """
+    Formats rows as CSV, yielding one string per chunk_rows rows. The header is
+    taken from the keys of the first row, and nothing is yielded for no rows.
+
+    :param rows: Dicts with the same keys, read lazily
+    :param chunk_rows: How many rows to write per yielded chunk
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(first))
+    writer.writeheader()
+    for batch in batched(chain([first], rows), chunk_rows):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def ndjson_chunks(rows: Iterable[Dict[str, Any]], chunk_rows: int = export_itersize) -> Iterator[str]:
+    """
+    Formats rows as newline-delimited JSON, yielding one string per chunk_rows rows.
+    Dates and other non-JSON values are written with str().
+
+    :param rows: Dicts, read lazily
+    :param chunk_rows: How many rows to write per yielded chunk
+    """
+    for batch in batched(rows, chunk_rows):
+        yield "".join(json.dumps(row, default=str) + "\n" for row in batch)
@@ -0,0 +1,41 @@
+import logging
+from typing import Optional
+
+from src.dal.vacation_dao import VacationDao
+from src.services import image_variants
+from src.services.jobs import enqueue, job
+
+logger = logging.getLogger(__name__)
+
+BUILD_IMAGE_VARIANTS = "build_image_variants"
+
+
+@job(BUILD_IMAGE_VARIANTS)
+def build_and_store_variants(upload_folder: str, file_name: str) -> None:
+    """
+    Builds the resized variants of an image and stores them on every vacation
+    showing it. Runs in a job worker.
+
+    :param upload_folder: The folder the image was saved in
+    :param file_name: The image's file name, as stored in vacations.file_name
+    """
+    variants = image_variants.build_variants(upload_folder, file_name)
+    updated = VacationDao().set_image_variants(file_name, variants)
+    logger.info("Built %d image variants of %s for %d vacation(s)", len(variants["variants"]), file_name, updated)
+
+
+def process_upload(upload_folder: str, file_name: str) -> Optional[int]:
+    """
+    Queues the build of an uploaded image's resized variants and returns
+    immediately; a job worker builds them and stores them on the vacations
+    showing the image.
+
+    :param upload_folder: The folder the upload was saved in
+    :param file_name: The upload's file name, as stored in vacations.file_name
+    :return: The job's id, None when Pillow is missing (pages keep showing the
+             original) or when the variants of this image are already queued
+    """
+    if image_variants.Image is None:
+        return None
+    return enqueue(BUILD_IMAGE_VARIANTS, {"upload_folder": upload_folder, "file_name": file_name},
+                   unique_key=f"{BUILD_IMAGE_VARIANTS}:{file_name}")
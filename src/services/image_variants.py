@@ -0,0 +1,68 @@
+"""
+Builds the resized variants of an uploaded vacation image. The background job
+workers run it, through the build_image_variants job of image_service, which
+stores the result. It only reads and writes image files and imports nothing
+but Pillow and the settings.
+"""
+import base64
+import io
+import os
+from typing import Any, Dict, List
+
+from src.config import image_jpeg_quality, image_placeholder_width, image_variant_widths, image_webp_quality
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+VARIANTS_DIR = "variants"
+FORMATS = (("jpeg", "jpg"), ("webp", "webp"))
+
+
+def variant_name(file_name: str, size: str, extension: str) -> str:
+    """
+    Returns the variant's path relative to the upload folder, e.g. "variants/isr_trip.thumb.webp".
+    """
+    stem = os.path.splitext(file_name)[0]
+    return f"{VARIANTS_DIR}/{stem}.{size}.{extension}"
+
+
+def _save(image: Any, path: str, image_format: str) -> None:
+    if image_format == "jpeg":
+        image.save(path, "JPEG", quality=image_jpeg_quality, optimize=True, progressive=True)
+    else:
+        image.save(path, "WEBP", quality=image_webp_quality, method=4)
+
+
+def build_variants(upload_folder: str, file_name: str) -> Dict[str, Any]:
+    """
+    Writes a JPEG and a WebP copy of the image for every width in
+    image_variant_widths (never upscaled) and computes a tiny blurred placeholder.
+
+    :param upload_folder: The folder the original was saved in; variants go to its "variants" subfolder
+    :param file_name: The original's file name in that folder
+    :return: {"source": file_name, "variants": [{"name", "format", "width"}, ...],
+              "placeholder": a data: URI}
+    :raises RuntimeError: If Pillow is not installed
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    os.makedirs(os.path.join(upload_folder, VARIANTS_DIR), exist_ok=True)
+    with Image.open(os.path.join(upload_folder, file_name)) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+    variants: List[Dict[str, Any]] = []
+    for size, width in sorted(image_variant_widths.items(), key=lambda item: item[1]):
+        resized = image.copy()
+        resized.thumbnail((width, width * 4))
+        for image_format, extension in FORMATS:
+            name = variant_name(file_name, size, extension)
+            _save(resized, os.path.join(upload_folder, name), image_format)
+            variants.append({"name": name, "format": image_format, "width": resized.width})
+
+    placeholder = image.copy()
+    placeholder.thumbnail((image_placeholder_width, image_placeholder_width * 4))
+    buffer = io.BytesIO()
+    placeholder.save(buffer, "JPEG", quality=40)
+    return {"source": file_name, "variants": variants,
+            "placeholder": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()}
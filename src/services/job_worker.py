@@ -0,0 +1,83 @@
+"""
+Runs the background job workers: job_workers processes, each claiming and
+running jobs from the jobs table (see src/services/jobs.py). A worker that
+dies is replaced. SIGTERM or Ctrl-C lets every worker finish its current job,
+then stops them.
+
+Usage:
+    python -m src.services.job_worker                 start job_workers processes
+    python -m src.services.job_worker --processes 4   start 4 processes
+"""
+import argparse
+import importlib
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Any, List
+
+from src.config import job_workers
+from src.services import jobs
+
+logger = logging.getLogger(__name__)
+
+# The modules whose @job handlers the workers run.
+JOB_MODULES = (
+    "src.services.image_service",
+    "src.services.likes_reconciliation",
+)
+# Seconds between two checks that every worker process is alive.
+SUPERVISE_INTERVAL = 1.0
+
+
+def load_handlers() -> None:
+    """
+    Imports JOB_MODULES so their handlers are registered.
+    """
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+
+
+def _run_worker(stop: Any) -> None:
+    # Ctrl-C reaches the whole process group; the supervisor alone decides when to stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    load_handlers()
+    jobs.work(stop=stop)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=job_workers, help="number of worker processes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+
+    # Spawned, not forked, so no worker inherits a connection pool or thread.
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    # The handlers only flip a flag: setting the shared event from a signal
+    # handler could deadlock on the lock the interrupted code holds.
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+    def start(index: int) -> Any:
+        process = context.Process(target=_run_worker, args=(stop,), name=f"job-worker-{index}")
+        process.start()
+        return process
+
+    processes: List[Any] = [start(index) for index in range(max(args.processes, 1))]
+    while not stopping:
+        time.sleep(SUPERVISE_INTERVAL)
+        for index, process in enumerate(processes):
+            if not stopping and not process.is_alive():
+                logger.warning("%s exited with code %s, restarting it", process.name, process.exitcode)
+                processes[index] = start(index)
+    logger.info("Stopping %d job worker(s)", len(processes))
+    stop.set()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
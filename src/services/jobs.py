@@ -0,0 +1,212 @@
+"""
+Durable background jobs kept in the jobs table.
+
+A job is a kind plus a JSON payload of keyword arguments for the function
+registered under that kind:
+
+    @job("build_image_variants")
+    def build_image_variants(upload_folder, file_name): ...
+
+    enqueue("build_image_variants", {"upload_folder": ..., "file_name": ...})
+
+enqueue only inserts a row, so a request handler returns right away; enqueued
+inside a unit_of_work, the job is committed or rolled back with the unit's
+other writes. Workers (`python -m src.services.job_worker`) claim due jobs
+with SELECT ... FOR UPDATE SKIP LOCKED, highest priority first, and send a
+heartbeat every job_heartbeat_interval seconds while they run it; a job whose
+heartbeat stops for job_lock_timeout seconds, because its worker died, is
+queued again. A job that raises is retried with exponential backoff until it
+runs out of attempts, then left in the table as failed with its last error.
+
+Handlers may run more than once (after a retry or a lost worker), so they must
+be idempotent.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from src import metrics
+from src.config import (job_heartbeat_interval, job_lock_timeout, job_max_attempts, job_poll_interval,
+                        job_retention, job_retry_base_delay, job_retry_max_delay)
+from src.dal.job_dao import JobDao
+from src.models.job_dto import JobDto
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two housekeeping passes of an idle worker: requeueing lost
+# jobs, deleting old finished ones and scheduling the periodic jobs.
+MAINTENANCE_INTERVAL = 60.0
+
+_handlers: Dict[str, Callable[..., Any]] = {}
+_periodic: Dict[str, float] = {}
+
+
+def job(kind: str, every: Optional[float] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Registers the decorated function as the handler of a job kind.
+
+    :param kind: The job kind, unique across the application
+    :param every: Makes the job periodic: workers keep one such job queued, due
+                  `every` seconds after they queue it. None or 0 or less disables it
+    :return: The decorator, which returns the function unchanged
+    """
+    def register(func: Callable[..., Any]) -> Callable[..., Any]:
+        if kind in _handlers:
+            raise ValueError(f"Job kind {kind} is already registered")
+        _handlers[kind] = func
+        if every is not None and every > 0:
+            _periodic[kind] = every
+        return func
+    return register
+
+
+def enqueue(kind: str, payload: Optional[Dict[str, Any]] = None, priority: int = 0,
+            delay: Optional[float] = None, run_at: Optional[datetime] = None,
+            max_attempts: int = job_max_attempts, unique_key: Optional[str] = None,
+            job_dao: Optional[JobDao] = None) -> Optional[int]:
+    """
+    Queues a job.
+
+    :param kind: The job kind; workers fail jobs of kinds they have no handler for
+    :param payload: The handler's keyword arguments; must be JSON serializable
+    :param priority: Higher runs first among due jobs
+    :param delay: Seconds from now until the job is due; ignored if run_at is given
+    :param run_at: When the job is due; now by default
+    :param max_attempts: How many times the job is tried before it fails for good
+    :param unique_key: Skips the job while another job with this key is queued and not yet
+                       tried; one that is running, or waiting for a retry, does not count
+    :param job_dao: JobDao instance, a new one by default
+    :return: The job's id, or None when skipped because of unique_key
+    """
+    if run_at is None and delay:
+        run_at = datetime.fromtimestamp(time.time() + delay).astimezone()
+    return (job_dao or JobDao()).enqueue(JobDto(kind=kind, payload=payload or {}, priority=priority,
+                                                run_at=run_at, max_attempts=max_attempts,
+                                                unique_key=unique_key))
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Returns how long to wait before the next attempt of a job that has failed
+    `attempts` times: job_retry_base_delay doubled per attempt, capped at
+    job_retry_max_delay, minus up to half at random so jobs that failed
+    together do not all come back at once.
+    """
+    delay = min(job_retry_base_delay * 2 ** (attempts - 1), job_retry_max_delay)
+    return delay * random.uniform(0.5, 1.0)
+
+
+@contextmanager
+def heartbeat(job_dao: JobDao, job: JobDto, worker_id: str) -> Iterator[None]:
+    """
+    Touches the job's heartbeat every job_heartbeat_interval seconds from a
+    background thread while the block runs, so it is not presumed lost however long it takes.
+    """
+    done = threading.Event()
+    interval = job_heartbeat_interval
+
+    def beat() -> None:
+        while not done.wait(interval):
+            try:
+                if not job_dao.heartbeat(job.id, worker_id):
+                    logger.warning("Job %d (%s) was taken away from worker %s", job.id, job.kind, worker_id)
+                    return
+            except Exception:
+                logger.exception("Heartbeat of job %d (%s) failed", job.id, job.kind)
+
+    thread = threading.Thread(target=beat, name=f"job-heartbeat-{job.id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+def run_next(worker_id: str, job_dao: Optional[JobDao] = None) -> Optional[JobDto]:
+    """
+    Claims the most urgent due job and runs it.
+
+    :param worker_id: Identifies this worker in the jobs' locked_by column
+    :param job_dao: JobDao instance, a new one by default
+    :return: The job that ran, whatever its outcome, or None when no job was due
+    """
+    job_dao = job_dao or JobDao()
+    claimed = job_dao.claim(worker_id)
+    if claimed is None:
+        return None
+    handler = _handlers.get(claimed.kind)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for job kind {claimed.kind}")
+        with heartbeat(job_dao, claimed, worker_id):
+            handler(**claimed.payload)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if handler is None or claimed.attempts >= claimed.max_attempts:
+            logger.exception("Job %d (%s) failed for good after %d attempt(s)",
+                             claimed.id, claimed.kind, claimed.attempts)
+            job_dao.fail(claimed.id, worker_id, error)
+            outcome = "failed"
+        else:
+            delay = retry_delay(claimed.attempts)
+            logger.warning("Job %d (%s) failed, retrying in %.0fs: %s", claimed.id, claimed.kind, delay, error)
+            job_dao.retry(claimed.id, worker_id, delay, error)
+            outcome = "retried"
+    else:
+        job_dao.complete(claimed.id, worker_id)
+        outcome = "done"
+    metrics.JOB_DURATION.observe(time.perf_counter() - started, kind=claimed.kind)
+    metrics.JOBS.inc(kind=claimed.kind, outcome=outcome)
+    metrics.registry.flush()
+    return claimed
+
+
+def maintain(job_dao: Optional[JobDao] = None) -> None:
+    """
+    Requeues the jobs of lost workers, deletes finished jobs older than
+    job_retention and makes sure every periodic job is queued.
+    """
+    job_dao = job_dao or JobDao()
+    requeued = job_dao.requeue_stale(job_lock_timeout)
+    if requeued:
+        logger.warning("Requeued %d job(s) whose worker was lost", requeued)
+    job_dao.delete_finished(job_retention)
+    for kind, every in _periodic.items():
+        enqueue(kind, delay=every, unique_key=kind, job_dao=job_dao)
+
+
+def work(worker_id: Optional[str] = None, stop: Optional[threading.Event] = None,
+         poll_interval: float = job_poll_interval) -> None:
+    """
+    Runs jobs until `stop` is set: back to back while jobs are due, then
+    checking again every poll_interval seconds. The job being run when `stop`
+    is set is finished first.
+
+    :param worker_id: Identifies this worker; "<host>:<pid>" by default
+    :param stop: Event that ends the loop; runs forever without one
+    :param poll_interval: Seconds between two looks for due jobs while idle
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    job_dao = JobDao()
+    next_maintenance = 0.0
+    logger.info("Job worker %s started", worker_id)
+    while not stop.is_set():
+        try:
+            if time.monotonic() >= next_maintenance:
+                maintain(job_dao)
+                next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+            if run_next(worker_id, job_dao) is not None:
+                continue
+        except Exception:
+            logger.exception("Job worker %s failed to reach the queue", worker_id)
+        stop.wait(poll_interval)
+    logger.info("Job worker %s stopped", worker_id)
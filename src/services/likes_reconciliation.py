@@ -0,0 +1,46 @@
+import logging
+from typing import Optional
+
+from src.config import likes_reconcile_batch_size, likes_reconcile_interval
+from src.dal.vacation_dao import VacationDao
+from src.services.jobs import job
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_LIKES_COUNTS = "reconcile_likes_counts"
+
+
+def reconcile_likes_counts(batch_size: int = likes_reconcile_batch_size,
+                           vacation_dao: Optional[VacationDao] = None) -> int:
+    """
+    Walks all vacations in id order, one transaction per batch, and resets every
+    likes_count that no longer matches the likes table.
+
+    :param batch_size: How many vacations to recount per transaction
+    :param vacation_dao: VacationDao instance, a new one by default
+    :return: The number of vacations whose count was fixed
+    """
+    vacation_dao = vacation_dao or VacationDao()
+    after_id, fixed = 0, 0
+    while True:
+        after_id, fixed_ids = vacation_dao.reconcile_likes_counts(after_id, batch_size)
+        if after_id is None:
+            break
+        if fixed_ids:
+            logger.warning("Fixed drifted likes_count of vacations %s", fixed_ids)
+            fixed += len(fixed_ids)
+    return fixed
+
+
+@job(RECONCILE_LIKES_COUNTS, every=likes_reconcile_interval)
+def reconcile_likes_counts_job() -> None:
+    """
+    Periodic job running reconcile_likes_counts every likes_reconcile_interval
+    seconds, in a single worker at a time.
+    """
+    reconcile_likes_counts()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Fixed %d likes counts", reconcile_likes_counts())
@@ -0,0 +1,149 @@
+"""
+Content-addressed store of the uploaded vacation images.
+
+An upload is copied to a temporary file in the upload folder chunk by chunk,
+hashed with SHA-256 as it goes, and renamed to "<sha256>.<ext>" once complete.
+The extension comes from the file's magic bytes, never from the client's file
+name. Identical uploads map to the same name and are stored once; an upload
+whose content is already there just drops its temporary copy. A stored file is
+never modified, which is what lets it be served as immutable.
+
+Images uploaded before the store existed keep their original names until
+adopted:
+
+    python -m src.services.media_store     hash the legacy images and repoint the vacations at them
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from typing import BinaryIO, Dict, Optional
+
+from src.config import media_chunk_size, media_max_bytes
+from src.dal.vacation_dao import VacationDao
+from src.services import image_service
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "media")
+
+_CONTENT_NAME = re.compile(r"^[0-9a-f]{64}\.(?:jpg|png|gif|webp)$")
+# The longest magic number below, plus the "WEBP" tag at offset 8.
+_SNIFF_SIZE = 12
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """
+    Returns the extension of a JPEG, PNG, GIF or WebP image from its first
+    bytes, or None for anything else.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def is_content_name(name: str) -> bool:
+    """
+    Tells whether a file name was given by the store, i.e. names immutable content.
+    """
+    return bool(_CONTENT_NAME.match(name))
+
+
+def save(stream: BinaryIO, root: str = UPLOAD_FOLDER, max_bytes: int = media_max_bytes,
+         chunk_size: int = media_chunk_size) -> str:
+    """
+    Stores an uploaded image under its content hash.
+
+    :param stream: The upload, read until exhausted; e.g. a werkzeug FileStorage's stream
+    :param root: The folder to store it in
+    :param max_bytes: The largest accepted upload
+    :param chunk_size: Bytes read and hashed at a time
+    :return: The stored file's name, relative to root
+    :raises ValueError: If the upload is empty, not a JPEG, PNG, GIF or WebP image, or over max_bytes
+    """
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    fd, temp_path = tempfile.mkstemp(dir=root, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as temp:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"Image is larger than {max_bytes} bytes")
+                if len(head) < _SNIFF_SIZE:
+                    head += chunk[:_SNIFF_SIZE - len(head)]
+                digest.update(chunk)
+                temp.write(chunk)
+        if size == 0:
+            raise ValueError("Image is empty")
+        extension = sniff_extension(head)
+        if extension is None:
+            raise ValueError("Image must be a JPEG, PNG, GIF or WebP file")
+
+        name = f"{digest.hexdigest()}.{extension}"
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+            # Atomic: readers see either no file or the complete one.
+            os.replace(temp_path, path)
+        return name
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def adopt_existing(root: str = UPLOAD_FOLDER, vacation_dao: Optional[VacationDao] = None) -> Dict[str, str]:
+    """
+    Moves the images vacations show under legacy names into the store and
+    repoints the vacations at the content-addressed names. The legacy files are
+    left in place for links that still point at them.
+
+    :param root: The upload folder
+    :param vacation_dao: The VacationDao to read and update the vacations with
+    :return: {legacy name: stored name} for every adopted image
+    """
+    vacation_dao = vacation_dao or VacationDao()
+    adopted = {}
+    for file_name in vacation_dao.get_file_names():
+        path = os.path.join(root, file_name)
+        if is_content_name(file_name) or not os.path.isfile(path):
+            continue
+        try:
+            with open(path, "rb") as legacy:
+                name = save(legacy, root, max_bytes=os.path.getsize(path))
+        except ValueError as e:
+            logger.warning("Skipping %s: %s", file_name, e)
+            continue
+        vacation_dao.rename_file(file_name, name)
+        adopted[file_name] = name
+    return adopted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=UPLOAD_FOLDER, help="the upload folder")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for file_name, name in adopt_existing(args.root).items():
+        logger.info("%s -> %s", file_name, name)
+        image_service.process_upload(args.root, name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Password hashing and verification off the request threads.
+
+Key derivation is deliberately slow and holds the GIL, so it runs in a small
+pool of spawned worker processes; the request thread only waits on the result
+and other requests keep being served meanwhile. The pool is bounded: at most
+password_hash_workers + password_hash_queue_size hashes are in flight, and a
+request that finds no slot within password_hash_timeout seconds gets
+PasswordHasherBusy instead of queueing without limit behind a login storm.
+
+Hashes use password_hash_method. A stored hash made with another method or
+cost still verifies, and needs_rehash tells the login handlers to replace it.
+"""
+import asyncio
+import atexit
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from src import metrics
+from src.config import (password_hash_method, password_hash_queue_size, password_hash_timeout,
+                        password_hash_workers, password_salt_length)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(password_hash_workers, 1) + password_hash_queue_size)
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when every hash worker is busy and the queue stayed full for password_hash_timeout.
+    """
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=password_hash_workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _submit(operation: str, func: Callable[..., Any], *args: Any) -> Future:
+    """
+    Runs func(*args) in a hash worker, or right here when there are none, and
+    returns its future. Records the pending count and the latency.
+    """
+    if password_hash_workers <= 0:
+        future: Future = Future()
+        started = time.perf_counter()
+        future.set_result(func(*args))
+        metrics.PASSWORD_HASH_DURATION.observe(time.perf_counter() - started, operation=operation)
+        return future
+
+    if not _slots.acquire(timeout=password_hash_timeout):
+        raise PasswordHasherBusy("Too many password checks in progress, please try again")
+    metrics.PASSWORD_HASHES_PENDING.inc()
+    started = time.perf_counter()
+
+    def done(_: Future) -> None:
+        metrics.PASSWORD_HASH_DURATION.observe(time.perf_counter() - started, operation=operation)
+        metrics.PASSWORD_HASHES_PENDING.dec()
+        _slots.release()
+
+    try:
+        future = _get_executor().submit(func, *args)
+    except BaseException:
+        metrics.PASSWORD_HASHES_PENDING.dec()
+        _slots.release()
+        raise
+    future.add_done_callback(done)
+    return future
+
+
+def hash_password(password: str) -> str:
+    """
+    Hashes a password with the configured method and cost.
+
+    :param password: The plain text password
+    :return: The hash to store, in werkzeug's "method$salt$hash" format
+    :raises PasswordHasherBusy: If no hash worker slot freed up in time
+    """
+    return _submit("hash", generate_password_hash, password, password_hash_method, password_salt_length).result()
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    """
+    Checks a password against a stored hash, whatever method made the hash.
+
+    :param password_hash: The stored hash
+    :param password: The plain text password to check
+    :return: Whether they match
+    :raises PasswordHasherBusy: If no hash worker slot freed up in time
+    """
+    return _submit("verify", check_password_hash, password_hash, password).result()
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Like hash_password, but awaits the worker instead of blocking the event loop on it.
+    """
+    return await asyncio.wrap_future(
+        _submit("hash", generate_password_hash, password, password_hash_method, password_salt_length))
+
+
+async def verify_password_async(password_hash: str, password: str) -> bool:
+    """
+    Like verify_password, but awaits the worker instead of blocking the event loop on it.
+    """
+    return await asyncio.wrap_future(_submit("verify", check_password_hash, password_hash, password))
+
+
+def _method_of(password_hash: str) -> str:
+    return password_hash.split("$", 1)[0]
+
+
+def _full_method(method: str) -> str:
+    """
+    Spells out a werkzeug hash method with the defaults werkzeug fills in, e.g.
+    "scrypt" as "scrypt:32768:8:1", the way it is written at the head of the hashes it makes.
+    """
+    name, *args = method.split(":")
+    if name == "scrypt":
+        if not args:
+            args = ["32768", "8", "1"]
+        if len(args) != 3:
+            raise ValueError("'scrypt' takes 3 arguments.")
+        return ":".join([name, *(str(int(arg)) for arg in args)])
+    if name == "pbkdf2":
+        if len(args) > 2:
+            raise ValueError("'pbkdf2' takes 2 arguments.")
+        hash_name = args[0] if args else "sha256"
+        iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f"{name}:{hash_name}:{iterations}"
+    raise ValueError(f"Invalid hash method '{method}'.")
+
+
+_current_method = _full_method(password_hash_method)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """
+    Tells whether a stored hash was made with other settings than
+    password_hash_method, e.g. a lower cost, and should be replaced on the
+    user's next successful login.
+    """
+    return _method_of(password_hash) != _current_method
+
+
+def shutdown() -> None:
+    """
+    Stops the hash workers.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+atexit.register(shutdown)
@@ -1,8 +1,34 @@
 import re
 from src.models.user_dto import UserDto
-from src.dal.user_dao import UserDao
+from src.dal.user_dao import UserDao, AsyncUserDao
 from src.models.likes_dto import LikesDto
+from src.models.import_report_dto import ImportReportDto, RowErrorDto
 from src.dal.likes_dao import LikesDao
+from src.dal.database import unit_of_work
+from src.services import passwords
+from src.services.batching import batched
+from src.config import bulk_batch_size
+from typing import Any, Dict, Iterable
+
+
+def _check_user_fields(user_dto: UserDto) -> None:
+    """
+    Runs the registration checks that do not need the database.
+    :raises TypeError: If user_dto is not an instance of UserDto.
+    :raises ValueError: If role_id is 2, if email format is invalid or if password is too short.
+    """
+    if not isinstance(user_dto, UserDto):
+        raise TypeError("UserDto type expected for user_dto.")
+
+    if user_dto.role_id == 2:
+        raise ValueError("Invalid role_id: 2 is not allowed. Use role_id 1 instead.")
+
+    email_regex: str = r'^[A-Za-z0-9]+@[A-Za-z]+\.[A-Za-z]{2,}$'
+    if not re.fullmatch(email_regex, user_dto.email):
+        raise ValueError("Invalid email format provided.")
+
+    if len(user_dto.password) < 4:
+        raise ValueError("Password is too short; it must be at least 4 characters long.")
 
 
 class UserServices:
@@ -21,18 +47,7 @@ class UserServices:
         :raises ValueError: If role_id is 2, if email format is invalid, if password is too short,
                             or if the email already exists in the system.
         """
-        if not isinstance(user_dto, UserDto):
-            raise TypeError("UserDto type expected for user_dto.")
-
-        if user_dto.role_id == 2:
-            raise ValueError("Invalid role_id: 2 is not allowed. Use role_id 1 instead.")
-
-        email_regex: str = r'^[A-Za-z0-9]+@[A-Za-z]+\.[A-Za-z]{2,}$'
-        if not re.fullmatch(email_regex, user_dto.email):
-            raise ValueError("Invalid email format provided.")
-
-        if len(user_dto.password) < 4:
-            raise ValueError("Password is too short; it must be at least 4 characters long.")
+        _check_user_fields(user_dto)
 
         if self.user_dao.check_if_email_exist(user_dto.email):
             raise ValueError("The email provided already exists in the system.")
@@ -43,8 +58,69 @@ class UserServices:
 
         :param user_dto: UserDto object containing the user's registration data.
         """
-        self.validate_user_before_insert(user_dto)
-        self.user_dao.insert_into_users(user_dto)
+        with unit_of_work():
+            self.validate_user_before_insert(user_dto)
+            self.user_dao.insert_into_users(user_dto)
+
+    def bulk_register_users(self, user_dtos: Iterable[UserDto], batch_size: int = bulk_batch_size) -> ImportReportDto:
+        """
+        Validates and inserts many users, one COPY per batch. Users that fail
+        validation are skipped and reported instead of failing the whole import.
+
+        :param user_dtos: UserDto objects, read lazily.
+        :param batch_size: How many users to validate and copy at a time.
+        :return: ImportReportDto with the inserted count and the 1-based rows that were rejected.
+        """
+        report = ImportReportDto()
+        seen = set()
+        for batch_number, batch in enumerate(batched(user_dtos, batch_size)):
+            first_row = batch_number * batch_size + 1
+            candidates = []
+            for row_number, user_dto in enumerate(batch, start=first_row):
+                try:
+                    _check_user_fields(user_dto)
+                except (TypeError, ValueError) as e:
+                    report.errors.append(RowErrorDto(row_number, str(e)))
+                    continue
+                candidates.append((row_number, user_dto))
+
+            existing = self.user_dao.get_existing_emails(user_dto.email for _, user_dto in candidates)
+            valid = []
+            for row_number, user_dto in candidates:
+                if user_dto.email in existing or user_dto.email in seen:
+                    report.errors.append(RowErrorDto(row_number, "The email provided already exists in the system."))
+                    continue
+                seen.add(user_dto.email)
+                valid.append(user_dto)
+            report.inserted += self.user_dao.bulk_insert_users(valid)
+        report.errors.sort(key=lambda error: error.row)
+        return report
+
+    def bulk_like_vacations(self, likes_dtos: Iterable[LikesDto]) -> ImportReportDto:
+        """
+        Inserts many likes at once. Likes whose user or vacation does not exist,
+        or that already exist, are reported as errors.
+
+        :param likes_dtos: LikesDto objects with integer user_id and vacation_id.
+        :return: ImportReportDto with the inserted count and the 1-based rows that were rejected.
+        """
+        report = ImportReportDto()
+        rows = []
+        for row_number, likes_dto in enumerate(likes_dtos, start=1):
+            if not isinstance(likes_dto.user_id, int) or not isinstance(likes_dto.vacation_id, int):
+                report.errors.append(RowErrorDto(row_number, "Both user_id and vacation_id must be integers."))
+                continue
+            rows.append((row_number, (likes_dto.user_id, likes_dto.vacation_id)))
+
+        inserted = set(self.likes_dao.bulk_insert_likes(pair for _, pair in rows))
+        report.inserted = len(inserted)
+        for row_number, pair in rows:
+            if pair in inserted:
+                inserted.discard(pair)
+            else:
+                report.errors.append(RowErrorDto(row_number, "Unknown user or vacation, or the like already exists."))
+        report.errors.sort(key=lambda error: error.row)
+        return report
 
     def log_in_user(self, user_dto: UserDto) -> None:
         """
@@ -64,26 +140,121 @@ class UserServices:
         if len(user_dto.password) < 4:
             raise ValueError("Password is too short; it must be at least 4 characters long.")
 
-    def like_a_vacation(self, likes_dto: LikesDto) -> None:
+    def upgrade_password_hash(self, user: Dict[str, Any], password: str) -> bool:
         """
-        Allows a user to like a specific vacation by inserting a like record into the database.
+        Replaces the user's stored password hash by one made with the current
+        password_hash_method, if it was made with other settings. Call it only
+        once the password has been verified.
+
+        :param user: The user's row, with its id and password hash.
+        :param password: The plain text password the user just logged in with.
+        :return: Whether the hash was replaced; False too when the hash workers
+                 are busy, in which case it is replaced on a later login.
+        """
+        if not passwords.needs_rehash(user['password']):
+            return False
+        try:
+            new_hash = passwords.hash_password(password)
+        except passwords.PasswordHasherBusy:
+            return False
+        self.user_dao.update_user_info_by_id(user['id'], 'password', new_hash)
+        return True
+
+    def toggle_like(self, likes_dto: LikesDto) -> Dict[str, Any]:
+        """
+        Likes a vacation the user has not liked yet, or removes the like otherwise, in one round trip.
 
         :param likes_dto: LikesDto object containing the like data (user_id and vacation_id).
+        :return: The new 'liked' state and the vacation's new 'likes_count'.
         :raises TypeError: If either user_id or vacation_id is not an integer.
+        :raises ValueError: If the vacation does not exist.
         """
         if not isinstance(likes_dto.user_id, int) or not isinstance(likes_dto.vacation_id, int):
             raise TypeError("Both user_id and vacation_id must be integers.")
-        self.likes_dao.insert_into_likes(likes_dto.user_id, likes_dto.vacation_id)
+        result = self.likes_dao.toggle_like(likes_dto.user_id, likes_dto.vacation_id)
+        if result is None:
+            raise ValueError(f"No vacation found with ID {likes_dto.vacation_id}")
+        return result
 
-    def un_like_a_vacation(self, likes_dto: LikesDto) -> None:
+    def like_a_vacation(self, likes_dto: LikesDto) -> Dict[str, Any]:
         """
-        Allows a user to remove a like from a specific vacation by deleting the like record from the database.
+        Allows a user to like a specific vacation. Liking an already liked vacation changes nothing.
 
         :param likes_dto: LikesDto object containing the like data (user_id and vacation_id).
+        :return: The 'liked' state and the vacation's 'likes_count'.
         :raises TypeError: If either user_id or vacation_id is not an integer.
+        :raises ValueError: If the vacation does not exist.
+        """
+        if not isinstance(likes_dto.user_id, int) or not isinstance(likes_dto.vacation_id, int):
+            raise TypeError("Both user_id and vacation_id must be integers.")
+        result = self.likes_dao.like_vacation(likes_dto.user_id, likes_dto.vacation_id)
+        if result is None:
+            raise ValueError(f"No vacation found with ID {likes_dto.vacation_id}")
+        return result
+
+    def un_like_a_vacation(self, likes_dto: LikesDto) -> Dict[str, Any]:
+        """
+        Allows a user to remove a like from a specific vacation. Removing a missing like changes nothing.
+
+        :param likes_dto: LikesDto object containing the like data (user_id and vacation_id).
+        :return: The 'liked' state and the vacation's 'likes_count'.
+        :raises TypeError: If either user_id or vacation_id is not an integer.
+        :raises ValueError: If the vacation does not exist.
         """
         likes_dto.vacation_id = int(likes_dto.vacation_id)
         if not isinstance(likes_dto.user_id, int) or not isinstance(likes_dto.vacation_id, int):
             raise TypeError("Both user_id and vacation_id must be integers.")
-        self.likes_dao.delete_likes_info_by_id(likes_dto.user_id, likes_dto.vacation_id)
+        result = self.likes_dao.unlike_vacation(likes_dto.user_id, likes_dto.vacation_id)
+        if result is None:
+            raise ValueError(f"No vacation found with ID {likes_dto.vacation_id}")
+        return result
+
 
+class AsyncUserServices:
+    def __init__(self) -> None:
+        """
+        Initializes the async user services on top of AsyncUserDao.
+        """
+        self.user_dao: AsyncUserDao = AsyncUserDao()
+
+    async def validate_user_before_insert(self, user_dto: UserDto) -> None:
+        """
+        Validates the user data before inserting it into the database.
+        :param user_dto: UserDto object containing the user's registration data.
+        :raises TypeError: If user_dto is not an instance of UserDto.
+        :raises ValueError: If role_id is 2, if email format is invalid, if password is too short,
+                            or if the email already exists in the system.
+        """
+        _check_user_fields(user_dto)
+
+        if await self.user_dao.check_if_email_exist(user_dto.email):
+            raise ValueError("The email provided already exists in the system.")
+
+    async def register_new_user(self, user_dto: UserDto) -> None:
+        """
+        Registers a new user by validating and then inserting the user's data into the database.
+
+        :param user_dto: UserDto object containing the user's registration data.
+        """
+        await self.validate_user_before_insert(user_dto)
+        await self.user_dao.insert_into_users(user_dto)
+
+    async def upgrade_password_hash(self, user: Dict[str, Any], password: str) -> bool:
+        """
+        Replaces the user's stored password hash by one made with the current
+        password_hash_method, if it was made with other settings. Call it only
+        once the password has been verified.
+
+        :param user: The user's row, with its id and password hash.
+        :param password: The plain text password the user just logged in with.
+        :return: Whether the hash was replaced; False too when the hash workers
+                 are busy, in which case it is replaced on a later login.
+        """
+        if not passwords.needs_rehash(user['password']):
+            return False
+        try:
+            new_hash = await passwords.hash_password_async(password)
+        except passwords.PasswordHasherBusy:
+            return False
+        await self.user_dao.update_user_info_by_id(user['id'], 'password', new_hash)
+        return True
@@ -1,18 +1,174 @@
-from src.dal.vacation_dao import VacationDao
+from src.dal.vacation_dao import VacationDao, AsyncVacationDao, PAGE_ORDERS
+from src.dal.likes_dao import LikesDao
+from src.dal.country_dao import CountryDao
 from src.models.vacation_dto import VacationDto
-from src.dal.database import db_conn
+from src.models.import_report_dto import ImportReportDto, RowErrorDto
+from src.models.vacation_page_dto import VacationPageDto
+from src.dal.database import get_connection, unit_of_work
+from src.services import image_service
+from src.services.batching import batched
+from dataclasses import asdict
+from src.config import bulk_batch_size, vacations_max_page_size, vacations_page_size
+import base64
+import binascii
+import datetime
+import json
 import psycopg.sql
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+VACATION_FIELDS = ("country_id", "vacation_description", "arrival", "departure", "price", "file_name")
+
+
+def _check_vacation_fields(vacation_dto: VacationDto) -> None:
+    """
+    Runs the checks on a new vacation that do not need the database.
+
+    :param vacation_dto: VacationDto object containing the vacation data
+    :raises ValueError: If the object is not a VacationDto, the price is out of range
+                        or the arrival date is later than the departure date
+    """
+    if not isinstance(vacation_dto, VacationDto):
+        raise ValueError(
+            "You must enter all of the fields to insert new vacation")
+
+    if vacation_dto.price <= 0 or vacation_dto.price >= 10000:
+        raise ValueError("Price cannot be zero or negative or more than 10000")
+
+    if vacation_dto.arrival > vacation_dto.departure:
+        raise ValueError(
+            "Arrival date cannot be later than departure date")
+
+
+def _vacation_from_row(row: Union[VacationDto, Dict[str, Any]]) -> VacationDto:
+    """
+    Builds a VacationDto from an import row, parsing ISO dates and the price.
+
+    :param row: A VacationDto or a dict with the vacation fields
+    :raises ValueError: If a field is missing or has the wrong format
+    """
+    if isinstance(row, VacationDto):
+        return row
+    if not isinstance(row, dict):
+        raise ValueError("Each row must be an object with the vacation fields")
+    missing = [name for name in VACATION_FIELDS[:-1] if row.get(name) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    try:
+        arrival, departure = (value if isinstance(value, datetime.date) else datetime.date.fromisoformat(value)
+                              for value in (row["arrival"], row["departure"]))
+        return VacationDto(int(row["country_id"]), row["vacation_description"], arrival, departure,
+                           int(row["price"]), row.get("file_name"))
+    except (TypeError, ValueError):
+        raise ValueError("country_id and price must be numbers and dates must be YYYY-MM-DD")
+
+
+def _check_vacation_changes(current: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts and validates the changed fields of a vacation together with its
+    current values, so that for example a new arrival is checked against a new
+    departure sent in the same update.
+
+    :param current: The vacation as it is stored now
+    :param changes: New values by column name, possibly strings from a form
+    :return: The changes converted to the column types
+    :raises ValueError: If a value has the wrong format, the price is out of range
+                        or the arrival date is later than the departure date
+    """
+    changes = dict(changes)
+    try:
+        for column in ("country_id", "price"):
+            if column in changes:
+                changes[column] = int(changes[column])
+        for column in ("arrival", "departure"):
+            if isinstance(changes.get(column), str):
+                changes[column] = datetime.date.fromisoformat(changes[column])
+    except (TypeError, ValueError):
+        raise ValueError("country_id and price must be numbers and dates must be YYYY-MM-DD")
+
+    if "price" in changes and (changes["price"] < 0 or changes["price"] > 10000):
+        raise ValueError("Price cannot be negative or more than 10000")
+
+    arrival = changes.get("arrival", current.get("arrival"))
+    departure = changes.get("departure", current.get("departure"))
+    if arrival is not None and departure is not None and arrival > departure:
+        raise ValueError("Arrival date cannot be later than departure date")
+    return changes
+
+
+def _encode_cursor(order_by: str, vacation: Dict[str, Any]) -> str:
+    """
+    Builds the opaque cursor that resumes a listing right after the given vacation.
+
+    :param order_by: The sort key of the listing
+    :param vacation: The last vacation of the current page
+    """
+    key = vacation[order_by]
+    if isinstance(key, datetime.date):
+        key = key.isoformat()
+    payload = json.dumps([order_by, key, vacation["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(order_by: str, cursor: str) -> Tuple[Any, int]:
+    """
+    Reads back the (sort key, id) pair stored in a cursor made by _encode_cursor.
+
+    :param order_by: The sort key of the listing, which must match the cursor's
+    :param cursor: The cursor sent by the client
+    :raises ValueError: If the cursor is malformed or was made for another sort key
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order, key, vacation_id = json.loads(payload)
+        if cursor_order != order_by or not isinstance(vacation_id, int):
+            raise ValueError
+        if order_by == "arrival":
+            key = datetime.date.fromisoformat(key)
+        elif not isinstance(key, int):
+            raise ValueError
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError("Invalid page cursor")
+    return key, vacation_id
+
+
+def _page_request(order_by: str, limit: Optional[Union[int, str]],
+                  cursor: Optional[str]) -> Tuple[int, Optional[Tuple[Any, int]]]:
+    """
+    Validates the paging arguments of a listing.
+
+    :return: The page size and the (sort key, id) to resume after, if any
+    :raises ValueError: If the sort key, page size or cursor is invalid
+    """
+    if order_by not in PAGE_ORDERS:
+        raise ValueError(f"Vacations can only be ordered by {', '.join(PAGE_ORDERS)}")
+    try:
+        limit = vacations_page_size if limit in (None, "") else int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("Page size must be a number")
+    if not 1 <= limit <= vacations_max_page_size:
+        raise ValueError(f"Page size must be between 1 and {vacations_max_page_size}")
+    return limit, _decode_cursor(order_by, cursor) if cursor else None
+
+
+def _build_page(rows: List[Dict[str, Any]], order_by: str, limit: int) -> VacationPageDto:
+    """
+    Turns the limit + 1 rows fetched for a page into the page and its next cursor.
+    """
+    vacations = rows[:limit]
+    next_cursor = _encode_cursor(order_by, vacations[-1]) if len(rows) > limit else None
+    return VacationPageDto(vacations, order_by, limit, next_cursor)
 
 
 class VacationService:
-    def __init__(self, vacation_dao: Optional[VacationDao] = None) -> None:
+    def __init__(self, vacation_dao: Optional[VacationDao] = None, likes_dao: Optional[LikesDao] = None) -> None:
         """
         Initializes the vacation service with the provided VacationDao instance.
 
         :param vacation_dao: VacationDao instance used for vacation-related database operations
+        :param likes_dao: LikesDao instance used to remove the likes of deleted vacations
         """
         self.vacation_dao = vacation_dao or VacationDao()
+        self.likes_dao = likes_dao or LikesDao()
 
     def get_all_vacations_by_order(self, order_by_column: str = "price") -> List[tuple]:
         """
@@ -21,12 +177,30 @@ class VacationService:
         :param order_by_column: The column to order the results by (default is "price")
         :return: A list of tuples representing vacation data
         """
-        with db_conn.cursor() as cur:
+        with get_connection() as conn, conn.cursor() as cur:
             cur.execute(psycopg.sql.SQL(
                 "SELECT * FROM vacations ORDER BY {} ASC;").format(psycopg.sql.Identifier(order_by_column)))
             result = cur.fetchall()
         return result
 
+    def get_vacations_page(self, order_by: str = "price", limit: Optional[Union[int, str]] = None,
+                           cursor: Optional[str] = None, user_id: Optional[int] = None) -> VacationPageDto:
+        """
+        Retrieves one page of vacations using keyset pagination, so the cost of a
+        page does not depend on how deep into the listing it is.
+
+        :param order_by: "price", "arrival" or "id"; ties are broken by id
+        :param limit: The page size, defaults to VACATIONS_PAGE_SIZE
+        :param cursor: The next_cursor of the previous page, or None for the first page
+        :param user_id: The user whose likes fill each vacation's user_liked flag
+        :return: VacationPageDto with the vacations, including likes_count and user_liked,
+                 and the cursor of the next page, if any
+        :raises ValueError: If the sort key, page size or cursor is invalid
+        """
+        limit, after = _page_request(order_by, limit, cursor)
+        rows = self.vacation_dao.get_vacations_page(order_by, limit + 1, after, user_id)
+        return _build_page(rows, order_by, limit)
+
     def validate_insert_of_new_vacation(self, vacation_dto: VacationDto) -> None:
         """
         Validates the vacation data before inserting a new vacation.
@@ -34,21 +208,53 @@ class VacationService:
         :param vacation_dto: VacationDto object containing the vacation data
         :raises ValueError: If any of the validation checks fail (e.g., price, date)
         """
-        if not isinstance(vacation_dto, VacationDto):
-            raise ValueError(
-                "You must enter all of the fields to insert new vacation")
-
-        if vacation_dto.price <= 0 or vacation_dto.price >= 10000:
-            raise ValueError("Price cannot be zero or negative or more than 10000")
-
-        if vacation_dto.arrival > vacation_dto.departure:
-            raise ValueError(
-                "Arrival date cannot be later than departure date")
+        _check_vacation_fields(vacation_dto)
 
         if self.vacation_dao.get_vacation_arrival_departure_time(vacation_dto.arrival, vacation_dto.departure) is not None:
             raise ValueError(
                 "You can't enter an existing arrival, departure dates")
 
+    def bulk_register_vacations(self, rows: Iterable[Union[VacationDto, Dict[str, Any]]],
+                                batch_size: int = bulk_batch_size) -> ImportReportDto:
+        """
+        Validates and inserts many vacations, one COPY per batch. Rows that fail
+        validation are skipped and reported instead of failing the whole import.
+
+        :param rows: VacationDto objects or dicts with the vacation fields, read lazily
+        :param batch_size: How many rows to validate and copy at a time
+        :return: ImportReportDto with the inserted count and the 1-based rows that were rejected
+        """
+        report = ImportReportDto()
+        country_ids = {country["id"] for country in CountryDao().get_all_countries()}
+        seen = set()
+        for batch_number, batch in enumerate(batched(rows, batch_size)):
+            first_row = batch_number * batch_size + 1
+            candidates = []
+            for row_number, row in enumerate(batch, start=first_row):
+                try:
+                    vacation_dto = _vacation_from_row(row)
+                    _check_vacation_fields(vacation_dto)
+                    if vacation_dto.country_id not in country_ids:
+                        raise ValueError(f"Unknown country_id {vacation_dto.country_id}")
+                except ValueError as e:
+                    report.errors.append(RowErrorDto(row_number, str(e)))
+                    continue
+                candidates.append((row_number, vacation_dto))
+
+            existing = self.vacation_dao.get_existing_arrival_departure_pairs(
+                (vacation_dto.arrival, vacation_dto.departure) for _, vacation_dto in candidates)
+            valid = []
+            for row_number, vacation_dto in candidates:
+                dates = (vacation_dto.arrival, vacation_dto.departure)
+                if dates in existing or dates in seen:
+                    report.errors.append(RowErrorDto(row_number, "You can't enter an existing arrival, departure dates"))
+                    continue
+                seen.add(dates)
+                valid.append(vacation_dto)
+            report.inserted += self.vacation_dao.bulk_insert_vacations(valid)
+        report.errors.sort(key=lambda error: error.row)
+        return report
+
     def validate_update_of_new_vacation(self, vacation_dto: VacationDto, column: str, new_value: str) -> None:
         """
         Validates the vacation data before updating a specific column of an existing vacation.
@@ -58,43 +264,49 @@ class VacationService:
         :param new_value: The new value to set for the column
         :raises ValueError: If the update value does not meet the validation criteria
         """
-        if column == "price":
-            if new_value < 0 or new_value > 10000:
-                raise ValueError("Price cannot be negative or more than 10000")
+        current = vacation_dto if isinstance(vacation_dto, dict) else asdict(vacation_dto)
+        _check_vacation_changes(current, {column: new_value})
 
-        elif column == "arrival":
-            if new_value > vacation_dto.departure:
-                raise ValueError(
-                    "Arrival date cannot be later than departure date")
-
-        elif column == "departure":
-            if new_value < vacation_dto.arrival:
-                raise ValueError(
-                    "Departure date cannot be earlier than arrival date")
-
-    def register_new_vacation(self, vacation_dto: VacationDto) -> None:
+    def register_new_vacation(self, vacation_dto: VacationDto, upload_folder: Optional[str] = None) -> None:
         """
         Registers a new vacation by inserting it into the database after validation.
 
         :param vacation_dto: VacationDto object containing the vacation data
+        :param upload_folder: The folder the vacation's image was just uploaded to, if it was;
+                              the build of its variants is queued with the insert
         """
-        self.validate_insert_of_new_vacation(vacation_dto)
-        self.vacation_dao.insert_into_vacations(vacation_dto)
+        with unit_of_work():
+            self.validate_insert_of_new_vacation(vacation_dto)
+            self.vacation_dao.insert_into_vacations(vacation_dto)
+            if upload_folder and vacation_dto.file_name:
+                image_service.process_upload(upload_folder, vacation_dto.file_name)
 
-    def update_vacation_after_validation(self, id: int, column: str, new_value: str) -> None:
+    def update_vacation_after_validation(self, id: int, changes: Union[str, Dict[str, Any]],
+                                         new_value: Any = None, upload_folder: Optional[str] = None) -> Dict[str, Any]:
         """
-        Updates an existing vacation's information after validating the new value.
+        Updates an existing vacation's information after validating all the changed fields together,
+        in one UPDATE statement.
 
         :param id: The ID of the vacation to update
-        :param column: The column to update (e.g., "price", "arrival", "departure")
-        :param new_value: The new value for the specified column
+        :param changes: New values by column name, or a single column name followed by new_value
+        :param new_value: The new value when changes is a single column name
+        :param upload_folder: The folder a new image in changes was just uploaded to, if any;
+                              the build of its variants is queued with the update
+        :return: The updated vacation
         :raises ValueError: If no vacation is found with the provided ID, or if validation fails
         """
-        vacation_dto = self.vacation_dao.get_vacation_info_by_id(id)
-        if vacation_dto is None:
-            raise ValueError(f"No vacation found with ID {id}")
-        self.validate_update_of_new_vacation(vacation_dto, column, new_value)
-        self.vacation_dao.update_vacation_info_by_id(id, column, new_value)
+        if isinstance(changes, str):
+            changes = {changes: new_value}
+        with unit_of_work():
+            current = self.vacation_dao.get_vacation_info_by_id(id)
+            if current is None:
+                raise ValueError(f"No vacation found with ID {id}")
+            updated = self.vacation_dao.update_vacation_fields(id, _check_vacation_changes(current, changes))
+            if updated is None:
+                raise ValueError(f"No vacation found with ID {id}")
+            if upload_folder and changes.get('file_name'):
+                image_service.process_upload(upload_folder, changes['file_name'])
+        return updated
 
     def delete_vacation_and_likes(self, id: int) -> None:
         """
@@ -102,4 +314,73 @@ class VacationService:
 
         :param id: The ID of the vacation to delete
         """
-        self.vacation_dao.delete_vacation_info_by_id(id)
+        with unit_of_work():
+            self.likes_dao.delete_likes_by_vacation_id(id)
+            self.vacation_dao.delete_vacation_info_by_id(id)
+
+
+class AsyncVacationService:
+    def __init__(self, vacation_dao: Optional[AsyncVacationDao] = None) -> None:
+        """
+        Initializes the async vacation service with the provided AsyncVacationDao instance.
+
+        :param vacation_dao: AsyncVacationDao instance used for vacation-related database operations
+        """
+        self.vacation_dao = vacation_dao or AsyncVacationDao()
+
+    async def get_vacations_page(self, order_by: str = "price", limit: Optional[Union[int, str]] = None,
+                                 cursor: Optional[str] = None, user_id: Optional[int] = None) -> VacationPageDto:
+        """
+        Retrieves one page of vacations using keyset pagination.
+
+        :param order_by: "price", "arrival" or "id"; ties are broken by id
+        :param limit: The page size, defaults to VACATIONS_PAGE_SIZE
+        :param cursor: The next_cursor of the previous page, or None for the first page
+        :param user_id: The user whose likes fill each vacation's user_liked flag
+        :return: VacationPageDto with the vacations, including likes_count and user_liked,
+                 and the cursor of the next page, if any
+        :raises ValueError: If the sort key, page size or cursor is invalid
+        """
+        limit, after = _page_request(order_by, limit, cursor)
+        rows = await self.vacation_dao.get_vacations_page(order_by, limit + 1, after, user_id)
+        return _build_page(rows, order_by, limit)
+
+    async def update_vacation_after_validation(self, id: int, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Updates an existing vacation's information after validating all the changed fields together,
+        in one UPDATE statement.
+
+        :param id: The ID of the vacation to update
+        :param changes: New values by column name
+        :return: The updated vacation
+        :raises ValueError: If no vacation is found with the provided ID, or if validation fails
+        """
+        current = await self.vacation_dao.get_vacation_info_by_id(id)
+        if current is None:
+            raise ValueError(f"No vacation found with ID {id}")
+        updated = await self.vacation_dao.update_vacation_fields(id, _check_vacation_changes(current, changes))
+        if updated is None:
+            raise ValueError(f"No vacation found with ID {id}")
+        return updated
+
+    async def validate_insert_of_new_vacation(self, vacation_dto: VacationDto) -> None:
+        """
+        Validates the vacation data before inserting a new vacation.
+
+        :param vacation_dto: VacationDto object containing the vacation data
+        :raises ValueError: If any of the validation checks fail (e.g., price, date)
+        """
+        _check_vacation_fields(vacation_dto)
+
+        if await self.vacation_dao.get_vacation_arrival_departure_time(vacation_dto.arrival, vacation_dto.departure) is not None:
+            raise ValueError(
+                "You can't enter an existing arrival, departure dates")
+
+    async def register_new_vacation(self, vacation_dto: VacationDto) -> None:
+        """
+        Registers a new vacation by inserting it into the database after validation.
+
+        :param vacation_dto: VacationDto object containing the vacation data
+        """
+        await self.validate_insert_of_new_vacation(vacation_dto)
+        await self.vacation_dao.insert_into_vacations(vacation_dto)
@@ -0,0 +1,17 @@
+from flask import Flask
+from flask.testing import FlaskClient
+
+
+class ClosingClient(FlaskClient):
+    """
+    A test client that reads every response in full and closes it, as a WSGI
+    server does, so the admission slot a request holds until its body is
+    closed is released before the next request.
+    """
+
+    def open(self, *args, buffered=True, **kwargs):
+        return super().open(*args, buffered=buffered, **kwargs)
+
+
+def closing_client(app: Flask) -> FlaskClient:
+    return ClosingClient(app, app.response_class, use_cookies=True)
@@ -0,0 +1,88 @@
+import unittest
+import json
+import os
+from app import app
+from tests.routes import closing_client
+from src.dal.database import get_connection
+from src.dal.user_dao import UserDao
+from src.dal.vacation_dao import VacationDao
+from src.models.user_dto import UserDto
+from src.models.vacation_dto import VacationDto
+from werkzeug.security import generate_password_hash
+from uuid import uuid4
+
+
+class BaseTestAdminRoute(unittest.TestCase):
+    def setUp(self):
+        os.environ['TESTING'] = 'True'
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = closing_client(self.app)
+        self.user_dao = UserDao()
+        self.vacation_dao = VacationDao()
+        self.password = "test1"
+
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DELETE FROM vacations")
+            cur.execute("DELETE FROM users WHERE email LIKE '%@a.com' OR email = 'superuser@example'")
+
+        self.user = {
+            "email": f"user_{uuid4().hex[:10]}@a.com",
+            "password": generate_password_hash(self.password),
+            "role_id": 1,
+            "first_name": "Test",
+            "last_name": "User"
+        }
+        self.superuser = {
+            "email": "superuser@example",
+            "password": generate_password_hash(self.password),
+            "role_id": 2,
+            "first_name": "Super",
+            "last_name": "User"
+        }
+        self.user_dao.insert_into_users(UserDto(**self.user))
+        self.user_dao.insert_into_users(UserDto(**self.superuser))
+        for day in (1, 2, 3):
+            self.vacation_dao.insert_into_vacations(
+                VacationDto(1, f"Export vacation {day}", f"2024-01-0{day}", f"2024-01-1{day}", 100 * day, None))
+
+    def tearDown(self):
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DELETE FROM vacations")
+            cur.execute("DELETE FROM users WHERE email = %s OR email = %s",
+                        (self.user['email'], self.superuser['email']))
+
+    def login(self, user):
+        self.client.post('/api/auth/login', json={
+            'email': user['email'],
+            'password': self.password,
+        })
+
+
+class TestAdminExportJson(BaseTestAdminRoute):
+    def test_export_vacations_csv(self):
+        self.login(self.superuser)
+        response = self.client.get('/api/admin/export/vacations.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertIn('vacation_description', lines[0])
+        self.assertEqual(len(lines), 4)
+
+    def test_export_users_ndjson(self):
+        self.login(self.superuser)
+        response = self.client.get('/api/admin/export/users.ndjson')
+        self.assertEqual(response.status_code, 200)
+        users = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertIn(self.user['email'], [user['email'] for user in users])
+        self.assertNotIn('password', users[0])
+
+    def test_export_not_admin(self):
+        self.login(self.user)
+        response = self.client.get('/api/admin/export/likes.csv', headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_unknown_table(self):
+        self.login(self.superuser)
+        response = self.client.get('/api/admin/export/countries.csv')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,152 @@
+import io
+import threading
+import time
+import unittest
+from wsgiref.util import FileWrapper
+from flask import Flask, Response
+from src.admission import AdaptiveLimiter, AdmissionMiddleware, route_class
+
+
+def create_app(limiter):
+    app = Flask(__name__)
+    app.wsgi_app = AdmissionMiddleware(app.wsgi_app, limiters={"listing": limiter}, retry_after=3)
+    app.release = threading.Event()
+    app.entered = threading.Semaphore(0)
+
+    @app.route('/api/vacations/vacations_list')
+    def api_listing():
+        app.entered.release()
+        app.release.wait(5)
+        return {"ok": True}
+
+    @app.route('/vacations/vacations_list')
+    def listing():
+        return "page"
+
+    @app.route('/api/vacations/vacations_list', methods=['POST'])
+    def stream():
+        return Response((chunk for chunk in (b"a", b"b")), mimetype="text/plain")
+
+    @app.route('/vacations/like/1')
+    def broken():
+        raise RuntimeError("broken")
+
+    @app.route('/')
+    def home():
+        return "home"
+
+    return app
+
+
+class TestAdmission(unittest.TestCase):
+    def test_route_class(self):
+        self.assertEqual(route_class("POST", "/auth/login"), "login")
+        self.assertEqual(route_class("POST", "/api/auth/signup"), "login")
+        self.assertIsNone(route_class("GET", "/auth/login"))
+        self.assertEqual(route_class("GET", "/api/vacations/vacations_list"), "listing")
+        self.assertEqual(route_class("PUT", "/api/vacations/update/1"), "writes")
+        self.assertEqual(route_class("GET", "/vacations/like/1"), "writes")
+        self.assertEqual(route_class("GET", "/static/style.css"), "static")
+        self.assertEqual(route_class("GET", "/media/variants/a.thumb.webp"), "static")
+        self.assertIsNone(route_class("GET", "/"))
+
+    def test_excess_requests_are_queued_then_shed(self):
+        limiter = AdaptiveLimiter("listing", limit=1, max_limit=1, queue=1, target_ms=10000, queue_timeout=5)
+        app = create_app(limiter)
+        results = []
+
+        def get():
+            with app.test_client().get('/api/vacations/vacations_list') as response:
+                results.append(response.status_code)
+
+        first = threading.Thread(target=get)
+        first.start()
+        app.entered.acquire(timeout=5)
+        queued = threading.Thread(target=get)
+        queued.start()
+        while limiter.stats()["waiting"] == 0:
+            time.sleep(0.01)
+
+        response = app.test_client().get('/api/vacations/vacations_list')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '3')
+        self.assertFalse(response.json['success'])
+        # Unlimited routes are not held up.
+        self.assertEqual(app.test_client().get('/').status_code, 200)
+
+        app.release.set()
+        first.join(5)
+        queued.join(5)
+        self.assertEqual(results, [200, 200])
+        self.assertEqual(limiter.stats(), {"limit": 1, "in_flight": 0, "waiting": 0, "shed": 1})
+
+    def test_queue_timeout_sheds(self):
+        limiter = AdaptiveLimiter("listing", limit=1, max_limit=1, queue=5, target_ms=10000, queue_timeout=0.05)
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+        limiter.release(0.001)
+        self.assertTrue(limiter.acquire())
+
+    def test_limit_adapts_to_latency(self):
+        limiter = AdaptiveLimiter("listing", limit=10, max_limit=12, queue=0, target_ms=100)
+        self.assertTrue(limiter.acquire())
+        limiter.release(0.5)
+        self.assertEqual(limiter.limit, 9)
+        # One decrease per target interval, however many slow requests finish in it.
+        self.assertTrue(limiter.acquire())
+        limiter.release(0.5)
+        self.assertEqual(limiter.limit, 9)
+
+        for _ in range(200):
+            for _ in range(limiter.limit):
+                limiter.acquire()
+            for _ in range(limiter.limit):
+                limiter.release(0.01)
+        self.assertEqual(limiter.limit, 12)
+
+    def test_slot_is_held_until_the_body_is_closed(self):
+        limiter = AdaptiveLimiter("listing", limit=2, max_limit=2, queue=0, target_ms=10000)
+        app = create_app(limiter)
+        app.wsgi_app.limiters["writes"] = limiter
+        environ = {"REQUEST_METHOD": "POST", "PATH_INFO": "/api/vacations/vacations_list",
+                   "SERVER_NAME": "localhost", "SERVER_PORT": "80", "wsgi.url_scheme": "http",
+                   "wsgi.input": io.BytesIO()}
+        body = app.wsgi_app(environ, lambda status, headers, exc_info=None: None)
+        self.assertEqual(limiter.stats()["in_flight"], 1)
+        self.assertEqual(b"".join(body), b"ab")
+        body.close()
+        body.close()
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+
+    def test_slot_is_released_when_the_app_raises(self):
+        limiter = AdaptiveLimiter("writes", limit=1, max_limit=1, queue=0, target_ms=10000)
+        app = create_app(limiter)
+        app.wsgi_app.limiters = {"writes": limiter}
+        app.wsgi_app.app = lambda environ, start_response: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            app.test_client().get('/vacations/like/1')
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+
+    def test_file_responses_keep_the_file_wrapper(self):
+        limiter = AdaptiveLimiter("static", limit=1, max_limit=1, queue=0, target_ms=10000)
+        file = io.BytesIO(b"image")
+        middleware = AdmissionMiddleware(lambda environ, start_response: FileWrapper(file),
+                                         limiters={"static": limiter})
+        body = middleware({"PATH_INFO": "/media/a.webp", "wsgi.file_wrapper": FileWrapper}, None)
+        self.assertIsInstance(body, FileWrapper)
+        self.assertEqual(limiter.stats()["in_flight"], 1)
+        self.assertEqual(b"".join(body), b"image")
+        body.close()
+        self.assertTrue(file.closed)
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+
+    def test_html_shed_response(self):
+        limiter = AdaptiveLimiter("listing", limit=1, max_limit=1, queue=0, target_ms=10000)
+        limiter.acquire()
+        response = create_app(limiter).test_client().get('/vacations/vacations_list')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.mimetype, 'text/plain')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 import unittest
 import os
 from app import app
-from src.dal.database import db_conn
+from tests.routes import closing_client
+from src.dal.database import get_connection
 from src.dal.user_dao import UserDao
 from src.models.user_dto import UserDto
 from werkzeug.security import generate_password_hash
@@ -12,8 +13,7 @@ class BaseTestAuthRoute(unittest.TestCase):
         os.environ['TESTING'] = 'True'
         self.app = app  
         self.app.config['TESTING'] = True        
-        self.db_conn = db_conn
-        self.client = self.app.test_client()
+        self.client = closing_client(self.app)
         self.user_dao = UserDao()
         
        
@@ -29,10 +29,10 @@ class BaseTestAuthRoute(unittest.TestCase):
         self.user_dao.insert_into_users(UserDto(**self.user))
     
     def tearDown(self):
-        with self.db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute("DELETE FROM users WHERE email = %s", ("test@example.com",))
             cur.execute("DELETE FROM users WHERE email LIKE %s", ("testuser%@example.com",))
-            self.db_conn.commit()
+            db_conn.commit()
 
 
 
@@ -0,0 +1,76 @@
+import gzip
+import json
+import unittest
+import zlib
+from flask import Flask, Response, jsonify
+from src.compression import CompressionMiddleware, choose_encoding
+
+
+def create_app():
+    app = Flask(__name__)
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=100)
+
+    @app.route('/big')
+    def big():
+        return jsonify({"vacations": [{"id": i, "description": "A lovely trip"} for i in range(200)]})
+
+    @app.route('/small')
+    def small():
+        return jsonify({"ok": True})
+
+    @app.route('/image')
+    def image():
+        return Response(b"\x89PNG" + b"\x00" * 5000, mimetype='image/png')
+
+    @app.route('/stream')
+    def stream():
+        return Response((f"row {i}\n" for i in range(500)), mimetype='text/csv')
+
+    return app
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.client = create_app().test_client()
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, deflate, br", brotli_available=True), "br")
+        self.assertEqual(choose_encoding("gzip, deflate, br", brotli_available=False), "gzip")
+        self.assertEqual(choose_encoding("br;q=0.5, gzip", brotli_available=True), "gzip")
+        self.assertEqual(choose_encoding("*", brotli_available=False), "gzip")
+        self.assertIsNone(choose_encoding("gzip;q=0, identity"))
+        self.assertIsNone(choose_encoding(""))
+
+    def test_json_is_gzipped(self):
+        plain = self.client.get('/big')
+        response = self.client.get('/big', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(json.loads(gzip.decompress(response.data)), plain.json)
+
+    def test_small_and_binary_responses_are_not_compressed(self):
+        response = self.client.get('/small', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.json, {"ok": True})
+        response = self.client.get('/image', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertNotIn('Vary', response.headers)
+
+    def test_streamed_response_is_compressed_chunk_by_chunk(self):
+        response = self.client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        chunks = list(response.response)
+        response.close()
+        self.assertGreater(len(chunks), 2)
+        # Every chunk is flushed, so the first one already decodes to whole rows.
+        first = zlib.decompressobj(31).decompress(chunks[0])
+        self.assertTrue(first.startswith(b"row 0\nrow 1\n"))
+        text = gzip.decompress(b"".join(chunks)).decode()
+        self.assertEqual(text, "".join(f"row {i}\n" for i in range(500)))
+
+
+if __name__ == '__main__':
+    unittest.main()
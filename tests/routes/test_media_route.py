@@ -0,0 +1,60 @@
+import io
+import os
+import unittest
+from werkzeug.exceptions import NotFound
+from app import app
+from tests.routes import closing_client
+from src.blueprints.media.ui import media_file
+from src.services import media_store
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 8
+
+
+class TestMediaRoute(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = closing_client(app)
+        self.root = app.config['UPLOAD_FOLDER']
+        self.name = media_store.save(io.BytesIO(JPEG), self.root)
+
+    def tearDown(self):
+        os.remove(os.path.join(self.root, self.name))
+
+    def test_content_addressed_file_is_immutable(self):
+        response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, JPEG)
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertTrue(response.cache_control.public)
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 365 * 24 * 3600)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        response.close()
+
+    def test_range_request(self):
+        response = self.client.get(f'/media/{self.name}', headers={'Range': 'bytes=4-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, JPEG[4:20])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 4-19/{len(JPEG)}')
+        response.close()
+
+    def test_conditional_request(self):
+        etag = self.client.get(f'/media/{self.name}').headers['ETag']
+        response = self.client.get(f'/media/{self.name}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_legacy_file_is_revalidated(self):
+        response = self.client.get('/media/isr_trip.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 0)
+        response.close()
+
+    def test_missing_file(self):
+        for name in ('0' * 64 + '.jpg', '../../../app.py'):
+            with app.test_request_context(f'/media/{name}'), self.assertRaises(NotFound):
+                media_file(name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 import unittest
 import os
 from app import app
-from src.dal.database import db_conn
+from tests.routes import closing_client
+from src.dal.database import get_connection
 from src.dal.vacation_dao import VacationDao
 from src.models.vacation_dto import VacationDto
 from src.services.vacation_service import VacationService
@@ -15,17 +16,16 @@ class BaseTestVacationRoute(unittest.TestCase):
         os.environ['TESTING'] = 'True'
         self.app = app  
         self.app.config['TESTING'] = True        
-        self.db_conn = db_conn
-        self.client = self.app.test_client()
+        self.client = closing_client(self.app)
         self.vacation_dao = VacationDao()
         self.user_dao = UserDao()
         self.vacation_service = VacationService(self.vacation_dao)
         self.password = "test1"
         
-        with self.db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute("DELETE FROM vacations")
             cur.execute("DELETE FROM users WHERE email LIKE '%@a.com' OR email = 'superuser@example'")
-            self.db_conn.commit()
+            db_conn.commit()
         
         unique_email = f"user_{uuid4().hex[:10]}@a.com"
         self.user = {
@@ -55,20 +55,19 @@ class BaseTestVacationRoute(unittest.TestCase):
             "file_name": None
         }
         self.vacation_id = self.vacation_service.register_new_vacation(VacationDto(**self.vacation))
-        self.db_conn.commit()
         
-        with self.db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute("SELECT id FROM vacations WHERE vacation_description = %s", ("Test vacation",))
             result = cur.fetchone()
             if result:
                 self.vacation_id = result[0]
     
     def tearDown(self):
-        with self.db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute("DELETE FROM vacations WHERE vacation_description = %s", ("Test vacation",))
             cur.execute("DELETE FROM users WHERE email = %s", (self.user['email'],))
             cur.execute("DELETE FROM users WHERE email = %s", (self.superuser['email'],))
-            self.db_conn.commit()
+            db_conn.commit()
 
 class TestVacationHtml(BaseTestVacationRoute):
     def test_list_vacations_page(self):
@@ -79,6 +78,26 @@ class TestVacationHtml(BaseTestVacationRoute):
         response = self.client.get('/vacations/vacations_list')
         self.assertEqual(response.status_code, 200)
 
+    def test_list_vacations_page_image_variants(self):
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("UPDATE vacations SET file_name = 'isr_trip.jpg' WHERE id = %s", (self.vacation_id,))
+        self.vacation_dao.set_image_variants('isr_trip.jpg', {
+            "source": "isr_trip.jpg",
+            "variants": [{"name": f"variants/isr_trip.{size}.{extension}", "format": image_format, "width": width}
+                         for size, width in (("thumb", 320), ("medium", 960))
+                         for image_format, extension in (("jpeg", "jpg"), ("webp", "webp"))],
+            "placeholder": "data:image/jpeg;base64,AAAA"})
+        self.client.post('/auth/login', data={
+            'email': self.user['email'],
+            'password': self.password,
+        })
+        page = self.client.get('/vacations/vacations_list').get_data(as_text=True)
+        self.assertIn('/media/variants/isr_trip.thumb.webp 320w, /media/variants/isr_trip.medium.webp 960w',
+                      page)
+        self.assertIn('src="/media/variants/isr_trip.medium.jpg"', page)
+        self.assertIn('loading="lazy"', page)
+        self.assertIn('data:image/jpeg;base64,AAAA', page)
+
     def test_update_vacation_page(self):
         self.client.post('/auth/login', data={
             'email': self.superuser['email'],
@@ -121,6 +140,67 @@ class TestVacationJson(BaseTestVacationRoute):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.content_type, 'application/json')
 
+    def test_list_vacations_json_query_headers(self):
+        self.client.post('/api/auth/login', json={
+            'email': self.user['email'],
+            'password': self.password,
+        })
+        self.app.debug = True
+        try:
+            response = self.client.get('/api/vacations/vacations_list', headers={'Accept': 'application/json'})
+        finally:
+            self.app.debug = False
+        self.assertEqual(response.status_code, 200)
+        # The user comes from the session profile saved at login, not from a query.
+        self.assertEqual(response.headers['X-DB-Query-Count'], '2')
+        self.assertEqual(response.headers['X-DB-N-Plus-One'], '0')
+
+    def test_list_vacations_json_not_modified(self):
+        self.client.post('/api/auth/login', json={
+            'email': self.user['email'],
+            'password': self.password,
+        })
+        response = self.client.get('/api/vacations/vacations_list')
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        response = self.client.get('/api/vacations/vacations_list', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/vacations/vacations_list', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+        self.client.post(f'/api/vacations/like/{self.vacation_id}')
+        response = self.client.get('/api/vacations/vacations_list', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_get_vacation_json(self):
+        self.client.post('/api/auth/login', json={
+            'email': self.user['email'],
+            'password': self.password,
+        })
+        response = self.client.get(f'/api/vacations/{self.vacation_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['vacation']['id'], self.vacation_id)
+        response = self.client.get(f'/api/vacations/{self.vacation_id}',
+                                   headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/api/vacations/0').status_code, 404)
+
+    def test_vacation_json_without_dates(self):
+        with get_connection() as db_conn:
+            db_conn.execute("UPDATE vacations SET arrival = NULL, departure = NULL WHERE id = %s;",
+                            (self.vacation_id,))
+        self.client.post('/api/auth/login', json={
+            'email': self.superuser['email'],
+            'password': self.password,
+        })
+        response = self.client.get(f'/api/vacations/{self.vacation_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json['vacation']['arrival'])
+        response = self.client.put(f'/api/vacations/update/{self.vacation_id}', json={'price': 1300})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['vacation']['price'], 1300)
+        self.assertIsNone(response.json['vacation']['departure'])
+
     def test_create_vacation_json(self):
         self.client.post('/api/auth/login', json={
             'email': self.superuser['email'],
@@ -180,6 +260,30 @@ class TestVacationJson(BaseTestVacationRoute):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.content_type, 'application/json')
     
+    def test_import_vacations_json(self):
+        self.client.post('/api/auth/login', json={
+            'email': self.superuser['email'],
+            'password': self.password,
+        })
+        body = ('{"country_id": 1, "vacation_description": "Test vacation", "arrival": "2023-11-01", '
+                '"departure": "2023-11-10", "price": 900}\n'
+                '\n'
+                'not json\n')
+        response = self.client.post('/api/vacations/import', data=body,
+                                    headers={'Accept': 'application/json', 'Content-Type': 'application/x-ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 1)
+        self.assertEqual([error['row'] for error in response.json['errors']], [2])
+
+    def test_import_vacations_json_not_admin(self):
+        self.client.post('/api/auth/login', json={
+            'email': self.user['email'],
+            'password': self.password,
+        })
+        response = self.client.post('/api/vacations/import', data='',
+                                    headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 403)
+
 class TestNegativeVacationsHtml(BaseTestVacationRoute):
     def test_list_vacations_page_unauthenticated(self):
         response = self.client.get('/vacations/vacations_list')
@@ -26,7 +26,8 @@ from tests.services.test_user_service import (
 from tests.services.test_vacation_service import (
     TestVacationDao,
     TestVacationService,
-    TestInvalidVacationService
+    TestInvalidVacationService,
+    TestUnitOfWork
 )
 
 from tests.routes.test_auth_route import (
@@ -43,12 +44,36 @@ from tests.routes.test_vacation_route import (
     TestNegativeVacationsHtml
 )
 
+from tests.routes.test_admin_route import TestAdminExportJson
+from tests.routes.test_compression import TestCompression
+from tests.routes.test_media_route import TestMediaRoute
+from tests.routes.test_admission import TestAdmission
+from tests.services.test_migrations import TestMigrations
+from tests.services.test_metrics import TestMetrics
+from tests.services.test_reference_cache import TestReferenceCache
+from tests.services.test_invalidation import TestInvalidationBus
+from tests.services.test_image_service import TestImageVariants
+from tests.services.test_media_store import TestMediaStore
+from tests.services.test_jobs import TestJobs
+from tests.services.test_passwords import TestPasswords
+from tests.services.test_profile_cache import TestProfileCache
+
 def test_all():
     test_cases = [
         # services
         TestVacationDao,
         TestVacationService,
         TestInvalidVacationService,
+        TestUnitOfWork,
+        TestMigrations,
+        TestMetrics,
+        TestReferenceCache,
+        TestInvalidationBus,
+        TestImageVariants,
+        TestMediaStore,
+        TestJobs,
+        TestPasswords,
+        TestProfileCache,
         TestUserDao,
         TestUserService,
         TestInvalidUserService,
@@ -59,7 +84,11 @@ def test_all():
         TestNegativeAuthJson,
         TestVacationHtml,
         TestVacationJson,
-        TestNegativeVacationsHtml
+        TestNegativeVacationsHtml,
+        TestAdminExportJson,
+        TestCompression,
+        TestMediaRoute,
+        TestAdmission
     ]
 
     suite = TestSuite()
@@ -0,0 +1,39 @@
+from src.services import image_service, image_variants
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestImageVariants(unittest.TestCase):
+    """
+    Tests for the image variant pipeline. Building variants needs Pillow.
+    """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_variant_name(self) -> None:
+        self.assertEqual(image_variants.variant_name("isr_trip.jpg", "thumb", "webp"), "variants/isr_trip.thumb.webp")
+
+    @unittest.skipIf(image_variants.Image is not None, "Pillow is installed")
+    def test_without_pillow_uploads_are_left_as_they_are(self) -> None:
+        self.assertIsNone(image_service.process_upload(self.directory, "trip.jpg"))
+
+    @unittest.skipIf(image_variants.Image is None, "Pillow is not installed")
+    def test_build_variants(self) -> None:
+        image_variants.Image.new("RGB", (2000, 1000), "blue").save(os.path.join(self.directory, "trip.jpg"))
+        result = image_variants.build_variants(self.directory, "trip.jpg")
+        self.assertEqual(result["source"], "trip.jpg")
+        self.assertTrue(result["placeholder"].startswith("data:image/jpeg;base64,"))
+        widths = {(variant["format"], variant["width"]) for variant in result["variants"]}
+        self.assertEqual(widths, {("jpeg", 320), ("webp", 320), ("jpeg", 960), ("webp", 960)})
+        for variant in result["variants"]:
+            self.assertTrue(os.path.exists(os.path.join(self.directory, variant["name"])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+from src.config import conn_info, invalidation_channel
+from src.dal import invalidation
+from src.dal.country_dao import CountryDao, countries_cache
+from src.dal.database import get_connection, unit_of_work
+import json
+import psycopg as pg
+import threading
+import unittest
+from unittest import mock
+
+PROBE_COUNTRY = "Notifyland"
+
+
+class TestInvalidationBus(unittest.TestCase):
+    """
+    Tests for the LISTEN/NOTIFY cache invalidation bus.
+    """
+
+    def setUp(self) -> None:
+        self.received = []
+        self.event = threading.Event()
+        invalidation.subscribe("probe", self.on_probe)
+        self.delete_probe()
+
+    def tearDown(self) -> None:
+        invalidation._handlers["probe"].remove(self.on_probe)
+        self.delete_probe()
+
+    def delete_probe(self) -> None:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DELETE FROM countries WHERE country_name = %s;", (PROBE_COUNTRY,))
+        countries_cache.invalidate()
+
+    def on_probe(self, key) -> None:
+        self.received.append(key)
+        self.event.set()
+
+    def test_local_handlers_run_after_commit(self) -> None:
+        with unit_of_work():
+            invalidation.publish("probe", 7)
+            self.assertEqual(self.received, [])
+        self.assertEqual(self.received, [7])
+
+    def test_rolled_back_write_is_not_published(self) -> None:
+        with self.assertRaises(RuntimeError):
+            with unit_of_work():
+                invalidation.publish("probe", 7)
+                raise RuntimeError("roll back")
+        self.assertEqual(self.received, [])
+
+    def test_dao_write_notifies_other_connections(self) -> None:
+        with pg.connect(conn_info, autocommit=True) as listener:
+            listener.execute(pg.sql.SQL("LISTEN {}").format(pg.sql.Identifier(invalidation_channel)))
+            CountryDao().insert_into_countries(PROBE_COUNTRY)
+            notifies = list(listener.notifies(timeout=5, stop_after=1))
+        self.assertEqual(len(notifies), 1)
+        self.assertEqual(json.loads(notifies[0].payload)["topic"], "countries")
+
+    def test_dao_write_and_notify_share_a_transaction(self) -> None:
+        with mock.patch.object(invalidation, "_payload", side_effect=RuntimeError("notify failed")):
+            with self.assertRaises(RuntimeError):
+                CountryDao().insert_into_countries(PROBE_COUNTRY)
+        countries_cache.invalidate()
+        self.assertIsNone(CountryDao().get_country_by_name(PROBE_COUNTRY),
+                          "The write must be rolled back with its NOTIFY")
+
+    def test_listener_dispatches_other_processes_messages(self) -> None:
+        self.assertIsNotNone(invalidation.start_listener(enabled=True))
+        payload = json.dumps({"topic": "probe", "key": 42, "origin": "another-worker"})
+        # The listener may still be connecting, so keep notifying until it hears one.
+        with pg.connect(conn_info, autocommit=True) as conn:
+            for _ in range(10):
+                conn.execute("SELECT pg_notify(%s, %s);", (invalidation_channel, payload))
+                if self.event.wait(1):
+                    break
+        self.assertIn(42, self.received)
+
+
+if __name__ == '__main__':
+    unittest.main()
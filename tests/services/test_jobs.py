@@ -0,0 +1,167 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from src.dal.database import get_connection, unit_of_work
+from src.dal.job_dao import JobDao
+from src.services import jobs
+
+calls = []
+
+
+@jobs.job("test_record")
+def record(value):
+    calls.append(value)
+
+
+@jobs.job("test_slow")
+def slow(seconds):
+    time.sleep(seconds)
+
+
+@jobs.job("test_flaky")
+def flaky(value):
+    raise RuntimeError(f"cannot handle {value}")
+
+
+class TestJobs(unittest.TestCase):
+    """
+    Tests for the Postgres job queue.
+    """
+
+    def setUp(self) -> None:
+        self.job_dao = JobDao()
+        with get_connection() as conn:
+            conn.execute("DELETE FROM jobs")
+        calls.clear()
+
+    def test_enqueued_job_runs_once(self) -> None:
+        job_id = jobs.enqueue("test_record", {"value": 1})
+        ran = jobs.run_next("test-worker")
+        self.assertEqual(ran.id, job_id)
+        self.assertEqual(calls, [1])
+        self.assertEqual(self.job_dao.get_job_by_id(job_id)['status'], 'done')
+        self.assertIsNone(jobs.run_next("test-worker"))
+
+    def test_priority_and_schedule(self) -> None:
+        jobs.enqueue("test_record", {"value": "low"})
+        jobs.enqueue("test_record", {"value": "later"}, priority=10, delay=3600)
+        jobs.enqueue("test_record", {"value": "high"}, priority=5)
+        while jobs.run_next("test-worker"):
+            pass
+        self.assertEqual(calls, ["high", "low"])
+        self.assertEqual(self.job_dao.count_by_status(), {'done': 2, 'queued': 1})
+
+    def test_failed_job_is_retried_with_backoff_then_fails(self) -> None:
+        job_id = jobs.enqueue("test_flaky", {"value": 1}, max_attempts=2)
+        jobs.run_next("test-worker")
+        row = self.job_dao.get_job_by_id(job_id)
+        self.assertEqual((row['status'], row['attempts']), ('queued', 1))
+        self.assertIn("cannot handle 1", row['last_error'])
+        self.assertGreater(row['run_at'], row['created_at'])
+        # Not due yet.
+        self.assertIsNone(jobs.run_next("test-worker"))
+
+        with get_connection() as conn:
+            conn.execute("UPDATE jobs SET run_at = now() WHERE id = %s", (job_id,))
+        jobs.run_next("test-worker")
+        row = self.job_dao.get_job_by_id(job_id)
+        self.assertEqual((row['status'], row['attempts']), ('failed', 2))
+
+    def test_unknown_kind_fails_without_retry(self) -> None:
+        job_id = jobs.enqueue("test_unknown")
+        jobs.run_next("test-worker")
+        self.assertEqual(self.job_dao.get_job_by_id(job_id)['status'], 'failed')
+
+    def test_retry_delay_grows(self) -> None:
+        self.assertLessEqual(jobs.retry_delay(1), jobs.job_retry_base_delay)
+        self.assertGreaterEqual(jobs.retry_delay(4), jobs.job_retry_base_delay * 4)
+        self.assertLessEqual(jobs.retry_delay(50), jobs.job_retry_max_delay)
+
+    def test_unique_key_skips_pending_duplicates(self) -> None:
+        first = jobs.enqueue("test_record", {"value": 1}, unique_key="once")
+        self.assertIsNotNone(first)
+        self.assertIsNone(jobs.enqueue("test_record", {"value": 2}, unique_key="once"))
+        jobs.run_next("test-worker")
+        self.assertIsNotNone(jobs.enqueue("test_record", {"value": 3}, unique_key="once"))
+
+    def test_unique_key_does_not_skip_while_running(self) -> None:
+        first = jobs.enqueue("test_record", {"value": 1}, unique_key="once")
+        self.assertEqual(self.job_dao.claim("test-worker").id, first)
+        # The running job may have read the data before the change this job is for.
+        second = jobs.enqueue("test_record", {"value": 2}, unique_key="once")
+        self.assertIsNotNone(second)
+        self.assertIsNone(jobs.enqueue("test_record", {"value": 3}, unique_key="once"))
+        # Putting the running job back does not conflict with the queued one.
+        self.assertEqual(self.job_dao.retry(first, "test-worker", 0, "boom"), 1)
+
+    def test_job_enqueued_in_rolled_back_unit_is_dropped(self) -> None:
+        with self.assertRaises(ZeroDivisionError):
+            with unit_of_work():
+                jobs.enqueue("test_record", {"value": 1})
+                1 / 0
+        self.assertIsNone(jobs.run_next("test-worker"))
+
+    def test_concurrent_workers_claim_different_jobs(self) -> None:
+        for value in range(10):
+            jobs.enqueue("test_record", {"value": value})
+        claimed = []
+
+        def claim_all(worker_id):
+            while True:
+                job = self.job_dao.claim(worker_id)
+                if job is None:
+                    return
+                claimed.append(job.id)
+
+        threads = [threading.Thread(target=claim_all, args=(f"worker-{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(claimed), 10)
+        self.assertEqual(len(set(claimed)), 10)
+
+    def test_lost_job_is_requeued(self) -> None:
+        job_id = jobs.enqueue("test_record", {"value": 1})
+        self.job_dao.claim("lost-worker")
+        self.assertEqual(self.job_dao.requeue_stale(lock_timeout=3600), 0)
+        self.assertEqual(self.job_dao.requeue_stale(lock_timeout=-1), 1)
+        self.assertEqual(jobs.run_next("test-worker").id, job_id)
+        # The lost worker can no longer settle the job.
+        self.assertEqual(self.job_dao.complete(job_id, "lost-worker"), 0)
+
+    def test_long_job_keeps_its_heartbeat(self) -> None:
+        job_id = jobs.enqueue("test_slow", {"seconds": 0.5})
+        with get_connection() as conn:
+            conn.execute("UPDATE jobs SET locked_at = now() - interval '1 hour' WHERE id = %s", (job_id,))
+        with mock.patch.object(jobs, "job_heartbeat_interval", 0.05):
+            worker = threading.Thread(target=jobs.run_next, args=("test-worker",))
+            worker.start()
+            time.sleep(0.3)
+            with get_connection() as conn:
+                beat = conn.execute("SELECT now() - heartbeat_at < interval '0.2 seconds', "
+                                    "heartbeat_at > locked_at FROM jobs WHERE id = %s", (job_id,)).fetchone()
+            self.assertEqual(tuple(beat), (True, True))
+            # Running longer than the lock timeout does not make the job lost.
+            self.assertEqual(self.job_dao.requeue_stale(lock_timeout=0.2), 0)
+            worker.join()
+        self.assertEqual(self.job_dao.get_job_by_id(job_id)["status"], "done")
+
+    def test_work_stops_when_asked(self) -> None:
+        jobs.enqueue("test_record", {"value": 1})
+        stop = threading.Event()
+        thread = threading.Thread(target=jobs.work, args=("test-worker", stop, 0.05))
+        thread.start()
+        for _ in range(100):
+            if calls:
+                break
+            stop.wait(0.05)
+        stop.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(calls, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
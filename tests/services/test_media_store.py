@@ -0,0 +1,76 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from src.services import media_store
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+JPEG = b"\xff\xd8\xff\xe0" + b"\x01" * 200
+
+
+class FakeVacationDao:
+    def __init__(self, file_names):
+        self.file_names = list(file_names)
+        self.renamed = {}
+
+    def get_file_names(self):
+        return self.file_names
+
+    def rename_file(self, old_name, new_name):
+        self.renamed[old_name] = new_name
+        return 1
+
+
+class TestMediaStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_sniff_extension(self):
+        self.assertEqual(media_store.sniff_extension(JPEG), "jpg")
+        self.assertEqual(media_store.sniff_extension(PNG), "png")
+        self.assertEqual(media_store.sniff_extension(b"GIF89a" + b"\x00" * 6), "gif")
+        self.assertEqual(media_store.sniff_extension(b"RIFF\x10\x00\x00\x00WEBPVP8 "), "webp")
+        self.assertIsNone(media_store.sniff_extension(b"<svg></svg>"))
+
+    def test_save_names_file_by_content_and_deduplicates(self):
+        name = media_store.save(io.BytesIO(PNG), self.root, chunk_size=7)
+        self.assertTrue(media_store.is_content_name(name))
+        self.assertTrue(name.endswith(".png"))
+        with open(os.path.join(self.root, name), "rb") as stored:
+            self.assertEqual(stored.read(), PNG)
+
+        self.assertEqual(media_store.save(io.BytesIO(PNG), self.root), name)
+        self.assertNotEqual(media_store.save(io.BytesIO(JPEG), self.root), name)
+        self.assertEqual(len(os.listdir(self.root)), 2)
+
+    def test_save_rejects_oversized_and_unknown_files(self):
+        with self.assertRaises(ValueError):
+            media_store.save(io.BytesIO(PNG), self.root, max_bytes=100, chunk_size=16)
+        with self.assertRaises(ValueError):
+            media_store.save(io.BytesIO(b"#!/bin/sh\necho hi\n"), self.root)
+        with self.assertRaises(ValueError):
+            media_store.save(io.BytesIO(b""), self.root)
+        # No temporary files are left behind.
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_adopt_existing_repoints_legacy_names(self):
+        for file_name in ("spain_trip.jpg", "copy_of_spain.jpg"):
+            with open(os.path.join(self.root, file_name), "wb") as legacy:
+                legacy.write(JPEG)
+        stored = media_store.save(io.BytesIO(PNG), self.root)
+        dao = FakeVacationDao(["spain_trip.jpg", "copy_of_spain.jpg", stored, "missing.jpg"])
+
+        adopted = media_store.adopt_existing(self.root, dao)
+
+        self.assertEqual(set(adopted), {"spain_trip.jpg", "copy_of_spain.jpg"})
+        self.assertEqual(adopted["spain_trip.jpg"], adopted["copy_of_spain.jpg"])
+        self.assertEqual(dao.renamed, adopted)
+        self.assertTrue(os.path.isfile(os.path.join(self.root, adopted["spain_trip.jpg"])))
+
+
+if __name__ == '__main__':
+    unittest.main()
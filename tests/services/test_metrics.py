@@ -0,0 +1,138 @@
+from src.metrics import MetricsRegistry, merge, render
+from src.blueprints.auth.utils import ADMIN_ROLE_ID
+from app import app
+from tests.routes import closing_client
+from unittest import mock
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Tests for the metrics registry and the /metrics endpoint.
+    """
+
+    def setUp(self) -> None:
+        self.registry = MetricsRegistry(multiproc_dir=None)
+
+    def test_counter_is_thread_safe(self) -> None:
+        counter = self.registry.counter("probe_total", "Probe", ("kind",))
+
+        def work():
+            for _ in range(1000):
+                counter.inc(kind="a")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn('probe_total{kind="a"} 8000', self.registry.render())
+
+    def test_histogram_renders_cumulative_buckets(self) -> None:
+        histogram = self.registry.histogram("probe_seconds", "Probe", ("endpoint",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value, endpoint="e")
+        text = self.registry.render()
+        self.assertIn('probe_seconds_bucket{endpoint="e",le="0.1"} 1', text)
+        self.assertIn('probe_seconds_bucket{endpoint="e",le="1"} 3', text)
+        self.assertIn('probe_seconds_bucket{endpoint="e",le="+Inf"} 4', text)
+        self.assertIn('probe_seconds_count{endpoint="e"} 4', text)
+        self.assertIn('probe_seconds_sum{endpoint="e"} 4.25', text)
+
+    def test_wrong_labels(self) -> None:
+        counter = self.registry.counter("probe_total", "Probe", ("kind",))
+        with self.assertRaises(ValueError):
+            counter.inc(other="a")
+
+    def test_merge_sums_processes_and_drops_dead_gauges(self) -> None:
+        def snapshot(requests, in_flight):
+            registry = MetricsRegistry(multiproc_dir=None)
+            registry.counter("requests_total", "Requests").inc(requests)
+            registry.gauge("in_flight", "In flight").set(in_flight)
+            registry.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(0.5)
+            return registry.snapshot()
+
+        text = render(merge([(True, snapshot(3, 2)), (False, snapshot(4, 5))]))
+        self.assertIn("requests_total 7", text)
+        self.assertIn("in_flight 2", text)
+        self.assertIn("latency_seconds_count 2", text)
+
+    def test_multiprocess_files_are_merged(self) -> None:
+        directory = tempfile.mkdtemp()
+        try:
+            other = MetricsRegistry(multiproc_dir=directory)
+            other.counter("requests_total", "Requests").inc(2)
+            other.gauge("in_flight", "In flight").set(1)
+            other.flush(force=True)
+            os.rename(other._path(), os.path.join(directory, "metrics_999999999_dead.json"))
+            registry = MetricsRegistry(multiproc_dir=directory)
+            registry.counter("requests_total", "Requests").inc(3)
+            text = registry.render()
+            self.assertIn("requests_total 5", text)
+            self.assertNotIn("in_flight", text)
+            # The dead worker's file was folded into the retired totals.
+            self.assertFalse(os.path.exists(os.path.join(directory, "metrics_999999999_dead.json")))
+            self.assertIn("requests_total 5", registry.render())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_reused_pid_keeps_the_dead_workers_totals(self) -> None:
+        directory = tempfile.mkdtemp()
+        try:
+            with mock.patch("src.metrics.os.getpid", return_value=999999999):
+                dead = MetricsRegistry(multiproc_dir=directory)
+                dead.counter("requests_total", "Requests").inc(7)
+                dead.flush(force=True)
+                # The OS gives the dead worker's id to a new worker.
+                reborn = MetricsRegistry(multiproc_dir=directory)
+                reborn.counter("requests_total", "Requests").inc(1)
+                reborn.flush(force=True)
+            registry = MetricsRegistry(multiproc_dir=directory)
+            registry.counter("requests_total", "Requests").inc(2)
+            with mock.patch("src.metrics._is_alive", return_value=True):
+                self.assertIn("requests_total 10", registry.render())
+            self.assertIn("requests_total 10", registry.render())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_flusher_writes_idle_metrics(self) -> None:
+        directory = tempfile.mkdtemp()
+        try:
+            registry = MetricsRegistry(multiproc_dir=directory)
+            registry.counter("requests_total", "Requests").inc(4)
+            registry.start_flusher(interval=0.05)
+            path = registry._path()
+            deadline = time.monotonic() + 5
+            while not os.path.exists(path) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            registry.counter("jobs_total", "Jobs").inc()
+            registry.stop_flusher()
+            with open(path) as file:
+                text = render(merge([(False, json.load(file))]))
+            self.assertIn("requests_total 4", text)
+            self.assertIn("jobs_total 1", text)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_metrics_endpoint(self) -> None:
+        client = closing_client(app)
+        client.get('/api/vacations/vacations_list')
+        self.assertEqual(client.get('/metrics').status_code, 401)
+        with mock.patch('app.metrics_token', 'secret'):
+            self.assertEqual(client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+            response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+
+    def test_metrics_endpoint_for_admins(self) -> None:
+        client = closing_client(app)
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+            session['user_role_id'] = ADMIN_ROLE_ID
+        self.assertEqual(client.get('/metrics').status_code, 200)
@@ -0,0 +1,81 @@
+from src.dal.migrations import load_migrations, migrate
+from src.dal.database import get_connection
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestMigrations(unittest.TestCase):
+    """
+    Tests for the migration runner, using throwaway migrations numbered from 9001.
+    """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.write('9001_create_probe.sql', "CREATE TABLE migration_probe (id INT, name TEXT);\n")
+        self.write('9002_probe_index.sql', "-- migrate: no-transaction\n"
+                   "CREATE INDEX CONCURRENTLY IF NOT EXISTS migration_probe_id_idx ON migration_probe (id);\n"
+                   "CREATE INDEX CONCURRENTLY IF NOT EXISTS migration_probe_name_idx ON migration_probe (name);\n")
+        self.drop_probe()
+
+    def tearDown(self) -> None:
+        self.drop_probe()
+        shutil.rmtree(self.directory)
+
+    def drop_probe(self) -> None:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS migration_probe;")
+            cur.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INT PRIMARY KEY, name TEXT NOT NULL, "
+                        "applied_at TIMESTAMPTZ NOT NULL DEFAULT now());")
+            cur.execute("DELETE FROM schema_migrations WHERE version >= 9001;")
+
+    def write(self, file_name: str, sql: str) -> None:
+        with open(os.path.join(self.directory, file_name), 'w') as file:
+            file.write(sql)
+
+    def test_migrate_applies_pending_once(self) -> None:
+        """
+        Test that pending migrations are applied in order, including a CONCURRENTLY one, and only once.
+        """
+        applied = migrate(directory=self.directory)
+        self.assertEqual([migration.version for migration in applied], [9001, 9002])
+        self.assertEqual(migrate(directory=self.directory), [], "Expected nothing left to apply")
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'migration_probe' ORDER BY indexname;")
+            self.assertEqual([row[0] for row in cur.fetchall()],
+                             ['migration_probe_id_idx', 'migration_probe_name_idx'])
+
+    def test_migrate_up_to_target(self) -> None:
+        """
+        Test that migrations after the target version are left pending.
+        """
+        applied = migrate(directory=self.directory, target=9001)
+        self.assertEqual([migration.version for migration in applied], [9001])
+
+    def test_duplicate_versions_rejected(self) -> None:
+        """
+        Test that two files with the same version number are rejected.
+        """
+        self.write('9001_other.sql', "SELECT 1;\n")
+        with self.assertRaises(ValueError):
+            load_migrations(self.directory)
+
+    def test_likes_count_is_backfilled(self) -> None:
+        """
+        Test that the likes_count migration counts the likes of a database that predates it.
+        The migration runs in a transaction that is rolled back.
+        """
+        migration = next(migration for migration in load_migrations() if migration.name == 'likes_count')
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("INSERT INTO users (first_name, last_name, email, password, role_id) "
+                        "VALUES ('Back', 'Fill', 'backfill@migrations.com', 'password', 1) RETURNING id;")
+            user_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO vacations (vacation_description, price) VALUES ('Backfill', 100) RETURNING id;")
+            vacation_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO likes (user_id, vacation_id) VALUES (%s, %s);", (user_id, vacation_id))
+            cur.execute("ALTER TABLE vacations DROP COLUMN likes_count;")
+            cur.execute(migration.sql)
+            cur.execute("SELECT likes_count FROM vacations WHERE id = %s;", (vacation_id,))
+            self.assertEqual(cur.fetchone()[0], 1)
+            db_conn.rollback()
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+from werkzeug.security import generate_password_hash
+from src import metrics
+from src.services import passwords
+
+
+class TestPasswords(unittest.TestCase):
+    """
+    Tests for password hashing in the hash worker pool.
+    """
+
+    def test_hash_and_verify(self) -> None:
+        password_hash = passwords.hash_password("secret")
+        self.assertTrue(password_hash.startswith(passwords.password_hash_method.split(":")[0]))
+        self.assertTrue(passwords.verify_password(password_hash, "secret"))
+        self.assertFalse(passwords.verify_password(password_hash, "wrong"))
+        self.assertEqual(metrics.PASSWORD_HASHES_PENDING.family()['samples'], [[[], 0.0]])
+
+    def test_async_hash_and_verify(self) -> None:
+        async def round_trip():
+            password_hash = await passwords.hash_password_async("secret")
+            return await passwords.verify_password_async(password_hash, "secret")
+        self.assertTrue(asyncio.run(round_trip()))
+
+    def test_needs_rehash(self) -> None:
+        self.assertFalse(passwords.needs_rehash(generate_password_hash("secret", passwords.password_hash_method)))
+        self.assertTrue(passwords.needs_rehash(generate_password_hash("secret", "pbkdf2:sha256:1000")))
+
+    def test_full_method_matches_werkzeug(self) -> None:
+        for method in ("scrypt", "scrypt:16384:8:1", "pbkdf2", "pbkdf2:sha512", "pbkdf2:sha256:1000"):
+            with self.subTest(method=method):
+                stored = generate_password_hash("secret", method)
+                self.assertEqual(passwords._full_method(method), stored.split("$", 1)[0])
+        with self.assertRaises(ValueError):
+            passwords._full_method("md5")
+
+    def test_full_queue_raises_busy(self) -> None:
+        with mock.patch.object(passwords, "_slots", threading.BoundedSemaphore(1)) as slots, \
+                mock.patch.object(passwords, "password_hash_timeout", 0.01):
+            slots.acquire()
+            with self.assertRaises(passwords.PasswordHasherBusy):
+                passwords.hash_password("secret")
+
+
+if __name__ == '__main__':
+    unittest.main()
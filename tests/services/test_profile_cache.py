@@ -0,0 +1,116 @@
+from src.dal import database
+from src.dal.profile_cache import ProfileCache
+from src.dal.user_dao import UserDao, profile_cache
+from src.dal.database import PRIMARY, REPLICA, get_connection, unit_of_work
+from src.models.user_dto import UserDto
+from unittest import mock
+import time
+import unittest
+
+PROBE_EMAIL = "probe@profile-cache.com"
+
+
+class TestProfileCache(unittest.TestCase):
+    """
+    Tests for the LRU cache of user rows behind UserDao.get_user_info_by_id.
+    """
+
+    def setUp(self) -> None:
+        self.user_dao = UserDao()
+        self.delete_probe()
+        self.user_dao.insert_into_users(UserDto("Probe", "User", PROBE_EMAIL, "password", 1))
+        self.user_id = self.user_dao.get_password_by_email(PROBE_EMAIL)["id"]
+
+    def tearDown(self) -> None:
+        self.delete_probe()
+
+    def delete_probe(self) -> None:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE email = %s;", (PROBE_EMAIL,))
+        profile_cache.invalidate()
+
+    def test_lookups_are_served_from_memory(self) -> None:
+        user = self.user_dao.get_user_info_by_id(self.user_id)
+        misses, hits = profile_cache.misses, profile_cache.hits
+        self.assertEqual(self.user_dao.get_user_info_by_id(self.user_id), user)
+        self.assertEqual(profile_cache.misses, misses)
+        self.assertEqual(profile_cache.hits, hits + 1)
+
+    def test_password_is_not_cached(self) -> None:
+        user = self.user_dao.get_user_info_by_id(self.user_id)
+        self.assertEqual(set(user), {"id", "first_name", "last_name", "email", "role_id"})
+
+    def test_user_is_reloaded_from_the_primary_after_an_invalidation(self) -> None:
+        routes = []
+
+        def fetchone(statement, params):
+            routes.append(database.current_route())
+            return None
+
+        now = time.monotonic()
+        settled = mock.patch("src.dal.profile_cache.time.monotonic", return_value=now + profile_cache.lag_window + 1)
+        with mock.patch.object(database, "replica_conn_info", "replica"), \
+                mock.patch.object(UserDao, "_fetchone", side_effect=fetchone):
+            with settled:
+                self.user_dao.get_user_info_by_id(self.user_id)
+            profile_cache.invalidate(self.user_id)
+            self.user_dao.get_user_info_by_id(self.user_id)
+            with mock.patch("src.dal.profile_cache.time.monotonic", return_value=now + 2 * profile_cache.lag_window + 2):
+                self.user_dao.get_user_info_by_id(self.user_id)
+        self.assertEqual(routes, [REPLICA, PRIMARY, REPLICA])
+
+    def test_writes_invalidate_the_cache(self) -> None:
+        self.user_dao.get_user_info_by_id(self.user_id)
+        self.user_dao.update_user_info_by_id(self.user_id, "first_name", "Renamed")
+        self.assertEqual(self.user_dao.get_user_info_by_id(self.user_id)["first_name"], "Renamed")
+
+        self.user_dao.delete_user_info_by_id(self.user_id)
+        self.assertIsNone(self.user_dao.get_user_info_by_id(self.user_id))
+
+    def test_unit_of_work_reads_the_database(self) -> None:
+        self.user_dao.get_user_info_by_id(self.user_id)
+        with unit_of_work():
+            self.user_dao.update_user_info_by_id(self.user_id, "first_name", "Renamed")
+            self.assertEqual(self.user_dao.get_user_info_by_id(self.user_id)["first_name"], "Renamed")
+        self.assertEqual(self.user_dao.get_user_info_by_id(self.user_id)["first_name"], "Renamed")
+
+    def test_least_recently_used_rows_are_evicted(self) -> None:
+        cache = ProfileCache("probe", max_size=2, ttl=60)
+        for id in (1, 2):
+            cache.put(id, {"id": id}, cache.generation)
+        cache.get(1)
+        cache.put(3, {"id": 3}, cache.generation)
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), {"id": 1})
+        self.assertEqual(cache.get(3), {"id": 3})
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_rows_expire(self) -> None:
+        cache = ProfileCache("probe", max_size=10, ttl=60)
+        with mock.patch("src.dal.profile_cache.time.monotonic", return_value=1000.0):
+            cache.put(1, {"id": 1}, cache.generation)
+        with mock.patch("src.dal.profile_cache.time.monotonic", return_value=1059.0):
+            self.assertEqual(cache.get(1), {"id": 1})
+        with mock.patch("src.dal.profile_cache.time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_invalidated_rows_settle(self) -> None:
+        cache = ProfileCache("probe", max_size=10, ttl=60, lag_window=5)
+        with mock.patch("src.dal.profile_cache.time.monotonic", return_value=1000.0):
+            cache.invalidate(1)
+            self.assertTrue(cache.settling(1))
+            self.assertFalse(cache.settling(2))
+            cache.invalidate()
+        with mock.patch("src.dal.profile_cache.time.monotonic", return_value=1004.0):
+            self.assertTrue(cache.settling(2))
+        with mock.patch("src.dal.profile_cache.time.monotonic", return_value=1006.0):
+            self.assertFalse(cache.settling(1))
+            self.assertFalse(cache.settling(2))
+
+    def test_rows_loaded_before_an_invalidation_are_not_stored(self) -> None:
+        cache = ProfileCache("probe", max_size=10, ttl=60)
+        generation = cache.generation
+        cache.invalidate(1)
+        cache.put(1, {"id": 1, "first_name": "Stale"}, generation)
+        self.assertIsNone(cache.get(1))
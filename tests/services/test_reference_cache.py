@@ -0,0 +1,88 @@
+from src.dal.country_dao import CountryDao, countries_cache
+from src.dal.roles_dao import RolesDao, roles_cache
+from src.dal.database import get_connection, unit_of_work
+from unittest import mock
+import unittest
+
+PROBE_COUNTRY = "Probeland"
+
+
+class TestReferenceCache(unittest.TestCase):
+    """
+    Tests for the in-process countries and roles caches behind CountryDao and RolesDao.
+    """
+
+    def setUp(self) -> None:
+        self.country_dao = CountryDao()
+        self.roles_dao = RolesDao()
+        self.delete_probe()
+
+    def tearDown(self) -> None:
+        self.delete_probe()
+
+    def delete_probe(self) -> None:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DELETE FROM countries WHERE country_name LIKE %s;", (PROBE_COUNTRY + "%",))
+        countries_cache.invalidate()
+
+    def test_lookups_are_served_from_memory(self) -> None:
+        countries = self.country_dao.get_all_countries()
+        misses = countries_cache.misses
+        country = countries[0]
+        self.assertEqual(self.country_dao.get_country_info_by_id(country["id"]), country)
+        self.assertEqual(self.country_dao.get_country_by_name(country["country_name"]), country)
+        self.assertIsNone(self.country_dao.get_country_info_by_id(-1))
+        self.assertEqual(countries_cache.misses, misses)
+        self.assertGreaterEqual(countries_cache.stats()["hits"], 3)
+
+    def test_writes_invalidate_the_cache(self) -> None:
+        self.country_dao.get_all_countries()
+        self.country_dao.insert_into_countries(PROBE_COUNTRY)
+        country = self.country_dao.get_country_by_name(PROBE_COUNTRY)
+        self.assertIsNotNone(country)
+
+        self.country_dao.update_country_info_by_id(country["id"], "country_name", PROBE_COUNTRY + "2")
+        self.assertIsNone(self.country_dao.get_country_by_name(PROBE_COUNTRY))
+        self.assertEqual(self.country_dao.get_country_info_by_id(country["id"])["country_name"], PROBE_COUNTRY + "2")
+
+        self.country_dao.delete_country_info_by_id(country["id"])
+        self.assertIsNone(self.country_dao.get_country_info_by_id(country["id"]))
+
+    def test_unit_of_work_invalidates_on_commit(self) -> None:
+        self.country_dao.get_all_countries()
+        with unit_of_work():
+            self.country_dao.insert_into_countries(PROBE_COUNTRY)
+            self.assertIsNone(self.country_dao.get_country_by_name(PROBE_COUNTRY))
+        self.assertIsNotNone(self.country_dao.get_country_by_name(PROBE_COUNTRY))
+
+    def test_returned_rows_are_copies(self) -> None:
+        country = self.country_dao.get_all_countries()[0]
+        country["country_name"] = "changed"
+        self.assertNotEqual(self.country_dao.get_country_info_by_id(country["id"])["country_name"], "changed")
+
+    def test_invalidation_during_a_lookup(self) -> None:
+        country = self.country_dao.get_all_countries()[0]
+        load = countries_cache._loaded
+
+        def load_then_invalidate():
+            # The invalidation bus listener drops the cache right after the lookup loaded it.
+            snapshot = load()
+            countries_cache.invalidate()
+            return snapshot
+
+        with mock.patch.object(countries_cache, "_loaded", side_effect=load_then_invalidate):
+            self.assertEqual(self.country_dao.get_country_info_by_id(country["id"]), country)
+            self.assertEqual(self.country_dao.get_country_by_name(country["country_name"]), country)
+            self.assertIn(country, self.country_dao.get_all_countries())
+
+    def test_roles(self) -> None:
+        roles = self.roles_dao.get_all_roles()
+        role = roles[0]
+        self.assertEqual(self.roles_dao.get_roles_info_by_id(role["id"]), [role])
+        self.assertEqual(self.roles_dao.get_role_by_name(role["name"]), role)
+        self.assertEqual(self.roles_dao.get_roles_info_by_id(-1), [])
+        self.assertGreater(roles_cache.stats()["hits"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
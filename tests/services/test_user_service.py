@@ -1,9 +1,11 @@
 from src.models.user_dto import UserDto
 from src.services.user_service import UserServices
 import unittest
-from src.dal.database import db_conn
+from concurrent.futures import ThreadPoolExecutor
+from src.dal.database import get_connection
 from src.models.likes_dto import LikesDto
 from typing import Optional
+from werkzeug.security import check_password_hash, generate_password_hash
 
 
 class BaseTestUserService(unittest.TestCase):
@@ -19,8 +21,7 @@ class BaseTestUserService(unittest.TestCase):
         It also ensures there is at least one vacation in the database.
         """
         print(f"Running setup for {self.__class__.__name__}")
-        db_conn.rollback()
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             try:
                 cur.execute("DELETE FROM users;")
                 cur.execute("DELETE FROM likes;")
@@ -60,9 +61,8 @@ class TestUserDao(BaseTestUserService):
         """
         user_dto = UserDto('Test', 'User', 'Example@gmail.com', 'password', 1)
         self.user_service.register_new_user(user_dto)
-        db_conn.commit()
 
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute(
                 "SELECT first_name, last_name, email, password, role_id FROM users WHERE email = %s;", (user_dto.email,))
             record = cur.fetchone()
@@ -93,8 +93,7 @@ class TestUserService(BaseTestUserService):
         self.user_dto = UserDto(
             'Test', 'User', 'Example@gmail.com', 'password', 1)
         self.user_service.register_new_user(self.user_dto)
-        db_conn.commit()
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute('SELECT id from users;')
             self.user_id = cur.fetchone()[0]
 
@@ -104,7 +103,7 @@ class TestUserService(BaseTestUserService):
         """
         likes_dto = LikesDto(self.user_id, self.vacation_id)
         self.user_service.like_a_vacation(likes_dto)
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute("SELECT * FROM likes WHERE user_id = %s AND vacation_id = %s;",
                         (self.user_id, self.vacation_id))
             record = cur.fetchone()
@@ -118,7 +117,7 @@ class TestUserService(BaseTestUserService):
         Test logging in a user with correct credentials.
         """
         self.user_service.log_in_user(self.user_dto)
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute("SELECT email, password FROM users WHERE email = %s AND password = %s;",
                         (self.user_dto.email, self.user_dto.password))
             record = cur.fetchone()
@@ -126,6 +125,19 @@ class TestUserService(BaseTestUserService):
             self.assertEqual(
                 record, (self.user_dto.email, self.user_dto.password))
 
+    def test_upgrade_password_hash(self) -> None:
+        """
+        Test that a hash made with outdated settings is replaced after login, and a current one is kept.
+        """
+        old_hash = generate_password_hash('password', 'pbkdf2:sha256:1000')
+        user = {'id': self.user_id, 'password': old_hash}
+        self.assertTrue(self.user_service.upgrade_password_hash(user, 'password'))
+        new_hash = self.user_service.user_dao.get_password_by_email(self.user_dto.email)['password']
+        self.assertNotEqual(new_hash, old_hash)
+        self.assertTrue(check_password_hash(new_hash, 'password'))
+        self.assertFalse(self.user_service.upgrade_password_hash({'id': self.user_id, 'password': new_hash},
+                                                                 'password'))
+
     def test_unlike_a_vacation(self) -> None:
         """
         Test unliking a vacation.
@@ -133,13 +145,81 @@ class TestUserService(BaseTestUserService):
         like_dto = LikesDto(self.user_id, self.vacation_id)
         self.user_service.like_a_vacation(like_dto)
         self.user_service.un_like_a_vacation(like_dto)
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute('SELECT * FROM likes WHERE user_id = %s;',
                         (self.user_id,))
             record = cur.fetchone()
             self.assertIsNone(
                 record, 'The likes table should be empty after unliking')
 
+    def test_toggle_like(self) -> None:
+        """
+        Test that toggling twice likes and then unlikes, returning the new count each time.
+        """
+        likes_dto = LikesDto(self.user_id, self.vacation_id)
+        self.assertEqual(self.user_service.toggle_like(likes_dto), {'liked': True, 'likes_count': 1})
+        self.assertEqual(self.user_service.toggle_like(likes_dto), {'liked': False, 'likes_count': 0})
+
+    def test_like_and_unlike_are_idempotent(self) -> None:
+        """
+        Test that liking a liked vacation leaves its like row untouched, and unliking twice changes nothing.
+        """
+        likes_dto = LikesDto(self.user_id, self.vacation_id)
+        self.assertEqual(self.user_service.like_a_vacation(likes_dto), {'liked': True, 'likes_count': 1})
+        row_version = self.like_row_version()
+        self.assertEqual(self.user_service.like_a_vacation(likes_dto), {'liked': True, 'likes_count': 1})
+        self.assertEqual(self.like_row_version(), row_version, 'The like should not have been removed and re-added')
+        self.assertEqual(self.user_service.un_like_a_vacation(likes_dto), {'liked': False, 'likes_count': 0})
+        self.assertEqual(self.user_service.un_like_a_vacation(likes_dto), {'liked': False, 'likes_count': 0})
+
+    def test_concurrent_likes(self) -> None:
+        """
+        Test that concurrent likes of the same vacation by the same user leave exactly one like.
+        """
+        likes_dto = LikesDto(self.user_id, self.vacation_id)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: UserServices().like_a_vacation(likes_dto), range(8)))
+        self.assertTrue(all(result['liked'] for result in results))
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM likes WHERE vacation_id = %s;', (self.vacation_id,))
+            self.assertEqual(cur.fetchone()[0], 1)
+            cur.execute('SELECT likes_count FROM vacations WHERE id = %s;', (self.vacation_id,))
+            self.assertEqual(cur.fetchone()[0], 1)
+
+    def like_row_version(self) -> Optional[str]:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute('SELECT xmin::text FROM likes WHERE user_id = %s AND vacation_id = %s;',
+                        (self.user_id, self.vacation_id))
+            row = cur.fetchone()
+            return row[0] if row else None
+
+    def test_bulk_register_users(self) -> None:
+        """
+        Test bulk inserting users, with invalid and duplicate emails reported per row.
+        """
+        user_dtos = [
+            UserDto('Bulk', 'One', 'bulkone@gmail.com', 'password', 1),
+            UserDto('Bulk', 'Two', 'Example@gmail.com', 'password', 1),
+            UserDto('Bulk', 'Three', 'not-an-email', 'password', 1),
+            UserDto('Bulk', 'Four', 'bulkone@gmail.com', 'password', 1),
+        ]
+        report = self.user_service.bulk_register_users(user_dtos, batch_size=3)
+        self.assertEqual(report.inserted, 1, "Expected only the first user to be inserted")
+        self.assertEqual([error.row for error in report.errors], [2, 3, 4])
+
+    def test_bulk_like_vacations(self) -> None:
+        """
+        Test bulk liking vacations, skipping duplicate likes and unknown vacations.
+        """
+        likes_dtos = [LikesDto(self.user_id, self.vacation_id), LikesDto(self.user_id, self.vacation_id),
+                      LikesDto(self.user_id, -1), LikesDto(self.user_id, 'x')]
+        report = self.user_service.bulk_like_vacations(likes_dtos)
+        self.assertEqual(report.inserted, 1)
+        self.assertEqual([error.row for error in report.errors], [2, 3, 4])
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM likes WHERE user_id = %s;', (self.user_id,))
+            self.assertEqual(cur.fetchone()[0], 1)
+
 
 class TestInvalidUserService(BaseTestUserService):
     """
@@ -154,7 +234,7 @@ class TestInvalidUserService(BaseTestUserService):
         self.user_dto = UserDto(
             'Test', 'User', 'Example@gmail.com', 'password', 1)
         self.user_service.register_new_user(self.user_dto)
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute('SELECT id from users;')
             self.user_id = cur.fetchone()[0]
 
@@ -166,6 +246,13 @@ class TestInvalidUserService(BaseTestUserService):
         with self.assertRaises(TypeError):
             self.user_service.like_a_vacation(likes_dto)
 
+    def test_toggle_like_unknown_vacation(self) -> None:
+        """
+        Test toggling a like on a vacation that does not exist.
+        """
+        with self.assertRaises(ValueError):
+            self.user_service.toggle_like(LikesDto(self.user_id, -1))
+
     def test_log_in_user_invalid_password(self) -> None:
         """
         Test logging in a user with an invalid password.
@@ -1,8 +1,13 @@
 from src.models.vacation_dto import VacationDto
 from src.dal.vacation_dao import VacationDao
 from src.services.vacation_service import VacationService
+from src.services.likes_reconciliation import reconcile_likes_counts
 import unittest
-from src.dal.database import db_conn
+from unittest import mock
+from src.dal.database import get_connection, unit_of_work
+from src.dal.instrumentation import start_request_stats, end_request_stats
+from src.dal.likes_dao import LikesDao
+from src.dal.user_dao import UserDao
 import datetime
 from typing import List, Tuple
 
@@ -19,8 +24,7 @@ class BaseTestVacationService(unittest.TestCase):
         and clearing the database tables for `vacations` and `likes`.
         """
         print(f"Running setup for {self.__class__.__name__}")
-        db_conn.rollback()
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             try:
                 cur.execute("DELETE FROM vacations;")
                 cur.execute("DELETE FROM likes;")
@@ -50,8 +54,7 @@ class TestVacationDao(BaseTestVacationService):
         vacation_dto = VacationDto(2, 'Amazing trip to Isr', datetime.date(2025, 12, 20),
                                    datetime.date(2025, 12, 25), 3400, 'isr.jpg')
         self.vacation_service.register_new_vacation(vacation_dto)
-        db_conn.commit()
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute(
                 "SELECT country_id,vacation_description,arrival,departure,price,file_name FROM vacations WHERE price = %s;",
                 (vacation_dto.price,))
@@ -72,6 +75,46 @@ class TestVacationDao(BaseTestVacationService):
             self.vacation_service.register_new_vacation(vacation_dto)
 
 
+    def test_query_stats_flag_n_plus_one(self) -> None:
+        """
+        Test that the per-request query stats record each statement and flag one run too many times.
+        """
+        stats = start_request_stats()
+        try:
+            self.vacation_dao.get_all_vacations()
+            for vacation_id in range(12):
+                LikesDao().get_likes_count(vacation_id)
+        finally:
+            end_request_stats()
+        summary = stats.summary()
+        self.assertEqual(summary['count'], 13)
+        self.assertEqual(list(summary['n_plus_one'].values()), [12])
+        self.assertIn('likes_count', next(iter(summary['n_plus_one'])))
+
+
+    def test_image_variants_are_queued_with_the_vacation(self) -> None:
+        """
+        Test that the build of an uploaded image's variants is queued in the
+        vacation's own transaction, and dropped with it.
+        """
+        vacation_dto = VacationDto(2, 'Amazing trip to Isr', datetime.date(2025, 12, 20),
+                                   datetime.date(2025, 12, 25), 3400, 'isr.jpg')
+        with get_connection() as db_conn:
+            db_conn.execute("DELETE FROM jobs;")
+        with mock.patch('src.services.image_service.image_variants.Image', object()):
+            self.vacation_service.register_new_vacation(vacation_dto, upload_folder='/uploads')
+            with mock.patch('src.services.image_service.enqueue', side_effect=RuntimeError('queue down')):
+                with self.assertRaises(RuntimeError):
+                    self.vacation_service.register_new_vacation(VacationDto(
+                        2, 'Another trip to Isr', datetime.date(2026, 1, 10), datetime.date(2026, 1, 15), 3400,
+                        'isr.jpg'), upload_folder='/uploads')
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM vacations WHERE file_name = 'isr.jpg';")
+            self.assertEqual(cur.fetchone()[0], 1)
+            cur.execute("SELECT payload FROM jobs WHERE kind = 'build_image_variants';")
+            self.assertEqual(cur.fetchall(), [({'upload_folder': '/uploads', 'file_name': 'isr.jpg'},)])
+            cur.execute("DELETE FROM jobs;")
+
 class TestVacationService(BaseTestVacationService):
     """
     Tests for the `VacationService` class, which handles the vacation business logic.
@@ -85,8 +128,7 @@ class TestVacationService(BaseTestVacationService):
         self.vacation_dto = VacationDto(2, 'Amazing trip to Isr', datetime.date(2025, 12, 20),
                                         datetime.date(2025, 12, 25), 3400, 'isr.jpg')
         self.vacation_service.register_new_vacation(self.vacation_dto)
-        db_conn.commit()
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute('SELECT id from vacations')
             self.vacation_id = cur.fetchone()[0]
 
@@ -97,7 +139,6 @@ class TestVacationService(BaseTestVacationService):
         vacation_dto = VacationDto(3, 'Amazing trip to brazil', datetime.date(2025, 11, 20),
                                    datetime.date(2025, 11, 25), 4000, 'brazil.jpg')
         self.vacation_service.register_new_vacation(vacation_dto)
-        db_conn.commit()
         vacations = self.vacation_service.get_all_vacations_by_order(
             order_by_column="price")
         self.assertIsNotNone(
@@ -112,8 +153,7 @@ class TestVacationService(BaseTestVacationService):
         """
         self.vacation_service.update_vacation_after_validation(
             self.vacation_id, "price", 4000)
-        db_conn.commit()
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute('SELECT price FROM vacations WHERE id = %s',
                         (self.vacation_id,))
             record = cur.fetchone()
@@ -123,13 +163,22 @@ class TestVacationService(BaseTestVacationService):
             self.assertEqual(
                 updated_price, 4000, f'The new column is not equal to the {updated_price}')
 
+    def test_update_vacation_fields(self) -> None:
+        """
+        Test updating several fields of a vacation at once, with form-style string values.
+        """
+        updated = self.vacation_service.update_vacation_after_validation(
+            self.vacation_id, {"price": "4100", "arrival": "2025-12-01", "departure": "2025-12-02"})
+        self.assertEqual((updated['price'], updated['arrival'], updated['departure']),
+                         (4100, datetime.date(2025, 12, 1), datetime.date(2025, 12, 2)))
+        self.assertEqual(updated['vacation_description'], self.vacation_dto.vacation_description)
+
     def test_delete_vacations_and_likes(self) -> None:
         """
         Test deleting a vacation and its associated likes from the database.
         """
         self.vacation_service.delete_vacation_and_likes(self.vacation_id)
-        db_conn.commit()
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute('SELECT COUNT(*) from vacations')
             count = cur.fetchone()[0]
             self.assertEqual(
@@ -140,6 +189,106 @@ class TestVacationService(BaseTestVacationService):
             self.assertEqual(
                 like_count, 0, f"Expected 0 likes, but found {like_count}!")
 
+    def test_get_vacations_page(self) -> None:
+        """
+        Test walking through the vacations page by page with the next cursor.
+        """
+        for day, price in ((1, 500), (2, 500), (3, 200)):
+            self.vacation_service.register_new_vacation(VacationDto(
+                2, 'Paged trip', datetime.date(2026, 3, day), datetime.date(2026, 3, day + 5), price, None))
+        first = self.vacation_service.get_vacations_page("price", 2)
+        self.assertEqual([vacation['price'] for vacation in first.vacations], [200, 500])
+        self.assertIsNotNone(first.next_cursor, "Expected a cursor for the next page")
+        second = self.vacation_service.get_vacations_page("price", 2, first.next_cursor)
+        self.assertEqual([vacation['price'] for vacation in second.vacations], [500, 3400])
+        self.assertIsNone(second.next_cursor, "Expected the second page to be the last one")
+        ids = [vacation['id'] for vacation in first.vacations + second.vacations]
+        self.assertEqual(len(set(ids)), 4, "Expected every vacation exactly once")
+
+    def test_get_vacations_page_with_likes(self) -> None:
+        """
+        Test that each vacation of a page comes with its like count and the user's liked flag.
+        """
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE email LIKE '%@likes.com'")
+            user_ids = []
+            for email in ('first@likes.com', 'second@likes.com'):
+                cur.execute("INSERT INTO users (first_name, last_name, email, password, role_id) "
+                            "VALUES ('Like', 'User', %s, 'password', 1) RETURNING id", (email,))
+                user_ids.append(cur.fetchone()[0])
+            for user_id in user_ids:
+                cur.execute('INSERT INTO likes (user_id, vacation_id) VALUES (%s, %s)', (user_id, self.vacation_id))
+        page = self.vacation_service.get_vacations_page("id", user_id=user_ids[0])
+        self.assertEqual(page.vacations[0]['likes_count'], 2)
+        self.assertTrue(page.vacations[0]['user_liked'])
+        self.assertFalse(self.vacation_service.get_vacations_page("id").vacations[0]['user_liked'])
+
+    def test_likes_count_follows_likes(self) -> None:
+        """
+        Test that likes_count follows inserts, deletes and cascaded deletes of likes,
+        and that the reconciliation job fixes a count that drifted.
+        """
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE email = 'counter@likes.com'")
+            cur.execute("INSERT INTO users (first_name, last_name, email, password, role_id) "
+                        "VALUES ('Like', 'User', 'counter@likes.com', 'password', 1) RETURNING id")
+            user_id = cur.fetchone()[0]
+            cur.execute('INSERT INTO likes (user_id, vacation_id) VALUES (%s, %s)', (user_id, self.vacation_id))
+        self.assertEqual(self.vacation_dao.get_vacation_info_by_id(self.vacation_id)['likes_count'], 1)
+
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute('DELETE FROM users WHERE id = %s', (user_id,))
+        self.assertEqual(self.vacation_dao.get_vacation_info_by_id(self.vacation_id)['likes_count'], 0)
+
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute('UPDATE vacations SET likes_count = 7 WHERE id = %s', (self.vacation_id,))
+        self.assertEqual(reconcile_likes_counts(batch_size=1), 1)
+        self.assertEqual(self.vacation_dao.get_vacation_info_by_id(self.vacation_id)['likes_count'], 0)
+
+    def test_catalog_state_versions_likes_per_vacation(self) -> None:
+        """
+        Test that likes and user updates leave the shared catalog version alone, likes bump
+        the likes version instead, and a change to a vacation bumps the catalog version.
+        """
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE email = 'catalog@likes.com'")
+            cur.execute("INSERT INTO users (first_name, last_name, email, password, role_id) "
+                        "VALUES ('Like', 'User', 'catalog@likes.com', 'password', 1) RETURNING id")
+            user_id = cur.fetchone()[0]
+        before = self.vacation_dao.get_catalog_state()
+        LikesDao().like_vacation(user_id, self.vacation_id)
+        UserDao().update_user_info_by_id(user_id, 'first_name', 'Renamed')
+        after_like = self.vacation_dao.get_catalog_state()
+        self.assertEqual(after_like['version'], before['version'])
+        self.assertEqual(after_like['likes_version'], before['likes_version'] + 1)
+
+        LikesDao().like_vacation(user_id, self.vacation_id)
+        self.assertEqual(self.vacation_dao.get_catalog_state(), after_like, "A repeated like changes nothing")
+
+        self.vacation_dao.update_vacation_fields(self.vacation_id, {'price': 3500})
+        self.assertEqual(self.vacation_dao.get_catalog_state()['version'], before['version'] + 1)
+
+    def test_bulk_register_vacations(self) -> None:
+        """
+        Test bulk inserting vacations, with invalid and duplicate rows reported per row.
+        """
+        rows = [
+            {"country_id": 3, "vacation_description": "Bulk trip", "arrival": "2026-01-01",
+             "departure": "2026-01-05", "price": 2000, "file_name": None},
+            {"country_id": 3, "vacation_description": "Bad price", "arrival": "2026-02-01",
+             "departure": "2026-02-05", "price": 20000},
+            VacationDto(2, 'Existing dates', self.vacation_dto.arrival, self.vacation_dto.departure, 1500, None),
+            {"country_id": 3, "vacation_description": "Same dates as row 1", "arrival": "2026-01-01",
+             "departure": "2026-01-05", "price": 2500},
+            "not a vacation",
+        ]
+        report = self.vacation_service.bulk_register_vacations(rows, batch_size=2)
+        self.assertEqual(report.inserted, 1, "Expected only the first row to be inserted")
+        self.assertEqual([error.row for error in report.errors], [2, 3, 4, 5])
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM vacations')
+            self.assertEqual(cur.fetchone()[0], 2)
+
 
 class TestInvalidVacationService(BaseTestVacationService):
     """
@@ -154,11 +303,44 @@ class TestInvalidVacationService(BaseTestVacationService):
         self.vacation_dto = VacationDto(2, 'Amazing trip to Isr', datetime.date(2025, 12, 20),
                                         datetime.date(2025, 12, 25), 3400, 'isr.jpg')
         self.vacation_service.register_new_vacation(self.vacation_dto)
-        db_conn.commit()
-        with db_conn.cursor() as cur:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
             cur.execute('SELECT id from vacations')
             self.vacation_id = cur.fetchone()[0]
 
+    def test_invalid_vacations_page(self) -> None:
+        """
+        Test that an unknown sort key, an out of range page size or a malformed cursor are rejected.
+        """
+        with self.assertRaises(ValueError):
+            self.vacation_service.get_vacations_page("vacation_description")
+        with self.assertRaises(ValueError):
+            self.vacation_service.get_vacations_page("price", 0)
+        with self.assertRaises(ValueError):
+            self.vacation_service.get_vacations_page("price", 1, "not-a-cursor")
+
+    def test_invalid_update_vacation_fields(self) -> None:
+        """
+        Test that changed fields are validated together and that unknown columns are rejected.
+        """
+        with self.assertRaises(ValueError):
+            self.vacation_service.update_vacation_after_validation(
+                self.vacation_id, {"arrival": "2026-01-10", "departure": "2026-01-05"})
+        with self.assertRaises(ValueError):
+            self.vacation_service.update_vacation_after_validation(self.vacation_id, {"id": 1})
+        self.assertEqual(self.vacation_dao.get_vacation_info_by_id(self.vacation_id)['arrival'],
+                         self.vacation_dto.arrival, "A rejected update must not change the vacation")
+
+    def test_update_missing_vacation(self) -> None:
+        """
+        Test that updating a vacation that does not exist, or that is deleted before the UPDATE runs,
+        raises ValueError like the async service does.
+        """
+        with self.assertRaises(ValueError):
+            self.vacation_service.update_vacation_after_validation(-1, {"price": 900})
+        with mock.patch.object(self.vacation_service.vacation_dao, 'update_vacation_fields', return_value=None):
+            with self.assertRaises(ValueError):
+                self.vacation_service.update_vacation_after_validation(self.vacation_id, {"price": 900})
+
     def test_invalid_update_vacation(self) -> None:
         """
         Test updating a vacation with invalid data (e.g., setting an unreasonable price).
@@ -166,3 +348,40 @@ class TestInvalidVacationService(BaseTestVacationService):
         with self.assertRaises(ValueError):
             self.vacation_service.update_vacation_after_validation(
                 self.vacation_id, "price", 11000)
+
+
+class TestUnitOfWork(BaseTestVacationService):
+    """
+    Tests for `unit_of_work`, which groups DAO calls into one transaction.
+    """
+
+    def count_vacations(self) -> int:
+        with get_connection() as db_conn, db_conn.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM vacations')
+            return cur.fetchone()[0]
+
+    def test_unit_of_work_rolls_back_everything(self) -> None:
+        """
+        Test that an error inside a unit of work undoes all of its writes.
+        """
+        with self.assertRaises(RuntimeError):
+            with unit_of_work():
+                self.vacation_dao.insert_into_vacations(VacationDto(
+                    2, 'First', datetime.date(2026, 5, 1), datetime.date(2026, 5, 2), 100, None))
+                self.assertEqual(self.count_vacations(), 1, "Expected the unit to see its own write")
+                raise RuntimeError("boom")
+        self.assertEqual(self.count_vacations(), 0)
+
+    def test_nested_unit_of_work_is_a_savepoint(self) -> None:
+        """
+        Test that a failing nested unit of work only undoes its own writes.
+        """
+        with unit_of_work():
+            self.vacation_dao.insert_into_vacations(VacationDto(
+                2, 'Outer', datetime.date(2026, 5, 1), datetime.date(2026, 5, 2), 100, None))
+            with self.assertRaises(ValueError):
+                with unit_of_work():
+                    self.vacation_dao.insert_into_vacations(VacationDto(
+                        2, 'Inner', datetime.date(2026, 6, 1), datetime.date(2026, 6, 2), 100, None))
+                    raise ValueError("inner failure")
+        self.assertEqual(self.count_vacations(), 1)